@@ -0,0 +1,99 @@
+"""Fan-out benchmark for the asyncio GitHub client.
+
+Serves the commit, blob and GraphQL endpoints from a local mock server that
+answers each request after a fixed latency, then compares the synchronous
+client calling them one by one with the asyncio client fanning out. Run
+from the backend directory:
+
+    python -m benchmarks.github_fanout
+    python -m benchmarks.github_fanout --latency 0.1 --count 50
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.services import github_service
+from src.services.github_service import GitHubService
+from src.services.metadata_sync import build_metadata_query
+
+class MockGitHub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.05
+
+    def respond(self, payload):
+        time.sleep(self.latency)
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        sha = re.search(r'/commits/(\w+)$', self.path).group(1)
+        self.respond({'sha': sha, 'files': [{
+            'filename': f'src/{sha}.py', 'status': 'modified', 'patch': '@@ -1 +1 @@\n-a\n+b'
+        }]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path == '/graphql':
+            self.respond({'data': {key: None for key in body['variables'] if key.startswith('owner')}})
+        else:
+            self.respond({'sha': f"blob-{len(body['content'])}"})
+
+    def log_message(self, *args):
+        pass
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def timed(function):
+    """Wall clock seconds for one call, starting from cold commit caches"""
+    github_service._commit_cache.clear()
+    github_service._diff_cache.clear()
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+def report(name, sequential, fan_out):
+    print(f"{name:<28} {sequential * 1000:>10.0f} {fan_out * 1000:>10.0f} {sequential / fan_out:>8.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per mock response')
+    parser.add_argument('--count', type=int, default=30, help='requests per scenario')
+    args = parser.parse_args()
+
+    MockGitHub.latency = args.latency
+    server = MockServer(('127.0.0.1', 0), MockGitHub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['GITHUB_API_URL'] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.pop('GITHUB_GRAPHQL_URL', None)
+    os.environ.pop('GIT_MIRROR_ROOT', None)
+
+    service = GitHubService(token='benchmark')
+    facade = service.fan_out()
+    shas = [f'c{index}' for index in range(args.count)]
+    blobs = [f'content{index}' for index in range(args.count)]
+    queries = [build_metadata_query([f'octo/app{index}']) for index in range(args.count)]
+
+    print(f"{args.count} requests per scenario, {args.latency * 1000:.0f} ms mock latency")
+    print(f"{'scenario (ms wall clock)':<28} {'sequential':>10} {'fan-out':>10} {'speedup':>9}")
+    report('per-commit diffs',
+           timed(lambda: [service.get_commit_diff('octo/app', sha) for sha in shas]),
+           timed(lambda: facade.get_commit_diffs('octo/app', shas)))
+    report('blob creation',
+           timed(lambda: [service.create_blob('octo/app', content) for content in blobs]),
+           timed(lambda: facade.create_blobs('octo/app', blobs)))
+    report('metadata GraphQL batches',
+           timed(lambda: [service.graphql(query, variables) for query, variables in queries]),
+           timed(lambda: facade.graphql_many(queries)))
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
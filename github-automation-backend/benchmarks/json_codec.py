@@ -0,0 +1,80 @@
+"""Microbenchmarks for the JSON codec, FastJSONProvider and JSONDocument.
+
+Compares each against the standard library path it replaced. Run from the
+backend directory, with and without orjson installed:
+
+    python -m benchmarks.json_codec
+    JSON_BACKEND=json python -m benchmarks.json_codec
+"""
+import json
+import timeit
+from datetime import datetime, timedelta
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.dialects import sqlite
+from src.models import json_codec
+from src.models.json_columns import JSONDocument, decode_json
+
+def repository_listing(count=200):
+    """A GET /api/repositories body"""
+    now = datetime(2024, 1, 1)
+    return {'repositories': [{
+        'id': index,
+        'name': f'app{index}',
+        'full_name': f'octo/app{index}',
+        'url': f'https://github.com/octo/app{index}',
+        'description': 'Automation for pull requests and commit analysis',
+        'language': 'Python',
+        'stars': index * 3,
+        'forks': index,
+        'private': False,
+        'created_at': now - timedelta(days=index),
+        'updated_at': now,
+        'latest_analysis': {'id': index, 'status': 'completed', 'recommendations': ['Add tests', 'Pin dependencies']},
+    } for index in range(count)]}
+
+def commit_analysis_document():
+    """An ai_analysis document as stored on commit_analyses"""
+    return {
+        'summary': 'Refactors the webhook handler and adds retries. ' * 4,
+        'risk_score': 35,
+        'quality_score': 80,
+        'issues': [{'file': f'src/module_{index}.py', 'line': index * 10, 'message': 'Broad except clause'} for index in range(40)],
+        'suggestions': [f'Consider extracting helper number {index}' for index in range(20)],
+    }
+
+def measure(statement, number):
+    """Best of five runs, in microseconds per call"""
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+def report(name, baseline, candidate):
+    print(f"{name:<36} {baseline:>10.1f} {candidate:>10.1f} {baseline / candidate:>8.1f}x")
+
+def main():
+    app = Flask(__name__)
+    standard = DefaultJSONProvider(app)
+    fast = json_codec.FastJSONProvider(app)
+    listing = repository_listing()
+    document = commit_analysis_document()
+    encoded = json.dumps(document)
+    column = JSONDocument()
+    dialect = sqlite.dialect()
+
+    print(f"JSON backend: {json_codec.BACKEND}")
+    print(f"{'benchmark (us per call)':<36} {'stdlib':>10} {'codec':>10} {'speedup':>9}")
+    with app.app_context():
+        report('response: repository listing',
+               measure(lambda: standard.response(listing), 200),
+               measure(lambda: fast.response(listing), 200))
+    report('dumps: analysis document',
+           measure(lambda: json.dumps(document), 2000),
+           measure(lambda: json_codec.dumps(document), 2000))
+    report('JSONDocument bind',
+           measure(lambda: json.dumps(document), 2000),
+           measure(lambda: column.process_bind_param(document, dialect), 2000))
+    report('JSONDocument decode',
+           measure(lambda: json.loads(encoded), 2000),
+           measure(lambda: decode_json(encoded, dict), 2000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import itertools
+import os
+from datetime import datetime
+import click
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+from models.repository import db, Repository, Analysis, AutomationEntry
+from models.webhook import WebhookEvent, CommitAnalysis, ActionLog
+from models.rollup import rebuild_rollups
+from models.repository_summary import reconcile_repository_summaries
+from models.json_columns import JSONDocument
+from models.schema import migrate_schema
+from services.metadata_sync import sync_repository_metadata, DEFAULT_BATCH_SIZE
+from services.git_mirror import get_git_mirror
+from services.analytics_export import (
+    DEFAULT_CHUNK_SIZE as EXPORT_CHUNK_SIZE, EXPORT_FORMATS, MAX_CHUNK_SIZE as MAX_EXPORT_CHUNK_SIZE,
+    ExportUnavailable, write_export
+)
+from services.repository_import import (
+    DEFAULT_BATCH_SIZE as IMPORT_BATCH_SIZE, MAX_BATCH_SIZE as MAX_IMPORT_BATCH_SIZE, import_repositories, iter_ndjson
+)
+from models import json_codec
+
+# Models whose indexes and JSON columns are managed by `flask create-indexes`
+# and `flask migrate-json-columns`
+MANAGED_MODELS = (Repository, Analysis, AutomationEntry, WebhookEvent, CommitAnalysis, ActionLog)
+
+# Indexes earlier releases created that no query uses any more; PR counts
+# come from the rollups and repository summaries
+RETIRED_INDEXES = ('ix_commit_analyses_pr_generated',)
+
+def create_indexes(engine):
+    """Create any missing model indexes without blocking writes.
+
+    On PostgreSQL every index is built with CREATE INDEX CONCURRENTLY outside
+    a transaction, after dropping leftovers of interrupted concurrent builds,
+    which PostgreSQL keeps around as invalid indexes. Other databases get a
+    plain CREATE INDEX IF NOT EXISTS. RETIRED_INDEXES are dropped, concurrently
+    on PostgreSQL. Returns the names of the indexes handled.
+    """
+    is_postgres = engine.dialect.name == 'postgresql'
+    handled = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for name in RETIRED_INDEXES:
+            concurrently = 'CONCURRENTLY ' if is_postgres else ''
+            connection.execute(text(f'DROP INDEX {concurrently}IF EXISTS "{name}"'))
+        
+        for model in MANAGED_MODELS:
+            for index in sorted(model.__table__.indexes, key=lambda index: index.name):
+                if is_postgres:
+                    invalid = connection.execute(text(
+                        "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                        "WHERE c.relname = :name AND NOT i.indisvalid"
+                    ), {'name': index.name}).first()
+                    if invalid:
+                        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                    
+                    index.dialect_options['postgresql']['concurrently'] = True
+                try:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+                finally:
+                    if is_postgres:
+                        index.dialect_options['postgresql']['concurrently'] = False
+                handled.append(index.name)
+    return handled
+
+def migrate_json_columns(engine):
+    """Convert JSON documents stored as text to JSONB on PostgreSQL.
+
+    Each column is converted in its own transaction; ALTER COLUMN TYPE
+    rewrites the table under an exclusive lock, so run this during a quiet
+    period. Empty strings become NULL (or an empty object for NOT NULL
+    columns). A column holding invalid JSON fails on its own and is reported,
+    leaving the others converted. Returns (table, column, outcome) tuples.
+    """
+    if engine.dialect.name != 'postgresql':
+        return []
+    
+    results = []
+    for model in MANAGED_MODELS:
+        table = model.__table__
+        for column in table.columns:
+            if not isinstance(column.type, JSONDocument):
+                continue
+            with engine.connect() as connection:
+                data_type = connection.execute(text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = :table AND column_name = :column"
+                ), {'table': table.name, 'column': column.name}).scalar()
+            if data_type == 'jsonb':
+                results.append((table.name, column.name, 'already jsonb'))
+                continue
+            
+            converted = f'NULLIF(btrim("{column.name}"), \'\')::jsonb'
+            if not column.nullable:
+                converted = f"COALESCE({converted}, '{{}}'::jsonb)"
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text("SET LOCAL lock_timeout = '10s'"))
+                    connection.execute(text(
+                        f'ALTER TABLE "{table.name}" ALTER COLUMN "{column.name}" TYPE JSONB USING {converted}'
+                    ))
+                results.append((table.name, column.name, 'converted'))
+            except Exception as e:
+                results.append((table.name, column.name, f"failed: {str(e).splitlines()[0]}"))
+    return results
+
+def register_commands(app):
+    """Register the maintenance commands available through `flask <command>`"""
+    
+    @app.cli.command('migrate-schema')
+    def migrate_schema_command():
+        """Add columns introduced since the database was created; run after every upgrade"""
+        for table, column, outcome in migrate_schema(db.engine):
+            click.echo(f"{table}.{column}: {outcome}")
+    
+    @app.cli.command('create-indexes')
+    def create_indexes_command():
+        """Build missing indexes on hot filter and sort columns and drop retired ones, concurrently on PostgreSQL"""
+        for name in create_indexes(db.engine):
+            click.echo(f"Ensured index {name}")
+    
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the hourly statistics rollups from the source tables.
+
+        Run once after upgrading, and whenever the rollups are suspected to
+        have drifted; best done while webhook traffic is low.
+        """
+        rows = rebuild_rollups()
+        click.echo(f"Rebuilt {rows} rollup rows")
+    
+    @app.cli.command('reconcile-summaries')
+    def reconcile_summaries_command():
+        """Repair drift in the per-repository summary columns.
+
+        Run once after upgrading to fill the columns, and from cron to catch
+        writes that bypassed the ORM.
+        """
+        corrected = reconcile_repository_summaries()
+        click.echo(f"Corrected {corrected} repository summaries")
+    
+    @app.cli.command('migrate-json-columns')
+    def migrate_json_columns_command():
+        """Convert text JSON columns to JSONB on PostgreSQL"""
+        results = migrate_json_columns(db.engine)
+        if not results:
+            click.echo('Not running on PostgreSQL, JSON columns stay as text')
+        for table, column, outcome in results:
+            click.echo(f"{table}.{column}: {outcome}")
+    
+    @app.cli.command('sync-metadata')
+    @click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+                  help='Repositories per GraphQL query')
+    def sync_metadata_command(batch_size):
+        """Refresh stars, forks, issue, PR and contributor counts from GitHub.
+
+        Contributor counts are approximated by GitHub's mentionable users.
+        """
+        summary = sync_repository_metadata(batch_size=batch_size)
+        click.echo(
+            f"Checked {summary['checked']} repositories: {summary['updated']} updated, "
+            f"{summary['missing']} missing, {summary['deferred']} deferred by rate limit, "
+            f"{summary['failed_batches']} failed batches"
+        )
+    
+    @app.cli.command('sync-mirrors')
+    def sync_mirrors_command():
+        """Clone or fetch the local git mirror of every repository with a clone URL"""
+        mirror = get_git_mirror()
+        if mirror is None:
+            click.echo('GIT_MIRROR_ROOT is not set, no mirrors to sync')
+            return
+        repositories = db.session.query(Repository.full_name, Repository.clone_url)\
+            .filter(Repository.clone_url.isnot(None)).order_by(Repository.id).all()
+        synced = sum(mirror.sync(full_name, clone_url) for full_name, clone_url in repositories)
+        click.echo(f"Synced {synced} of {len(repositories)} mirrors")
+    
+    @app.cli.command('gc-mirrors')
+    def gc_mirrors_command():
+        """Repack local git mirrors and evict the least recently used over quota; run from cron"""
+        mirror = get_git_mirror()
+        if mirror is None:
+            click.echo('GIT_MIRROR_ROOT is not set, no mirrors to collect')
+            return
+        result = mirror.gc_all()
+        click.echo(f"Collected {result['collected']} mirrors, evicted {len(result['evicted'])}")
+    
+    @app.cli.command('export-commit-analyses')
+    @click.argument('output', type=click.Path(dir_okay=False))
+    @click.option('--format', 'export_format', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson',
+                  show_default=True, help='File format; parquet and arrow need pyarrow')
+    @click.option('--after', default=None,
+                  help='Export only analyses committed after this ISO 8601 datetime (default: the watermark file, else all)')
+    @click.option('--watermark-file', type=click.Path(dir_okay=False), default=None,
+                  help='Read the starting point from this file and store the new watermark in it')
+    @click.option('--chunk-size', type=click.IntRange(1, MAX_EXPORT_CHUNK_SIZE), default=EXPORT_CHUNK_SIZE,
+                  show_default=True, help='Analyses read and written per chunk')
+    def export_commit_analyses_command(output, export_format, after, watermark_file, chunk_size):
+        """Export commit analyses with scores and log aggregates for analytics.
+
+        With --watermark-file, each run picks up where the previous one
+        stopped, for incremental loads from cron.
+        """
+        if after is None and watermark_file and os.path.exists(watermark_file):
+            with open(watermark_file) as f:
+                after = f.read().strip() or None
+        try:
+            after = datetime.fromisoformat(after) if after else None
+        except ValueError:
+            raise click.BadParameter(f"{after!r} is not an ISO 8601 datetime", param_hint='--after')
+        
+        try:
+            rows, watermark = write_export(output, export_format, after=after, chunk_size=chunk_size)
+        except ExportUnavailable as e:
+            raise click.ClickException(str(e))
+        if watermark_file:
+            with open(watermark_file, 'w') as f:
+                f.write(f"{watermark.isoformat()}\n")
+        click.echo(f"Exported {rows} commit analyses committed after {after or 'the start'} to {output}, "
+                   f"watermark {watermark.isoformat()}")
+    
+    @app.cli.command('import-repositories')
+    @click.argument('source', type=click.File('r'))
+    @click.option('--batch-size', type=click.IntRange(1, MAX_IMPORT_BATCH_SIZE), default=IMPORT_BATCH_SIZE,
+                  show_default=True, help='Repositories upserted per transaction')
+    def import_repositories_command(source, batch_size):
+        """Create or update repositories by full_name from a JSON array or NDJSON file ('-' for stdin)"""
+        first_line = source.readline()
+        while first_line and not first_line.strip():
+            first_line = source.readline()
+        if first_line.lstrip().startswith('['):
+            records = json_codec.loads(first_line + source.read())
+        else:
+            records = iter_ndjson(itertools.chain([first_line], source))
+        
+        results, summary = import_repositories(records, batch_size=batch_size)
+        for result in results:
+            if result['status'] in ('invalid', 'failed'):
+                click.echo(f"Record {result['index']} ({result['full_name']}): {result['status']}, {result['error']}", err=True)
+        click.echo(', '.join(f"{count} {status}" for status, count in summary.items()))
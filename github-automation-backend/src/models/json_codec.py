@@ -0,0 +1,70 @@
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON_BACKEND=json forces the standard library even when orjson is installed
+BACKEND = 'orjson' if orjson is not None and os.environ.get('JSON_BACKEND', 'orjson') == 'orjson' else 'json'
+
+def _default(value):
+    """Encode the types the backends do not handle on their own"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if BACKEND == 'orjson':
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(value):
+        """Encode to UTF-8 bytes; datetimes are written as ISO 8601 natively"""
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+
+    def dumps(value):
+        return dumps_bytes(value).decode('utf-8')
+
+    def loads(data):
+        return orjson.loads(data)
+
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    def dumps_bytes(value):
+        """Encode to UTF-8 bytes, formatting datetimes as ISO 8601"""
+        return dumps(value).encode('utf-8')
+
+    def dumps(value):
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def loads(data):
+        return json.loads(data)
+
+    JSONDecodeError = json.JSONDecodeError
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by the codec above.
+
+    Datetimes are written as ISO 8601 like the `isoformat()` calls models
+    used to make, rather than Flask's default HTTP date format. Keys keep
+    their insertion order instead of being sorted.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype='application/json')
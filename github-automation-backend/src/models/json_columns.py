@@ -0,0 +1,60 @@
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import undefer_group
+from sqlalchemy.types import Text, TypeDecorator
+from . import json_codec
+
+# Deferred group holding the JSON documents of a model, see `undefer_group`
+DOCUMENTS_GROUP = 'documents'
+
+class JSONDocument(TypeDecorator):
+    """JSON column stored as JSONB on PostgreSQL and as Text elsewhere.
+
+    Python values are encoded when bound; strings are taken to be JSON that
+    is already encoded, which keeps older code assigning `json.dumps(...)`
+    working. Nothing is decoded on load for Text columns: models decode on
+    first access through `JSONDocumentMixin.json_attribute`.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if dialect.name == 'postgresql':
+            return json_codec.loads(value) if isinstance(value, str) else value
+        return value if isinstance(value, str) else json_codec.dumps(value)
+
+def decode_json(value, default):
+    """Decode a JSON column value, which is raw text unless the driver decoded it"""
+    if value is None or value == '':
+        return default()
+    if not isinstance(value, str):
+        return value
+    try:
+        return json_codec.loads(value)
+    except json_codec.JSONDecodeError:
+        return default()
+
+class JSONDocumentMixin:
+    """Per-attribute, memoised decoding of JSONDocument columns"""
+
+    @classmethod
+    def with_documents(cls):
+        """Loader option fetching the deferred JSON documents together with the rows"""
+        return undefer_group(DOCUMENTS_GROUP)
+
+    def json_attribute(self, name, default=dict):
+        raw = getattr(self, name)
+        cache = self.__dict__.setdefault('_decoded_documents', {})
+        cached = cache.get(name)
+        # Reassigning the attribute replaces the raw object and invalidates the entry
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+        value = decode_json(raw, default)
+        cache[name] = (raw, value)
+        return value
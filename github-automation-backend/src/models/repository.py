@@ -1,16 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import json
+from .json_columns import JSONDocument, JSONDocumentMixin, DOCUMENTS_GROUP
+from .serialization import SerializerMixin
 
 db = SQLAlchemy()
 
-class Repository(db.Model):
+class Repository(SerializerMixin, db.Model):
     __tablename__ = 'repositories'
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     full_name = db.Column(db.String(255), nullable=False, unique=True)
+    github_id = db.Column(db.BigInteger, unique=True)
     url = db.Column(db.String(500), nullable=False)
+    clone_url = db.Column(db.String(500))
+    default_branch = db.Column(db.String(255))
+    private = db.Column(db.Boolean, default=False)
     description = db.Column(db.Text)
     language = db.Column(db.String(100))
     stars = db.Column(db.Integer, default=0)
@@ -33,39 +38,93 @@ class Repository(db.Model):
     has_ci = db.Column(db.Boolean, default=False)
     config_files_count = db.Column(db.Integer, default=0)
     
+    # Activity summary, kept current by models/repository_summary.py
+    analysis_count = db.Column(db.Integer, nullable=False, default=0)
+    latest_analysis_id = db.Column(db.Integer)  # no foreign key, analyses already references repositories
+    latest_analysis_at = db.Column(db.DateTime)
+    commit_analysis_count = db.Column(db.Integer, nullable=False, default=0)
+    prs_generated_count = db.Column(db.Integer, nullable=False, default=0)
+    risk_score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    risk_score_count = db.Column(db.Integer, nullable=False, default=0)
+    quality_score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    quality_score_count = db.Column(db.Integer, nullable=False, default=0)
+    webhook_count = db.Column(db.Integer, nullable=False, default=0)
+    last_webhook_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        # Newest write, for ETags
+        db.Index('ix_repositories_updated', updated_at),
+    )
+    
     # Relationships
     analyses = db.relationship('Analysis', backref='repository', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
+    FIELD_COLUMNS = {
+        'health': ('has_readme', 'has_license', 'has_issues', 'contributor_count', 'pr_count'),
+        'structure': ('total_files', 'has_tests', 'has_documentation', 'has_ci', 'config_files_count'),
+        'summary': (
+            'analysis_count', 'latest_analysis_id', 'latest_analysis_at', 'commit_analysis_count',
+            'prs_generated_count', 'risk_score_sum', 'risk_score_count', 'quality_score_sum',
+            'quality_score_count', 'webhook_count', 'last_webhook_at'
+        ),
+        # Added by the repository listings
+        'latest_analysis': ('latest_analysis_id',),
+    }
+    SUMMARY_FIELDS = ('id', 'name', 'full_name', 'language', 'stars', 'updated_at', 'summary')
+    
+    @property
+    def avg_risk_score(self):
+        return self.risk_score_sum / self.risk_score_count if self.risk_score_count else 0
+    
+    @property
+    def avg_quality_score(self):
+        return self.quality_score_sum / self.quality_score_count if self.quality_score_count else 0
+    
+    def summary_dict(self):
         return {
-            'id': self.id,
-            'name': self.name,
-            'full_name': self.full_name,
-            'url': self.url,
-            'description': self.description,
-            'language': self.language,
-            'stars': self.stars,
-            'forks': self.forks,
-            'open_issues': self.open_issues,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'health': {
+            'analysis_count': self.analysis_count or 0,
+            'latest_analysis_id': self.latest_analysis_id,
+            'last_analysis': self.latest_analysis_at,
+            'commit_analysis_count': self.commit_analysis_count or 0,
+            'prs_generated': self.prs_generated_count or 0,
+            'avg_risk_score': round(self.avg_risk_score, 1),
+            'avg_quality_score': round(self.avg_quality_score, 1),
+            'webhook_count': self.webhook_count or 0,
+            'last_webhook_at': self.last_webhook_at
+        }
+    
+    def to_dict(self, fields=None):
+        return self.serialize(fields, {
+            'id': lambda: self.id,
+            'name': lambda: self.name,
+            'full_name': lambda: self.full_name,
+            'url': lambda: self.url,
+            'default_branch': lambda: self.default_branch,
+            'description': lambda: self.description,
+            'language': lambda: self.language,
+            'stars': lambda: self.stars,
+            'forks': lambda: self.forks,
+            'open_issues': lambda: self.open_issues,
+            'created_at': lambda: self.created_at,
+            'updated_at': lambda: self.updated_at,
+            'health': lambda: {
                 'has_readme': self.has_readme,
                 'has_license': self.has_license,
                 'has_issues': self.has_issues,
                 'contributor_count': self.contributor_count,
                 'pr_count': self.pr_count
             },
-            'structure': {
+            'structure': lambda: {
                 'total_files': self.total_files,
                 'has_tests': self.has_tests,
                 'has_documentation': self.has_documentation,
                 'has_ci': self.has_ci,
                 'config_files_count': self.config_files_count
-            }
-        }
+            },
+            'summary': self.summary_dict
+        })
 
-class Analysis(db.Model):
+class Analysis(SerializerMixin, JSONDocumentMixin, db.Model):
     __tablename__ = 'analyses'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -80,16 +139,16 @@ class Analysis(db.Model):
     overall_health_score = db.Column(db.Integer)
     architecture_analysis = db.Column(db.Text)
     
-    # Analysis results stored as JSON
-    bugs_detected = db.Column(db.Text)  # JSON string
-    improvements_suggested = db.Column(db.Text)  # JSON string
-    feature_ideas = db.Column(db.Text)  # JSON string
-    security_concerns = db.Column(db.Text)  # JSON string
-    performance_issues = db.Column(db.Text)  # JSON string
-    documentation_gaps = db.Column(db.Text)  # JSON string
+    # Analysis results, JSON documents loaded only when accessed
+    bugs_detected = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)
+    improvements_suggested = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)
+    feature_ideas = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)
+    security_concerns = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)
+    performance_issues = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)
+    documentation_gaps = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)
     
     # Test coverage analysis
-    test_coverage_analysis = db.Column(db.Text)  # JSON string
+    test_coverage_analysis = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)
     
     # Code quality metrics
     maintainability_score = db.Column(db.Integer)
@@ -98,82 +157,93 @@ class Analysis(db.Model):
     duplication_score = db.Column(db.Integer)
     
     # Recommendations
-    recommendations = db.Column(db.Text)  # JSON string
+    recommendations = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)
+    
+    __table_args__ = (
+        db.Index('ix_analyses_repository_created', repository_id, created_at.desc()),
+        # Newest write, for ETags
+        db.Index('ix_analyses_created', created_at),
+    )
+    
+    FIELD_COLUMNS = {
+        'code_quality_metrics': ('maintainability_score', 'readability_score', 'complexity_score', 'duplication_score'),
+    }
+    SUMMARY_FIELDS = ('id', 'repository_id', 'analysis_type', 'status', 'created_at', 'overall_health_score', 'code_quality_metrics')
     
     def set_bugs_detected(self, bugs_list):
-        self.bugs_detected = json.dumps(bugs_list) if bugs_list else None
+        self.bugs_detected = bugs_list if bugs_list else None
     
     def get_bugs_detected(self):
-        return json.loads(self.bugs_detected) if self.bugs_detected else []
+        return self.json_attribute('bugs_detected', list)
     
     def set_improvements_suggested(self, improvements_list):
-        self.improvements_suggested = json.dumps(improvements_list) if improvements_list else None
+        self.improvements_suggested = improvements_list if improvements_list else None
     
     def get_improvements_suggested(self):
-        return json.loads(self.improvements_suggested) if self.improvements_suggested else []
+        return self.json_attribute('improvements_suggested', list)
     
     def set_feature_ideas(self, features_list):
-        self.feature_ideas = json.dumps(features_list) if features_list else None
+        self.feature_ideas = features_list if features_list else None
     
     def get_feature_ideas(self):
-        return json.loads(self.feature_ideas) if self.feature_ideas else []
+        return self.json_attribute('feature_ideas', list)
     
     def set_security_concerns(self, security_list):
-        self.security_concerns = json.dumps(security_list) if security_list else None
+        self.security_concerns = security_list if security_list else None
     
     def get_security_concerns(self):
-        return json.loads(self.security_concerns) if self.security_concerns else []
+        return self.json_attribute('security_concerns', list)
     
     def set_performance_issues(self, performance_list):
-        self.performance_issues = json.dumps(performance_list) if performance_list else None
+        self.performance_issues = performance_list if performance_list else None
     
     def get_performance_issues(self):
-        return json.loads(self.performance_issues) if self.performance_issues else []
+        return self.json_attribute('performance_issues', list)
     
     def set_documentation_gaps(self, docs_list):
-        self.documentation_gaps = json.dumps(docs_list) if docs_list else None
+        self.documentation_gaps = docs_list if docs_list else None
     
     def get_documentation_gaps(self):
-        return json.loads(self.documentation_gaps) if self.documentation_gaps else []
+        return self.json_attribute('documentation_gaps', list)
     
     def set_test_coverage_analysis(self, coverage_dict):
-        self.test_coverage_analysis = json.dumps(coverage_dict) if coverage_dict else None
+        self.test_coverage_analysis = coverage_dict if coverage_dict else None
     
     def get_test_coverage_analysis(self):
-        return json.loads(self.test_coverage_analysis) if self.test_coverage_analysis else {}
+        return self.json_attribute('test_coverage_analysis', dict)
     
     def set_recommendations(self, recommendations_dict):
-        self.recommendations = json.dumps(recommendations_dict) if recommendations_dict else None
+        self.recommendations = recommendations_dict if recommendations_dict else None
     
     def get_recommendations(self):
-        return json.loads(self.recommendations) if self.recommendations else {}
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'repository_id': self.repository_id,
-            'analysis_type': self.analysis_type,
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'overall_health_score': self.overall_health_score,
-            'architecture_analysis': self.architecture_analysis,
-            'bugs_detected': self.get_bugs_detected(),
-            'improvements_suggested': self.get_improvements_suggested(),
-            'feature_ideas': self.get_feature_ideas(),
-            'security_concerns': self.get_security_concerns(),
-            'performance_issues': self.get_performance_issues(),
-            'documentation_gaps': self.get_documentation_gaps(),
-            'test_coverage_analysis': self.get_test_coverage_analysis(),
-            'code_quality_metrics': {
+        return self.json_attribute('recommendations', dict)
+    
+    def to_dict(self, fields=None):
+        return self.serialize(fields, {
+            'id': lambda: self.id,
+            'repository_id': lambda: self.repository_id,
+            'analysis_type': lambda: self.analysis_type,
+            'status': lambda: self.status,
+            'created_at': lambda: self.created_at,
+            'overall_health_score': lambda: self.overall_health_score,
+            'architecture_analysis': lambda: self.architecture_analysis,
+            'bugs_detected': self.get_bugs_detected,
+            'improvements_suggested': self.get_improvements_suggested,
+            'feature_ideas': self.get_feature_ideas,
+            'security_concerns': self.get_security_concerns,
+            'performance_issues': self.get_performance_issues,
+            'documentation_gaps': self.get_documentation_gaps,
+            'test_coverage_analysis': self.get_test_coverage_analysis,
+            'code_quality_metrics': lambda: {
                 'maintainability': self.maintainability_score,
                 'readability': self.readability_score,
                 'complexity': self.complexity_score,
                 'duplication': self.duplication_score
             },
-            'recommendations': self.get_recommendations()
-        }
+            'recommendations': self.get_recommendations
+        })
 
-class AutomationEntry(db.Model):
+class AutomationEntry(SerializerMixin, JSONDocumentMixin, db.Model):
     __tablename__ = 'automation_entries'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -190,32 +260,42 @@ class AutomationEntry(db.Model):
     pr_title = db.Column(db.String(500))
     pr_url = db.Column(db.String(500))
     
-    # Metadata stored as JSON
-    entry_metadata = db.Column(db.Text)  # JSON string for additional data
+    # Metadata, a JSON document loaded only when accessed
+    entry_metadata = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)  # additional data
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_automation_entries_repository_created', repository_id, created_at.desc()),
+        # Newest write, for ETags
+        db.Index('ix_automation_entries_updated', updated_at),
+    )
+    
+    FIELD_COLUMNS = {
+        'metadata': ('entry_metadata',),
+    }
+    SUMMARY_FIELDS = ('id', 'repository_id', 'analysis_id', 'action', 'status', 'pr_url', 'created_at', 'updated_at')
+    
     def set_metadata(self, metadata_dict):
-        self.entry_metadata = json.dumps(metadata_dict) if metadata_dict else None
+        self.entry_metadata = metadata_dict if metadata_dict else None
     
     def get_metadata(self):
-        return json.loads(self.entry_metadata) if self.entry_metadata else {}
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'repository_id': self.repository_id,
-            'analysis_id': self.analysis_id,
-            'action': self.action,
-            'status': self.status,
-            'details': self.details,
-            'branch_name': self.branch_name,
-            'pr_title': self.pr_title,
-            'pr_url': self.pr_url,
-            'metadata': self.get_metadata(),
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
-
+        return self.json_attribute('entry_metadata', dict)
+    
+    def to_dict(self, fields=None):
+        return self.serialize(fields, {
+            'id': lambda: self.id,
+            'repository_id': lambda: self.repository_id,
+            'analysis_id': lambda: self.analysis_id,
+            'action': lambda: self.action,
+            'status': lambda: self.status,
+            'details': lambda: self.details,
+            'branch_name': lambda: self.branch_name,
+            'pr_title': lambda: self.pr_title,
+            'pr_url': lambda: self.pr_url,
+            'metadata': self.get_metadata,
+            'created_at': lambda: self.created_at,
+            'updated_at': lambda: self.updated_at
+        })
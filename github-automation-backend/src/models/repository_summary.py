@@ -0,0 +1,211 @@
+from collections import defaultdict
+from sqlalchemy import case, event, func, select, update
+from sqlalchemy.orm import Session
+from .repository import db, Repository, Analysis
+from .webhook import WebhookEvent, CommitAnalysis
+from .rollup import count_where, row_contribution, update_contribution
+
+# Rollup counters that are also kept on the repository row
+SUMMARY_COLUMNS = {
+    'analyses': 'analysis_count',
+    'commit_analyses': 'commit_analysis_count',
+    'prs_generated': 'prs_generated_count',
+    'risk_score_sum': 'risk_score_sum',
+    'risk_score_count': 'risk_score_count',
+    'quality_score_sum': 'quality_score_sum',
+    'quality_score_count': 'quality_score_count',
+    'webhook_events': 'webhook_count',
+}
+
+SUMMARIZED_MODELS = (Analysis, CommitAnalysis, WebhookEvent)
+
+def _later(column, value):
+    """Keep whichever of the stored and the new datetime is later"""
+    return case((column.is_(None), value), (column < value, value), else_=column)
+
+def collect_summary_changes(session):
+    """Per repository: counter deltas, the newest analysis and webhook, and deleted analyses"""
+    changes = defaultdict(lambda: {'counters': defaultdict(int), 'analysis': None, 'webhook_at': None, 'deleted_analyses': []})
+
+    def add_counters(repository_id, delta):
+        for column, value in delta.items():
+            if column in SUMMARY_COLUMNS and value:
+                changes[repository_id]['counters'][SUMMARY_COLUMNS[column]] += value
+
+    for instance in session.new:
+        if not isinstance(instance, SUMMARIZED_MODELS) or not instance.repository_id:
+            continue
+        change = changes[instance.repository_id]
+        add_counters(instance.repository_id, row_contribution(instance, 1))
+        if isinstance(instance, Analysis):
+            newest = change['analysis']
+            if newest is None or (instance.created_at, instance.id) > (newest.created_at, newest.id):
+                change['analysis'] = instance
+        elif isinstance(instance, WebhookEvent):
+            if change['webhook_at'] is None or instance.created_at > change['webhook_at']:
+                change['webhook_at'] = instance.created_at
+
+    for instance in session.deleted:
+        if not isinstance(instance, SUMMARIZED_MODELS) or not instance.repository_id:
+            continue
+        add_counters(instance.repository_id, row_contribution(instance, -1))
+        if isinstance(instance, Analysis):
+            changes[instance.repository_id]['deleted_analyses'].append(instance.id)
+
+    for instance in session.dirty:
+        if isinstance(instance, CommitAnalysis) and instance.repository_id and session.is_modified(instance):
+            add_counters(instance.repository_id, update_contribution(instance))
+
+    return changes
+
+def apply_summary_changes(connection, changes):
+    """Fold the collected changes into the repository rows with relative UPDATEs"""
+    table = Repository.__table__
+    # Ascending ids, so concurrent transactions lock repositories in the same order
+    for repository_id in sorted(changes):
+        change = changes[repository_id]
+        # Leave updated_at alone, the repository itself did not change
+        values = {'updated_at': table.c.updated_at}
+        for column, delta in change['counters'].items():
+            values[column] = func.coalesce(table.c[column], 0) + delta
+
+        analysis = change['analysis']
+        if analysis is not None:
+            is_newer = table.c.latest_analysis_at.is_(None) | (table.c.latest_analysis_at <= analysis.created_at)
+            values['latest_analysis_id'] = case((is_newer, analysis.id), else_=table.c.latest_analysis_id)
+            values['latest_analysis_at'] = _later(table.c.latest_analysis_at, analysis.created_at)
+
+        if change['webhook_at'] is not None:
+            values['last_webhook_at'] = _later(table.c.last_webhook_at, change['webhook_at'])
+
+        if len(values) > 1:
+            connection.execute(update(table).where(table.c.id == repository_id).values(values))
+
+        if change['deleted_analyses']:
+            # The latest analysis went away, fall back to the newest one left
+            analyses = Analysis.__table__
+            newest = select(analyses.c.id, analyses.c.created_at)\
+                .where(analyses.c.repository_id == repository_id)\
+                .order_by(analyses.c.created_at.desc(), analyses.c.id.desc())\
+                .limit(1)
+            row = connection.execute(newest).first()
+            connection.execute(
+                update(table)
+                .where(table.c.id == repository_id, table.c.latest_analysis_id.in_(change['deleted_analyses']))
+                .values(
+                    updated_at=table.c.updated_at,
+                    latest_analysis_id=row.id if row else None,
+                    latest_analysis_at=row.created_at if row else None
+                )
+            )
+
+def merge_summary_changes(pending, changes):
+    """Fold the changes of one flush into those collected earlier in the transaction"""
+    for repository_id, change in changes.items():
+        if repository_id not in pending:
+            pending[repository_id] = change
+            continue
+        merged = pending[repository_id]
+        for column, delta in change['counters'].items():
+            merged['counters'][column] += delta
+        analysis, newest = change['analysis'], merged['analysis']
+        if analysis is not None and (newest is None or (analysis.created_at, analysis.id) > (newest.created_at, newest.id)):
+            merged['analysis'] = analysis
+        if change['webhook_at'] is not None and (merged['webhook_at'] is None or change['webhook_at'] > merged['webhook_at']):
+            merged['webhook_at'] = change['webhook_at']
+        merged['deleted_analyses'].extend(change['deleted_analyses'])
+
+# session.info key holding the changes of flushes not yet written
+PENDING_CHANGES_KEY = 'pending_summary_changes'
+
+@event.listens_for(Session, 'after_flush')
+def collect_repository_summaries_after_flush(session, flush_context):
+    """Collect the summary changes of every flush.
+
+    The UPDATE locks the repository row, so it is left until commit rather
+    than held across whatever else the transaction does, such as the
+    OpenAI and pull request calls of a commit analysis.
+    """
+    if session.info.get('skip_repository_summaries'):
+        return
+    changes = collect_summary_changes(session)
+    if changes:
+        merge_summary_changes(session.info.setdefault(PENDING_CHANGES_KEY, {}), changes)
+
+@event.listens_for(Session, 'before_commit')
+def apply_repository_summaries_before_commit(session):
+    """Write the collected summary changes as the last statements of the transaction"""
+    # before_commit runs ahead of the commit's own flush
+    session.flush()
+    changes = session.info.pop(PENDING_CHANGES_KEY, None)
+    if changes:
+        apply_summary_changes(session.connection(), changes)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_repository_summaries_after_rollback(session):
+    session.info.pop(PENDING_CHANGES_KEY, None)
+
+def reconcile_repository_summaries():
+    """Recompute the summary columns of every repository from the source tables.
+
+    Repairs drift from writes that bypassed the ORM, such as bulk SQL or
+    manual fixes. Only repositories whose values differ are updated.
+    Returns the number of repositories corrected.
+    """
+    expected = defaultdict(lambda: {column: 0 for column in SUMMARY_COLUMNS.values()})
+
+    def accumulate(model, columns):
+        query = db.session.query(model.repository_id, *columns.values()).group_by(model.repository_id)
+        for repository_id, *values in query:
+            for column, value in zip(columns, values):
+                expected[repository_id][column] = value if column.endswith('_at') else int(value or 0)
+
+    accumulate(Analysis, {'analysis_count': func.count(Analysis.id)})
+    accumulate(CommitAnalysis, {
+        'commit_analysis_count': func.count(CommitAnalysis.id),
+        'prs_generated_count': count_where(CommitAnalysis.pr_generated == True),
+        'risk_score_sum': func.coalesce(func.sum(CommitAnalysis.risk_score), 0),
+        'risk_score_count': func.count(CommitAnalysis.risk_score),
+        'quality_score_sum': func.coalesce(func.sum(CommitAnalysis.quality_score), 0),
+        'quality_score_count': func.count(CommitAnalysis.quality_score),
+    })
+    accumulate(WebhookEvent, {
+        'webhook_count': func.count(WebhookEvent.id),
+        'last_webhook_at': func.max(WebhookEvent.created_at),
+    })
+
+    ranked = db.session.query(
+        Analysis.repository_id,
+        Analysis.id,
+        Analysis.created_at,
+        func.row_number().over(
+            partition_by=Analysis.repository_id,
+            order_by=(Analysis.created_at.desc(), Analysis.id.desc())
+        ).label('rank')
+    ).subquery()
+    for repository_id, analysis_id, created_at in db.session.query(
+        ranked.c.repository_id, ranked.c.id, ranked.c.created_at
+    ).filter(ranked.c.rank == 1):
+        expected[repository_id]['latest_analysis_id'] = analysis_id
+        expected[repository_id]['latest_analysis_at'] = created_at
+
+    summary_columns = list(SUMMARY_COLUMNS.values()) + ['latest_analysis_id', 'latest_analysis_at', 'last_webhook_at']
+    corrections = []
+    current = db.session.query(
+        Repository.id, Repository.updated_at, *(getattr(Repository, column) for column in summary_columns)
+    )
+    for repository in current:
+        target = expected.get(repository.id, {})
+        changed = {}
+        for column in summary_columns:
+            value = target.get(column, None if column.startswith(('latest_', 'last_')) else 0)
+            if getattr(repository, column) != value:
+                changed[column] = value
+        if changed:
+            # Carry updated_at over so the bulk UPDATE does not bump it
+            corrections.append({'id': repository.id, 'updated_at': repository.updated_at, **changed})
+
+    if corrections:
+        db.session.execute(update(Repository), corrections)
+        db.session.commit()
+    return len(corrections)
@@ -0,0 +1,318 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import case, event, func, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from .repository import db, Analysis, AutomationEntry
+from .webhook import WebhookEvent, CommitAnalysis, ActionLog
+
+# Rollup rows with this repository id hold totals across all repositories
+GLOBAL_REPOSITORY_ID = 0
+
+LOG_LEVELS = ('info', 'success', 'warning', 'error')
+
+class StatsRollup(db.Model):
+    """Hourly counters per repository, plus global rows with repository_id 0.
+
+    Rows are kept current by the listeners below, in the same transaction
+    as the rows they count, so dashboards can sum a handful of
+    buckets instead of counting whole tables. `rebuild_rollups` recomputes
+    everything from the source tables.
+    """
+    __tablename__ = 'stats_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_start = db.Column(db.DateTime, nullable=False)  # start of the hour
+    repository_id = db.Column(db.Integer, nullable=False, default=GLOBAL_REPOSITORY_ID)
+
+    # Event counts
+    webhook_events = db.Column(db.Integer, nullable=False, default=0)
+    webhooks_processed = db.Column(db.Integer, nullable=False, default=0)
+    commit_analyses = db.Column(db.Integer, nullable=False, default=0)
+    prs_generated = db.Column(db.Integer, nullable=False, default=0)
+    analyses = db.Column(db.Integer, nullable=False, default=0)
+    automation_entries = db.Column(db.Integer, nullable=False, default=0)
+
+    # Log level counts
+    log_info = db.Column(db.Integer, nullable=False, default=0)
+    log_success = db.Column(db.Integer, nullable=False, default=0)
+    log_warning = db.Column(db.Integer, nullable=False, default=0)
+    log_error = db.Column(db.Integer, nullable=False, default=0)
+
+    # Score sums, averages are sum / count
+    risk_score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    risk_score_count = db.Column(db.Integer, nullable=False, default=0)
+    quality_score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    quality_score_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('repository_id', 'bucket_start', name='uq_stats_rollups_repository_bucket'),
+    )
+
+# Every counter column, in table order
+COUNTER_COLUMNS = [
+    column.name for column in StatsRollup.__table__.columns
+    if column.name not in ('id', 'bucket_start', 'repository_id')
+]
+
+def hour_bucket(value):
+    """Start of the hour a datetime falls into"""
+    return (value or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+def date_bucket(column, granularity):
+    """SQL expression truncating a datetime column to its hour, day or week"""
+    if db.engine.dialect.name == 'postgresql':
+        return func.date_trunc(granularity, column)
+    if granularity == 'hour':
+        return func.strftime('%Y-%m-%d %H:00:00', column)
+    if granularity == 'day':
+        return func.strftime('%Y-%m-%d 00:00:00', column)
+    # Monday of the week, matching date_trunc('week')
+    return func.strftime('%Y-%m-%d 00:00:00', column, 'weekday 0', '-6 days')
+
+def count_where(condition):
+    """COUNT of the rows matching a condition, for use next to other aggregates"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def _history_values(instance, attribute):
+    """Return (old, new) values of an attribute changed in this flush"""
+    history = inspect(instance).attrs[attribute].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+def _score_deltas(delta, prefix, old, new):
+    if old is not None:
+        delta[f'{prefix}_sum'] -= old
+        delta[f'{prefix}_count'] -= 1
+    if new is not None:
+        delta[f'{prefix}_sum'] += new
+        delta[f'{prefix}_count'] += 1
+
+def row_contribution(instance, sign):
+    """Counter deltas for a row that appears (sign 1) or disappears (sign -1)"""
+    delta = defaultdict(int)
+    if isinstance(instance, WebhookEvent):
+        delta['webhook_events'] += sign
+        if instance.processed:
+            delta['webhooks_processed'] += sign
+    elif isinstance(instance, CommitAnalysis):
+        delta['commit_analyses'] += sign
+        if instance.pr_generated:
+            delta['prs_generated'] += sign
+        for prefix, score in (('risk_score', instance.risk_score), ('quality_score', instance.quality_score)):
+            if score is not None:
+                delta[f'{prefix}_sum'] += sign * score
+                delta[f'{prefix}_count'] += sign
+    elif isinstance(instance, Analysis):
+        delta['analyses'] += sign
+    elif isinstance(instance, AutomationEntry):
+        delta['automation_entries'] += sign
+    elif isinstance(instance, ActionLog):
+        if instance.level in LOG_LEVELS:
+            delta[f'log_{instance.level}'] += sign
+    return delta
+
+def update_contribution(instance):
+    """Counter deltas for the columns of an existing row changed in this flush"""
+    delta = defaultdict(int)
+    if isinstance(instance, WebhookEvent):
+        change = _history_values(instance, 'processed')
+        if change:
+            delta['webhooks_processed'] += bool(change[1]) - bool(change[0])
+    elif isinstance(instance, CommitAnalysis):
+        change = _history_values(instance, 'pr_generated')
+        if change:
+            delta['prs_generated'] += bool(change[1]) - bool(change[0])
+        for prefix in ('risk_score', 'quality_score'):
+            change = _history_values(instance, prefix)
+            if change:
+                _score_deltas(delta, prefix, *change)
+    elif isinstance(instance, ActionLog):
+        change = _history_values(instance, 'level')
+        if change:
+            old, new = change
+            if old in LOG_LEVELS:
+                delta[f'log_{old}'] -= 1
+            if new in LOG_LEVELS:
+                delta[f'log_{new}'] += 1
+    return delta
+
+TRACKED_MODELS = (WebhookEvent, CommitAnalysis, Analysis, AutomationEntry, ActionLog)
+
+def collect_rollup_deltas(session):
+    """Sum the counter changes of a flush per (repository_id, bucket_start)"""
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    def add(instance, delta):
+        if not any(delta.values()):
+            return
+        bucket = hour_bucket(instance.created_at)
+        keys = [(GLOBAL_REPOSITORY_ID, bucket)]
+        if instance.repository_id:
+            keys.append((instance.repository_id, bucket))
+        for key in keys:
+            for column, value in delta.items():
+                deltas[key][column] += value
+
+    for instance in session.new:
+        if isinstance(instance, TRACKED_MODELS):
+            add(instance, row_contribution(instance, 1))
+    for instance in session.deleted:
+        if isinstance(instance, TRACKED_MODELS):
+            add(instance, row_contribution(instance, -1))
+    for instance in session.dirty:
+        if isinstance(instance, TRACKED_MODELS) and session.is_modified(instance):
+            add(instance, update_contribution(instance))
+
+    return deltas
+
+def apply_rollup_deltas(connection, deltas):
+    """Add counter deltas to the rollup rows, creating missing rows"""
+    if not deltas:
+        return
+
+    rows = []
+    # Stable order, so concurrent transactions lock rows in the same sequence
+    for (repository_id, bucket_start), delta in sorted(deltas.items()):
+        row = {column: 0 for column in COUNTER_COLUMNS}
+        row.update(delta)
+        row.update({'repository_id': repository_id, 'bucket_start': bucket_start})
+        rows.append(row)
+
+    table = StatsRollup.__table__
+    dialect_name = connection.dialect.name
+    if dialect_name in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+        statement = insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=['repository_id', 'bucket_start'],
+            set_={column: table.c[column] + statement.excluded[column] for column in COUNTER_COLUMNS}
+        )
+        connection.execute(statement)
+        return
+
+    # Portable fallback: update in place, insert what did not exist yet
+    for row in rows:
+        result = connection.execute(
+            table.update()
+            .where(table.c.repository_id == row['repository_id'], table.c.bucket_start == row['bucket_start'])
+            .values({column: table.c[column] + row[column] for column in COUNTER_COLUMNS})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(row))
+
+# session.info key holding the deltas of flushes not yet written
+PENDING_DELTAS_KEY = 'pending_rollup_deltas'
+
+@event.listens_for(Session, 'after_flush')
+def collect_rollups_after_flush(session, flush_context):
+    """Add the counter changes of every flush to the pending deltas.
+
+    Nothing is written here: the upsert locks the global row of the current
+    hour, which every transaction touches, so it waits until commit.
+    """
+    if session.info.get('skip_rollups'):
+        return
+    pending = session.info.setdefault(PENDING_DELTAS_KEY, defaultdict(lambda: defaultdict(int)))
+    for key, delta in collect_rollup_deltas(session).items():
+        for column, value in delta.items():
+            pending[key][column] += value
+
+@event.listens_for(Session, 'before_commit')
+def apply_rollups_before_commit(session):
+    """Write the pending deltas last, so the rollup row locks are held only for the commit"""
+    # before_commit runs ahead of the commit's own flush
+    session.flush()
+    deltas = session.info.pop(PENDING_DELTAS_KEY, None)
+    if deltas:
+        apply_rollup_deltas(session.connection(), deltas)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_rollups_after_rollback(session):
+    session.info.pop(PENDING_DELTAS_KEY, None)
+
+def rebuild_rollups():
+    """Recompute every rollup row from the source tables.
+
+    Runs in a single transaction, so readers keep seeing the old rollups
+    until the rebuild commits. On PostgreSQL the rollup table is locked
+    against writes first: a transaction committing counted rows meanwhile
+    waits at its rollup upsert and adds its deltas on top of the rebuilt
+    rows, instead of having them wiped by the delete or counted twice.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text(f'LOCK TABLE {StatsRollup.__tablename__} IN EXCLUSIVE MODE'))
+
+    bucket_rows = defaultdict(lambda: defaultdict(int))
+
+    def accumulate(model, columns):
+        bucket = date_bucket(model.created_at, 'hour').label('bucket')
+        query = db.session.query(model.repository_id, bucket, *columns.values())\
+            .group_by(model.repository_id, bucket)
+        for repository_id, bucket_start, *values in query:
+            if isinstance(bucket_start, str):
+                bucket_start = datetime.fromisoformat(bucket_start)
+            keys = [(GLOBAL_REPOSITORY_ID, bucket_start)]
+            if repository_id:
+                keys.append((repository_id, bucket_start))
+            for key in keys:
+                for column, value in zip(columns, values):
+                    bucket_rows[key][column] += int(value or 0)
+
+    accumulate(WebhookEvent, {
+        'webhook_events': func.count(WebhookEvent.id),
+        'webhooks_processed': count_where(WebhookEvent.processed == True),
+    })
+    accumulate(CommitAnalysis, {
+        'commit_analyses': func.count(CommitAnalysis.id),
+        'prs_generated': count_where(CommitAnalysis.pr_generated == True),
+        'risk_score_sum': func.coalesce(func.sum(CommitAnalysis.risk_score), 0),
+        'risk_score_count': func.count(CommitAnalysis.risk_score),
+        'quality_score_sum': func.coalesce(func.sum(CommitAnalysis.quality_score), 0),
+        'quality_score_count': func.count(CommitAnalysis.quality_score),
+    })
+    accumulate(Analysis, {'analyses': func.count(Analysis.id)})
+    accumulate(AutomationEntry, {'automation_entries': func.count(AutomationEntry.id)})
+    accumulate(ActionLog, {
+        f'log_{level}': count_where(ActionLog.level == level) for level in LOG_LEVELS
+    })
+
+    db.session.query(StatsRollup).delete()
+    rows = []
+    for (repository_id, bucket_start), counters in bucket_rows.items():
+        row = {column: counters.get(column, 0) for column in COUNTER_COLUMNS}
+        row.update({'repository_id': repository_id, 'bucket_start': bucket_start})
+        rows.append(row)
+    if rows:
+        db.session.execute(StatsRollup.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+def sum_rollups(columns, since=None, repository_id=GLOBAL_REPOSITORY_ID):
+    """Sum rollup counters over all buckets (or those since a datetime)"""
+    query = db.session.query(
+        *(func.coalesce(func.sum(getattr(StatsRollup, column)), 0) for column in columns)
+    ).filter(StatsRollup.repository_id == repository_id)
+    if since is not None:
+        query = query.filter(StatsRollup.bucket_start >= hour_bucket(since))
+    return dict(zip(columns, (int(value) for value in query.one())))
+
+def rollup_series(columns, since, granularity='hour', repository_id=GLOBAL_REPOSITORY_ID):
+    """Rollup counters since a datetime per hour, day or week, as (bucket_start, {column: value}).
+
+    The hourly rows are summed into the buckets by the database, so only
+    one row per non-empty bucket comes back.
+    """
+    bucket = date_bucket(StatsRollup.bucket_start, granularity).label('bucket')
+    query = db.session.query(bucket, *(func.sum(getattr(StatsRollup, column)) for column in columns))\
+        .filter(StatsRollup.repository_id == repository_id, StatsRollup.bucket_start >= hour_bucket(since))\
+        .group_by(bucket).order_by(bucket)
+    series = []
+    for bucket_start, *values in query:
+        if isinstance(bucket_start, str):
+            bucket_start = datetime.fromisoformat(bucket_start)
+        series.append((bucket_start, dict(zip(columns, (int(value or 0) for value in values)))))
+    return series
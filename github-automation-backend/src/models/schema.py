@@ -0,0 +1,80 @@
+from sqlalchemy import inspect, literal, text, update
+from .repository import Repository
+from .webhook import WebhookEvent, CommitAnalysis, ActionLog
+
+# Columns added to tables that already existed, which db.create_all() does
+# not add. `flask migrate-schema` adds them to databases created earlier.
+ADDED_COLUMNS = {
+    Repository: (
+        'github_id', 'clone_url', 'default_branch', 'private',
+        # Summary columns, filled by `flask reconcile-summaries`
+        'analysis_count', 'latest_analysis_id', 'latest_analysis_at',
+        'commit_analysis_count', 'prs_generated_count',
+        'risk_score_sum', 'risk_score_count', 'quality_score_sum', 'quality_score_count',
+        'webhook_count', 'last_webhook_at',
+    ),
+    CommitAnalysis: ('committed_at',),
+    WebhookEvent: ('committed_at',),
+    ActionLog: ('committed_at',),
+}
+
+# Values given to the existing rows when a column is added, other than its default
+BACKFILLS = {
+    # Rows older than the column were committed right after their insert
+    CommitAnalysis.__table__.c.committed_at: CommitAnalysis.__table__.c.created_at,
+    WebhookEvent.__table__.c.committed_at: WebhookEvent.__table__.c.created_at,
+    ActionLog.__table__.c.committed_at: ActionLog.__table__.c.created_at,
+}
+
+def column_definition(column, dialect):
+    """DDL for adding a model column, with its scalar default as server default"""
+    definition = f'"{column.name}" {column.type.compile(dialect=dialect)}'
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        rendered = literal(default, column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        definition += f" DEFAULT {rendered}"
+    if not column.nullable:
+        definition += ' NOT NULL'
+    return definition
+
+def migrate_schema(engine):
+    """Add the columns in ADDED_COLUMNS to existing tables that lack them.
+
+    Columns with a default get it as server default, which fills existing
+    rows and lets NOT NULL columns be added; BACKFILLS fill the others, and
+    unique columns get a unique index. Each table is altered in its own
+    transaction, and columns already present are left alone, so the
+    command is safe to run repeatedly.
+    Returns (table, column, outcome) tuples.
+    """
+    is_postgres = engine.dialect.name == 'postgresql'
+    results = []
+    for model, column_names in ADDED_COLUMNS.items():
+        table = model.__table__
+        with engine.begin() as connection:
+            inspector = inspect(connection)
+            if not inspector.has_table(table.name):
+                # db.create_all() creates it with every column
+                results.extend((table.name, column_name, 'table missing') for column_name in column_names)
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            if is_postgres:
+                connection.execute(text("SET LOCAL lock_timeout = '10s'"))
+
+            for column_name in column_names:
+                if column_name in existing:
+                    results.append((table.name, column_name, 'already present'))
+                    continue
+                column = table.c[column_name]
+                connection.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN {column_definition(column, connection.dialect)}'
+                ))
+                if column in BACKFILLS:
+                    connection.execute(update(table).values({column: BACKFILLS[column]}))
+                if column.unique:
+                    connection.execute(text(
+                        f'CREATE UNIQUE INDEX IF NOT EXISTS "uq_{table.name}_{column_name}" '
+                        f'ON "{table.name}" ("{column_name}")'
+                    ))
+                results.append((table.name, column_name, 'added'))
+    return results
@@ -0,0 +1,34 @@
+from sqlalchemy.orm import load_only
+
+class SerializerMixin:
+    """Sparse fieldsets: `to_dict(fields)` and the columns those fields read"""
+
+    # to_dict fields not named after a single column, with the columns they read
+    FIELD_COLUMNS = {}
+
+    # Fields returned for `view=summary`
+    SUMMARY_FIELDS = ()
+
+    @classmethod
+    def field_names(cls):
+        return set(cls.__table__.columns.keys()) | set(cls.FIELD_COLUMNS)
+
+    @classmethod
+    def load_fields(cls, fields):
+        """Loader option selecting only the columns needed to serialise `fields`.
+
+        The primary key and created_at are always loaded, as they are needed
+        for identity and cursors.
+        """
+        columns = {'id', 'created_at'}
+        for field in fields:
+            columns.update(cls.FIELD_COLUMNS.get(field, (field,)))
+        return load_only(*(getattr(cls, column) for column in sorted(columns) if column in cls.__table__.columns))
+
+    @staticmethod
+    def serialize(fields, serializers):
+        """Call only the serializers of the requested fields, all of them for None"""
+        return {
+            key: serializer() for key, serializer in serializers.items()
+            if fields is None or key in fields
+        }
@@ -1,20 +1,36 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import json
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from .repository import db
+from .json_columns import JSONDocument, JSONDocumentMixin, DOCUMENTS_GROUP
+from .serialization import SerializerMixin
 
-db = SQLAlchemy()
-
-class WebhookEvent(db.Model):
+class WebhookEvent(SerializerMixin, JSONDocumentMixin, db.Model):
     __tablename__ = 'webhook_events'
     
     id = db.Column(db.Integer, primary_key=True)
     event_type = db.Column(db.String(50), nullable=False)  # push, pull_request, etc.
     repository_id = db.Column(db.Integer, db.ForeignKey('repositories.id'), nullable=False)
     github_delivery_id = db.Column(db.String(100), unique=True, nullable=False)
-    payload = db.Column(db.Text, nullable=False)  # JSON string of the full payload
+    payload = db.deferred(db.Column(JSONDocument, nullable=False), group=DOCUMENTS_GROUP)  # the full payload
     processed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed_at = db.Column(db.DateTime)
+    # Stamped when the transaction writing the row commits, see stamp_committed_at
+    committed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_webhook_events_repository_created', repository_id, created_at.desc()),
+        db.Index('ix_webhook_events_created', created_at.desc()),
+        db.Index('ix_webhook_events_committed', committed_at, id),
+        # Only the processing backlog, which stays small
+        db.Index(
+            'ix_webhook_events_unprocessed', created_at,
+            postgresql_where=(processed == False), sqlite_where=(processed == False)
+        ),
+    )
+    
+    SUMMARY_FIELDS = ('id', 'event_type', 'repository_id', 'processed', 'created_at', 'processed_at')
     
     # Relationships
     repository = db.relationship('Repository', backref='webhook_events')
@@ -22,28 +38,26 @@ class WebhookEvent(db.Model):
     
     def get_payload(self):
         """Parse and return the JSON payload"""
-        try:
-            return json.loads(self.payload)
-        except json.JSONDecodeError:
-            return {}
+        return self.json_attribute('payload', dict)
     
     def set_payload(self, payload_dict):
         """Set the payload from a dictionary"""
-        self.payload = json.dumps(payload_dict)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'event_type': self.event_type,
-            'repository_id': self.repository_id,
-            'github_delivery_id': self.github_delivery_id,
-            'processed': self.processed,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'processed_at': self.processed_at.isoformat() if self.processed_at else None,
-            'payload': self.get_payload()
-        }
+        self.payload = payload_dict
+    
+    def to_dict(self, fields=None):
+        return self.serialize(fields, {
+            'id': lambda: self.id,
+            'event_type': lambda: self.event_type,
+            'repository_id': lambda: self.repository_id,
+            'github_delivery_id': lambda: self.github_delivery_id,
+            'processed': lambda: self.processed,
+            'created_at': lambda: self.created_at,
+            'processed_at': lambda: self.processed_at,
+            'committed_at': lambda: self.committed_at,
+            'payload': self.get_payload
+        })
 
-class CommitAnalysis(db.Model):
+class CommitAnalysis(SerializerMixin, JSONDocumentMixin, db.Model):
     __tablename__ = 'commit_analyses'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -55,8 +69,8 @@ class CommitAnalysis(db.Model):
     author_email = db.Column(db.String(100), nullable=False)
     
     # AI Analysis Results
-    ai_analysis = db.Column(db.Text)  # JSON string of AI analysis
-    suggestions = db.Column(db.Text)  # JSON string of improvement suggestions
+    ai_analysis = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)  # AI analysis document
+    suggestions = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)  # improvement suggestions
     risk_score = db.Column(db.Integer)  # 0-100 risk assessment
     quality_score = db.Column(db.Integer)  # 0-100 code quality score
     
@@ -68,54 +82,63 @@ class CommitAnalysis(db.Model):
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     analyzed_at = db.Column(db.DateTime)
+    # Stamped just before the commit of every transaction writing the row,
+    # unlike created_at and the id, which are assigned at its first flush
+    committed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_commit_analyses_repository_created', repository_id, created_at.desc()),
+        db.Index('ix_commit_analyses_created', created_at.desc()),
+        db.Index('ix_commit_analyses_committed', committed_at, id),
+    )
+    
+    SUMMARY_FIELDS = (
+        'id', 'repository_id', 'commit_sha', 'commit_message', 'author_name',
+        'risk_score', 'quality_score', 'pr_generated', 'pr_url', 'created_at'
+    )
     
     # Relationships
     repository = db.relationship('Repository', backref='commit_analyses')
     
     def get_ai_analysis(self):
         """Parse and return the AI analysis JSON"""
-        try:
-            return json.loads(self.ai_analysis) if self.ai_analysis else {}
-        except json.JSONDecodeError:
-            return {}
+        return self.json_attribute('ai_analysis', dict)
     
     def set_ai_analysis(self, analysis_dict):
         """Set the AI analysis from a dictionary"""
-        self.ai_analysis = json.dumps(analysis_dict)
+        self.ai_analysis = analysis_dict
     
     def get_suggestions(self):
         """Parse and return the suggestions JSON"""
-        try:
-            return json.loads(self.suggestions) if self.suggestions else []
-        except json.JSONDecodeError:
-            return []
+        return self.json_attribute('suggestions', list)
     
     def set_suggestions(self, suggestions_list):
         """Set the suggestions from a list"""
-        self.suggestions = json.dumps(suggestions_list)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'webhook_event_id': self.webhook_event_id,
-            'repository_id': self.repository_id,
-            'commit_sha': self.commit_sha,
-            'commit_message': self.commit_message,
-            'author_name': self.author_name,
-            'author_email': self.author_email,
-            'ai_analysis': self.get_ai_analysis(),
-            'suggestions': self.get_suggestions(),
-            'risk_score': self.risk_score,
-            'quality_score': self.quality_score,
-            'pr_generated': self.pr_generated,
-            'pr_url': self.pr_url,
-            'pr_title': self.pr_title,
-            'pr_description': self.pr_description,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'analyzed_at': self.analyzed_at.isoformat() if self.analyzed_at else None
-        }
+        self.suggestions = suggestions_list
+    
+    def to_dict(self, fields=None):
+        return self.serialize(fields, {
+            'id': lambda: self.id,
+            'webhook_event_id': lambda: self.webhook_event_id,
+            'repository_id': lambda: self.repository_id,
+            'commit_sha': lambda: self.commit_sha,
+            'commit_message': lambda: self.commit_message,
+            'author_name': lambda: self.author_name,
+            'author_email': lambda: self.author_email,
+            'ai_analysis': self.get_ai_analysis,
+            'suggestions': self.get_suggestions,
+            'risk_score': lambda: self.risk_score,
+            'quality_score': lambda: self.quality_score,
+            'pr_generated': lambda: self.pr_generated,
+            'pr_url': lambda: self.pr_url,
+            'pr_title': lambda: self.pr_title,
+            'pr_description': lambda: self.pr_description,
+            'created_at': lambda: self.created_at,
+            'analyzed_at': lambda: self.analyzed_at,
+            'committed_at': lambda: self.committed_at
+        })
 
-class ActionLog(db.Model):
+class ActionLog(SerializerMixin, JSONDocumentMixin, db.Model):
     __tablename__ = 'action_logs'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -126,11 +149,23 @@ class ActionLog(db.Model):
     # Log details
     message = db.Column(db.Text, nullable=False)
     level = db.Column(db.String(20), default='info')  # info, warning, error, success
-    details = db.Column(db.Text)  # JSON string for additional details
+    details = db.deferred(db.Column(JSONDocument), group=DOCUMENTS_GROUP)  # additional details
     
     # Timing
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     duration_ms = db.Column(db.Integer)  # Duration in milliseconds
+    # Stamped when the transaction writing the row commits, see stamp_committed_at
+    committed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_action_logs_repository_created', repository_id, created_at.desc()),
+        db.Index('ix_action_logs_created', created_at.desc()),
+        db.Index('ix_action_logs_level_created', level, created_at.desc()),
+        db.Index('ix_action_logs_commit_analysis', commit_analysis_id),
+        db.Index('ix_action_logs_committed', committed_at, id),
+    )
+    
+    SUMMARY_FIELDS = ('id', 'action_type', 'repository_id', 'message', 'level', 'created_at', 'duration_ms')
     
     # Relationships
     repository = db.relationship('Repository', backref='action_logs')
@@ -138,25 +173,61 @@ class ActionLog(db.Model):
     
     def get_details(self):
         """Parse and return the details JSON"""
-        try:
-            return json.loads(self.details) if self.details else {}
-        except json.JSONDecodeError:
-            return {}
+        return self.json_attribute('details', dict)
     
     def set_details(self, details_dict):
         """Set the details from a dictionary"""
-        self.details = json.dumps(details_dict)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'action_type': self.action_type,
-            'repository_id': self.repository_id,
-            'commit_analysis_id': self.commit_analysis_id,
-            'message': self.message,
-            'level': self.level,
-            'details': self.get_details(),
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'duration_ms': self.duration_ms
-        }
+        self.details = details_dict
+    
+    def to_dict(self, fields=None):
+        return self.serialize(fields, {
+            'id': lambda: self.id,
+            'action_type': lambda: self.action_type,
+            'repository_id': lambda: self.repository_id,
+            'commit_analysis_id': lambda: self.commit_analysis_id,
+            'message': lambda: self.message,
+            'level': lambda: self.level,
+            'details': self.get_details,
+            'created_at': lambda: self.created_at,
+            'duration_ms': lambda: self.duration_ms,
+            'committed_at': lambda: self.committed_at
+        })
+
+# Session.info key holding the rows with a committed_at written in the current transaction
+WRITTEN_ROWS_KEY = 'written_committed_rows'
+
+# Models whose rows get committed_at stamped on every write
+COMMIT_STAMPED_MODELS = (WebhookEvent, CommitAnalysis, ActionLog)
+
+def _pending_written_rows(session):
+    """Stamped rows the session inserts or changes in its next flush"""
+    return {
+        instance for instance in session.new | session.dirty
+        if isinstance(instance, COMMIT_STAMPED_MODELS) and (instance in session.new or session.is_modified(instance))
+    }
+
+@event.listens_for(Session, 'after_flush')
+def collect_written_rows(session, flush_context):
+    written = _pending_written_rows(session)
+    if written:
+        session.info.setdefault(WRITTEN_ROWS_KEY, set()).update(written)
+
+@event.listens_for(Session, 'before_commit')
+def stamp_committed_at(session):
+    """Set committed_at on the rows this transaction wrote, as late as possible.
+
+    Registered ahead of the live feed listeners, which read the stamp when
+    they serialise their events.
+    """
+    written = session.info.pop(WRITTEN_ROWS_KEY, set()) | _pending_written_rows(session)
+    now = datetime.utcnow()
+    for instance in written:
+        if not inspect(instance).was_deleted:
+            instance.committed_at = now
+    session.flush()
+    # The stamping flush collects the rows again
+    session.info.pop(WRITTEN_ROWS_KEY, None)
 
+@event.listens_for(Session, 'after_rollback')
+def discard_written_rows(session):
+    session.info.pop(WRITTEN_ROWS_KEY, None)
@@ -1,12 +1,183 @@
-from flask import Blueprint, request, jsonify, render_template_string
+from flask import Blueprint, Response, request, jsonify, render_template_string, stream_with_context
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
-from ..models.repository import Repository, Analysis, AutomationEntry
+from sqlalchemy import Text, cast, func, desc
+from ..models.repository import Repository, AutomationEntry
 from ..models.webhook import WebhookEvent, CommitAnalysis, ActionLog, db
-import json
+from ..models.rollup import count_where, sum_rollups, rollup_series
+from ..services.response_cache import cached_response
+from .etags import conditional_get
+from ..services.live_feed import open_live_stream, InvalidFeedCursor
+import csv
 
 admin_bp = Blueprint('admin', __name__)
 
+# Length of one activity bucket per granularity
+BUCKET_STEPS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+# Upper bound on `range` per granularity
+MAX_ACTIVITY_BUCKETS = {
+    'hour': 24 * 14,
+    'day': 366,
+    'week': 104,
+}
+
+def truncate_datetime(value, granularity):
+    """Truncate a datetime to the start of its hour, day or (Monday-based) week"""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'hour':
+        return value
+    value = value.replace(hour=0)
+    if granularity == 'week':
+        value -= timedelta(days=value.weekday())
+    return value
+
+def bucket_starts(now, granularity, count):
+    """Start of the last `count` buckets, oldest first, ending with the current one"""
+    current = truncate_datetime(now, granularity)
+    step = BUCKET_STEPS[granularity]
+    return [current - step * i for i in range(count - 1, -1, -1)]
+
+# All-time rollup counters behind the statistics and the log level panels
+STATISTICS_TOTALS = ['webhook_events', 'webhooks_processed', 'commit_analyses', 'prs_generated']
+LOG_LEVEL_TOTALS = ['log_info', 'log_success', 'log_warning', 'log_error']
+
+# Dashboard sections, with the tables each one reads
+DASHBOARD_SECTIONS = {
+    'statistics': ['repositories', 'webhook_events', 'commit_analyses'],
+    'activity': ['webhook_events', 'commit_analyses'],
+    'log_levels': ['action_logs'],
+    'recent_webhooks': ['webhook_events'],
+    'recent_logs': ['action_logs'],
+    'repositories': ['repositories', 'analyses', 'commit_analyses', 'webhook_events'],
+}
+
+# Upper bound on `webhooks_limit` and `logs_limit`
+MAX_RECENT_ITEMS = 100
+
+# Rows fetched from the server-side cursor, and written, per chunk of a CSV export
+EXPORT_CHUNK_ROWS = 1000
+
+def activity_params():
+    """Validated `granularity` and `range` query parameters, as (granularity, bucket count)"""
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in BUCKET_STEPS:
+        raise ValueError(f"granularity must be one of {', '.join(BUCKET_STEPS)}")
+    bucket_count = request.args.get('range', 7, type=int)
+    return granularity, max(1, min(bucket_count, MAX_ACTIVITY_BUCKETS[granularity]))
+
+def requested_sections():
+    """Dashboard sections named by `sections=a,b`, all of them by default"""
+    if not request.args.get('sections'):
+        return list(DASHBOARD_SECTIONS)
+    sections = [section.strip() for section in request.args['sections'].split(',') if section.strip()]
+    unknown = set(sections) - set(DASHBOARD_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown sections: {', '.join(sorted(unknown))}")
+    return sections
+
+def dashboard_tables():
+    """Tables read by the requested dashboard sections, for ETags and caching"""
+    try:
+        sections = requested_sections()
+    except ValueError:
+        # The view answers 400; tag it like the full dashboard meanwhile
+        sections = DASHBOARD_SECTIONS
+    return {table for section in sections for table in DASHBOARD_SECTIONS[section]}
+
+def build_statistics(totals):
+    """Statistics panel; `totals` holds the all-time sums of STATISTICS_TOTALS"""
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    
+    total_repositories = Repository.query.count()
+    recent = sum_rollups(['webhook_events', 'commit_analyses'], since=yesterday)
+    
+    total_webhooks = totals['webhook_events']
+    processing_rate = (totals['webhooks_processed'] / total_webhooks * 100) if total_webhooks > 0 else 0
+    
+    return {
+        'total_repositories': total_repositories,
+        'total_webhooks': total_webhooks,
+        'total_analyses': totals['commit_analyses'],
+        'total_prs': totals['prs_generated'],
+        'recent_webhooks': recent['webhook_events'],
+        'recent_analyses': recent['commit_analyses'],
+        'processing_rate': round(processing_rate, 1)
+    }
+
+def build_activity(granularity, bucket_count):
+    """Activity chart data, with the hourly rollups summed into the requested buckets in SQL"""
+    buckets = bucket_starts(datetime.utcnow(), granularity, bucket_count)
+    
+    webhook_counts = {}
+    analysis_counts = {}
+    for bucket, counters in rollup_series(['webhook_events', 'commit_analyses'], since=buckets[0], granularity=granularity):
+        webhook_counts[bucket] = counters['webhook_events']
+        analysis_counts[bucket] = counters['commit_analyses']
+    
+    label_format = '%m/%d %H:00' if granularity == 'hour' else '%m/%d'
+    return {
+        'granularity': granularity,
+        'labels': [bucket.strftime(label_format) for bucket in buckets],
+        'webhooks': [webhook_counts.get(bucket, 0) for bucket in buckets],
+        'analyses': [analysis_counts.get(bucket, 0) for bucket in buckets]
+    }
+
+def build_log_levels(totals):
+    """Log level distribution; `totals` holds the all-time sums of LOG_LEVEL_TOTALS"""
+    return {
+        'info': totals['log_info'],
+        'success': totals['log_success'],
+        'warning': totals['log_warning'],
+        'error': totals['log_error']
+    }
+
+def build_recent_webhooks(limit):
+    events = WebhookEvent.query.options(WebhookEvent.load_fields(WebhookEvent.SUMMARY_FIELDS))\
+        .order_by(desc(WebhookEvent.created_at), desc(WebhookEvent.id)).limit(limit).all()
+    return [event.to_dict(WebhookEvent.SUMMARY_FIELDS) for event in events]
+
+def build_recent_logs(limit, level=None):
+    query = ActionLog.query.options(ActionLog.load_fields(ActionLog.SUMMARY_FIELDS))
+    if level:
+        query = query.filter(ActionLog.level == level)
+    logs = query.order_by(desc(ActionLog.created_at), desc(ActionLog.id)).limit(limit).all()
+    return [log.to_dict(ActionLog.SUMMARY_FIELDS) for log in logs]
+
+class CSVLine:
+    """File-like target that hands each CSV row back to the writer's caller"""
+
+    def write(self, line):
+        return line
+
+def parse_datetime_arg(name):
+    """ISO 8601 datetime query parameter, None when absent"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime")
+
+def parse_int_arg(name):
+    """Integer query parameter, None when absent"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+def build_repositories():
+    """Repository list in its summary view, as served by /api/repositories?view=summary"""
+    repositories = Repository.query.options(Repository.load_fields(Repository.SUMMARY_FIELDS)).all()
+    return [repo.to_dict(Repository.SUMMARY_FIELDS) for repo in repositories]
+
 # Admin Dashboard HTML Template
 ADMIN_DASHBOARD_TEMPLATE = """
 <!DOCTYPE html>
@@ -148,16 +319,68 @@ ADMIN_DASHBOARD_TEMPLATE = """
 
     <script>
         let activityChart, logLevelsChart;
+        let liveFeed, lastEventId = null, refreshTimer = null;
+
+        const RECENT_WEBHOOKS = 5;
+        const RECENT_LOGS = 10;
 
         // Initialize dashboard
         document.addEventListener('DOMContentLoaded', function() {
             initializeCharts();
             loadDashboardData();
             
-            // Auto-refresh every 30 seconds
-            setInterval(loadDashboardData, 30000);
+            // New events are pushed by the server instead of polled
+            connectLiveFeed();
+            
+            // Charts cover moving time windows, roll them over now and then
+            setInterval(loadStatistics, 300000);
         });
 
+        function connectLiveFeed() {
+            const url = lastEventId ? `/admin/api/live?cursor=${encodeURIComponent(lastEventId)}` : '/admin/api/live';
+            liveFeed = new EventSource(url);
+            
+            const track = handler => event => {
+                lastEventId = event.lastEventId || lastEventId;
+                handler(event.data ? JSON.parse(event.data) : {});
+            };
+            liveFeed.addEventListener('ready', track(() => {}));
+            // Too much was missed while disconnected to replay it
+            liveFeed.addEventListener('reset', track(() => loadDashboardData()));
+            liveFeed.addEventListener('webhook', track(event => {
+                prependRecentWebhook(event);
+                scheduleRefresh();
+            }));
+            liveFeed.addEventListener('analysis', track(() => scheduleRefresh()));
+            liveFeed.addEventListener('pr', track(() => scheduleRefresh()));
+            liveFeed.addEventListener('log', track(log => {
+                prependRecentLog(log);
+                scheduleRefresh();
+            }));
+            
+            liveFeed.onerror = () => {
+                // EventSource retries dropped connections by itself, but gives
+                // up after an error response
+                if (liveFeed.readyState === EventSource.CLOSED) {
+                    // The cursor may be from an older release, start over
+                    lastEventId = null;
+                    setTimeout(() => {
+                        loadDashboardData();
+                        connectLiveFeed();
+                    }, 5000);
+                }
+            };
+        }
+
+        function scheduleRefresh() {
+            // Coalesce bursts of events into one refresh of the aggregates
+            if (refreshTimer) return;
+            refreshTimer = setTimeout(() => {
+                refreshTimer = null;
+                loadDashboardData(['statistics', 'activity', 'log_levels', 'repositories']);
+            }, 2000);
+        }
+
         function initializeCharts() {
             // Activity Chart
             const activityCtx = document.getElementById('activityChart').getContext('2d');
@@ -211,161 +434,176 @@ ADMIN_DASHBOARD_TEMPLATE = """
             });
         }
 
-        async function loadDashboardData() {
+        async function loadDashboardData(sections) {
             try {
-                // Load statistics
-                const statsResponse = await fetch('/admin/api/statistics');
-                const stats = await statsResponse.json();
-                
-                document.getElementById('total-repos').textContent = stats.total_repositories;
-                document.getElementById('total-webhooks').textContent = stats.total_webhooks;
-                document.getElementById('total-analyses').textContent = stats.total_analyses;
-                document.getElementById('total-prs').textContent = stats.total_prs;
-
-                // Load activity data
-                const activityResponse = await fetch('/admin/api/activity');
-                const activity = await activityResponse.json();
-                
-                activityChart.data.labels = activity.labels;
-                activityChart.data.datasets[0].data = activity.webhooks;
-                activityChart.data.datasets[1].data = activity.analyses;
-                activityChart.update();
-
-                // Load log levels data
-                const logLevelsResponse = await fetch('/admin/api/log-levels');
-                const logLevels = await logLevelsResponse.json();
-                
-                logLevelsChart.data.datasets[0].data = [
-                    logLevels.info,
-                    logLevels.success,
-                    logLevels.warning,
-                    logLevels.error
-                ];
-                logLevelsChart.update();
-
-                // Load recent webhooks
-                loadRecentWebhooks();
+                // Every panel comes from one request; `sections` limits it to some
+                const params = new URLSearchParams({
+                    webhooks_limit: RECENT_WEBHOOKS,
+                    logs_limit: RECENT_LOGS
+                });
+                if (sections) params.set('sections', sections.join(','));
+                const level = document.getElementById('log-level-filter').value;
+                if (level) params.set('level', level);
                 
-                // Load recent logs
-                loadRecentLogs();
+                const response = await fetch(`/admin/api/dashboard?${params}`);
+                const data = await response.json();
                 
-                // Load repositories
-                loadRepositories();
+                if (data.statistics) renderStatistics(data.statistics);
+                if (data.activity) renderActivity(data.activity);
+                if (data.log_levels) renderLogLevels(data.log_levels);
+                if (data.recent_webhooks) renderRecentWebhooks(data.recent_webhooks);
+                if (data.recent_logs) renderRecentLogs(data.recent_logs);
+                if (data.repositories) renderRepositories(data.repositories);
 
             } catch (error) {
                 console.error('Error loading dashboard data:', error);
             }
         }
 
-        async function loadRecentWebhooks() {
-            try {
-                const response = await fetch('/webhook/events?per_page=5');
-                const data = await response.json();
-                
-                const container = document.getElementById('recent-webhooks');
-                container.innerHTML = '';
-                
-                data.events.forEach(event => {
-                    const eventDiv = document.createElement('div');
-                    eventDiv.className = 'border-l-4 border-blue-500 pl-4 py-2';
-                    eventDiv.innerHTML = `
-                        <div class="flex justify-between items-start">
-                            <div>
-                                <p class="font-medium">${event.event_type}</p>
-                                <p class="text-sm text-gray-600">Repository ID: ${event.repository_id}</p>
-                            </div>
-                            <span class="text-xs text-gray-500">${formatDate(event.created_at)}</span>
-                        </div>
-                    `;
-                    container.appendChild(eventDiv);
-                });
-            } catch (error) {
-                console.error('Error loading recent webhooks:', error);
+        function loadStatistics() {
+            return loadDashboardData(['statistics', 'activity', 'log_levels']);
+        }
+
+        function renderStatistics(stats) {
+            document.getElementById('total-repos').textContent = stats.total_repositories;
+            document.getElementById('total-webhooks').textContent = stats.total_webhooks;
+            document.getElementById('total-analyses').textContent = stats.total_analyses;
+            document.getElementById('total-prs').textContent = stats.total_prs;
+        }
+
+        function renderActivity(activity) {
+            activityChart.data.labels = activity.labels;
+            activityChart.data.datasets[0].data = activity.webhooks;
+            activityChart.data.datasets[1].data = activity.analyses;
+            activityChart.update();
+        }
+
+        function renderLogLevels(logLevels) {
+            logLevelsChart.data.datasets[0].data = [
+                logLevels.info,
+                logLevels.success,
+                logLevels.warning,
+                logLevels.error
+            ];
+            logLevelsChart.update();
+        }
+
+        function renderRecentWebhooks(events) {
+            const container = document.getElementById('recent-webhooks');
+            container.innerHTML = '';
+            
+            events.forEach(event => {
+                container.appendChild(renderWebhook(event));
+            });
+        }
+
+        function renderWebhook(event) {
+            const eventDiv = document.createElement('div');
+            eventDiv.className = 'border-l-4 border-blue-500 pl-4 py-2';
+            eventDiv.dataset.id = event.id;
+            eventDiv.innerHTML = `
+                <div class="flex justify-between items-start">
+                    <div>
+                        <p class="font-medium">${event.event_type}</p>
+                        <p class="text-sm text-gray-600">Repository ID: ${event.repository_id}</p>
+                    </div>
+                    <span class="text-xs text-gray-500">${formatDate(event.created_at)}</span>
+                </div>
+            `;
+            return eventDiv;
+        }
+
+        function prependRecentWebhook(event) {
+            const container = document.getElementById('recent-webhooks');
+            // Reconnects replay recent events, replace the ones already shown
+            container.querySelector(`[data-id="${event.id}"]`)?.remove();
+            container.prepend(renderWebhook(event));
+            while (container.children.length > RECENT_WEBHOOKS) {
+                container.lastElementChild.remove();
             }
         }
 
-        async function loadRecentLogs() {
-            try {
-                const level = document.getElementById('log-level-filter').value;
-                const url = level ? `/webhook/logs?per_page=10&level=${level}` : '/webhook/logs?per_page=10';
-                
-                const response = await fetch(url);
-                const data = await response.json();
-                
-                const container = document.getElementById('recent-logs');
-                container.innerHTML = '';
-                
-                data.logs.forEach(log => {
-                    const logDiv = document.createElement('div');
-                    logDiv.className = `p-3 rounded border-l-4 log-level-${log.level}`;
-                    logDiv.innerHTML = `
-                        <div class="flex justify-between items-start">
-                            <div>
-                                <p class="font-medium">${log.message}</p>
-                                <p class="text-sm opacity-75">${log.action_type}</p>
-                            </div>
-                            <span class="text-xs opacity-75">${formatDate(log.created_at)}</span>
-                        </div>
-                    `;
-                    container.appendChild(logDiv);
-                });
-            } catch (error) {
-                console.error('Error loading recent logs:', error);
+        function renderRecentLogs(logs) {
+            const container = document.getElementById('recent-logs');
+            container.innerHTML = '';
+            
+            logs.forEach(log => {
+                container.appendChild(renderLog(log));
+            });
+        }
+
+        function renderLog(log) {
+            const logDiv = document.createElement('div');
+            logDiv.className = `p-3 rounded border-l-4 log-level-${log.level}`;
+            logDiv.dataset.id = log.id;
+            logDiv.innerHTML = `
+                <div class="flex justify-between items-start">
+                    <div>
+                        <p class="font-medium">${log.message}</p>
+                        <p class="text-sm opacity-75">${log.action_type}</p>
+                    </div>
+                    <span class="text-xs opacity-75">${formatDate(log.created_at)}</span>
+                </div>
+            `;
+            return logDiv;
+        }
+
+        function prependRecentLog(log) {
+            const level = document.getElementById('log-level-filter').value;
+            if (level && log.level !== level) return;
+            
+            const container = document.getElementById('recent-logs');
+            container.querySelector(`[data-id="${log.id}"]`)?.remove();
+            container.prepend(renderLog(log));
+            while (container.children.length > RECENT_LOGS) {
+                container.lastElementChild.remove();
             }
         }
 
-        async function loadRepositories() {
-            try {
-                const response = await fetch('/api/repositories');
-                const data = await response.json();
-                
-                const container = document.getElementById('repository-list');
-                
-                let tableHTML = `
-                    <table class="min-w-full table-auto">
-                        <thead>
-                            <tr class="bg-gray-50">
-                                <th class="px-4 py-2 text-left">Repository</th>
-                                <th class="px-4 py-2 text-left">Language</th>
-                                <th class="px-4 py-2 text-left">Stars</th>
-                                <th class="px-4 py-2 text-left">Last Analysis</th>
-                                <th class="px-4 py-2 text-left">Actions</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                `;
-                
-                data.repositories.forEach(repo => {
-                    tableHTML += `
-                        <tr class="border-t">
-                            <td class="px-4 py-2">
-                                <div>
-                                    <p class="font-medium">${repo.name}</p>
-                                    <p class="text-sm text-gray-600">${repo.full_name}</p>
-                                </div>
-                            </td>
-                            <td class="px-4 py-2">${repo.language || 'N/A'}</td>
-                            <td class="px-4 py-2">${repo.stars}</td>
-                            <td class="px-4 py-2">${repo.last_analysis ? formatDate(repo.last_analysis) : 'Never'}</td>
-                            <td class="px-4 py-2">
-                                <button onclick="viewRepository(${repo.id})" class="text-blue-600 hover:text-blue-800">
-                                    <i class="fas fa-eye"></i>
-                                </button>
-                            </td>
+        function renderRepositories(repositories) {
+            const container = document.getElementById('repository-list');
+            
+            let tableHTML = `
+                <table class="min-w-full table-auto">
+                    <thead>
+                        <tr class="bg-gray-50">
+                            <th class="px-4 py-2 text-left">Repository</th>
+                            <th class="px-4 py-2 text-left">Language</th>
+                            <th class="px-4 py-2 text-left">Stars</th>
+                            <th class="px-4 py-2 text-left">Last Analysis</th>
+                            <th class="px-4 py-2 text-left">Actions</th>
                         </tr>
-                    `;
-                });
-                
-                tableHTML += '</tbody></table>';
-                container.innerHTML = tableHTML;
-                
-            } catch (error) {
-                console.error('Error loading repositories:', error);
-            }
+                    </thead>
+                    <tbody>
+            `;
+            
+            repositories.forEach(repo => {
+                tableHTML += `
+                    <tr class="border-t">
+                        <td class="px-4 py-2">
+                            <div>
+                                <p class="font-medium">${repo.name}</p>
+                                <p class="text-sm text-gray-600">${repo.full_name}</p>
+                            </div>
+                        </td>
+                        <td class="px-4 py-2">${repo.language || 'N/A'}</td>
+                        <td class="px-4 py-2">${repo.stars}</td>
+                        <td class="px-4 py-2">${repo.summary.last_analysis ? formatDate(repo.summary.last_analysis) : 'Never'}</td>
+                        <td class="px-4 py-2">
+                            <button onclick="viewRepository(${repo.id})" class="text-blue-600 hover:text-blue-800">
+                                <i class="fas fa-eye"></i>
+                            </button>
+                        </td>
+                    </tr>
+                `;
+            });
+            
+            tableHTML += '</tbody></table>';
+            container.innerHTML = tableHTML;
         }
 
         function filterLogs() {
-            loadRecentLogs();
+            loadDashboardData(['recent_logs']);
         }
 
         function refreshDashboard() {
@@ -396,113 +634,111 @@ def admin_dashboard():
     return render_template_string(ADMIN_DASHBOARD_TEMPLATE)
 
 @admin_bp.route('/admin/api/statistics')
+@conditional_get(['repositories', 'webhook_events', 'commit_analyses'], time_bucket='hour')
+@cached_response(['repositories', 'webhook_events', 'commit_analyses'])
 def get_statistics():
     """Get dashboard statistics"""
     try:
-        # Get basic counts
-        total_repositories = Repository.query.count()
-        total_webhooks = WebhookEvent.query.count()
-        total_analyses = CommitAnalysis.query.count()
-        total_prs = CommitAnalysis.query.filter_by(pr_generated=True).count()
-        
-        # Get recent activity (last 24 hours)
-        yesterday = datetime.utcnow() - timedelta(days=1)
-        recent_webhooks = WebhookEvent.query.filter(WebhookEvent.created_at >= yesterday).count()
-        recent_analyses = CommitAnalysis.query.filter(CommitAnalysis.created_at >= yesterday).count()
-        
-        # Get processing statistics
-        processed_webhooks = WebhookEvent.query.filter_by(processed=True).count()
-        processing_rate = (processed_webhooks / total_webhooks * 100) if total_webhooks > 0 else 0
-        
-        return jsonify({
-            'total_repositories': total_repositories,
-            'total_webhooks': total_webhooks,
-            'total_analyses': total_analyses,
-            'total_prs': total_prs,
-            'recent_webhooks': recent_webhooks,
-            'recent_analyses': recent_analyses,
-            'processing_rate': round(processing_rate, 1)
-        })
+        # Totals come from the hourly rollups instead of counting whole tables
+        return jsonify(build_statistics(sum_rollups(STATISTICS_TOTALS)))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/admin/api/activity')
+@conditional_get(['webhook_events', 'commit_analyses'], time_bucket='hour')
+@cached_response(['webhook_events', 'commit_analyses'])
 def get_activity_data():
-    """Get activity data for charts"""
+    """Get activity data for charts.
+
+    Query parameters: `granularity` (hour, day or week, default day) and
+    `range`, the number of buckets ending with the current one (default 7).
+    """
     try:
-        # Get data for the last 7 days
-        days = []
-        webhook_counts = []
-        analysis_counts = []
-        
-        for i in range(6, -1, -1):
-            date = datetime.utcnow() - timedelta(days=i)
-            start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_of_day = start_of_day + timedelta(days=1)
-            
-            webhook_count = WebhookEvent.query.filter(
-                WebhookEvent.created_at >= start_of_day,
-                WebhookEvent.created_at < end_of_day
-            ).count()
-            
-            analysis_count = CommitAnalysis.query.filter(
-                CommitAnalysis.created_at >= start_of_day,
-                CommitAnalysis.created_at < end_of_day
-            ).count()
-            
-            days.append(date.strftime('%m/%d'))
-            webhook_counts.append(webhook_count)
-            analysis_counts.append(analysis_count)
-        
-        return jsonify({
-            'labels': days,
-            'webhooks': webhook_counts,
-            'analyses': analysis_counts
-        })
+        granularity, bucket_count = activity_params()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        return jsonify(build_activity(granularity, bucket_count))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/admin/api/log-levels')
+@conditional_get(['action_logs'])
+@cached_response(['action_logs'])
 def get_log_levels():
     """Get log level distribution"""
     try:
-        # Get counts for each log level
-        info_count = ActionLog.query.filter_by(level='info').count()
-        success_count = ActionLog.query.filter_by(level='success').count()
-        warning_count = ActionLog.query.filter_by(level='warning').count()
-        error_count = ActionLog.query.filter_by(level='error').count()
+        return jsonify(build_log_levels(sum_rollups(LOG_LEVEL_TOTALS)))
         
-        return jsonify({
-            'info': info_count,
-            'success': success_count,
-            'warning': warning_count,
-            'error': error_count
-        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/api/dashboard')
+@conditional_get(dashboard_tables, time_bucket='hour')
+@cached_response(dashboard_tables)
+def get_dashboard():
+    """Get every dashboard panel in one response.
+
+    Query parameters: `sections`, a comma separated subset of
+    DASHBOARD_SECTIONS (default all), the activity `granularity` and
+    `range`, `webhooks_limit` (default 5), `logs_limit` (default 10) and the
+    recent logs `level`. The statistics and log level totals share a single
+    rollup query.
+    """
+    try:
+        sections = requested_sections()
+        granularity, bucket_count = activity_params()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        total_columns = []
+        if 'statistics' in sections:
+            total_columns += STATISTICS_TOTALS
+        if 'log_levels' in sections:
+            total_columns += LOG_LEVEL_TOTALS
+        totals = sum_rollups(total_columns) if total_columns else {}
+        
+        webhooks_limit = max(1, min(request.args.get('webhooks_limit', 5, type=int), MAX_RECENT_ITEMS))
+        logs_limit = max(1, min(request.args.get('logs_limit', 10, type=int), MAX_RECENT_ITEMS))
+        
+        payload = {}
+        if 'statistics' in sections:
+            payload['statistics'] = build_statistics(totals)
+        if 'activity' in sections:
+            payload['activity'] = build_activity(granularity, bucket_count)
+        if 'log_levels' in sections:
+            payload['log_levels'] = build_log_levels(totals)
+        if 'recent_webhooks' in sections:
+            payload['recent_webhooks'] = build_recent_webhooks(webhooks_limit)
+        if 'recent_logs' in sections:
+            payload['recent_logs'] = build_recent_logs(logs_limit, request.args.get('level'))
+        if 'repositories' in sections:
+            payload['repositories'] = build_repositories()
+        
+        return jsonify(payload)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/admin/api/repositories')
+@conditional_get(['repositories', 'analyses', 'commit_analyses', 'webhook_events'])
+@cached_response(['repositories', 'analyses', 'commit_analyses', 'webhook_events'])
 def get_repositories_admin():
     """Get repositories with admin details"""
     try:
-        repositories = db.session.query(
-            Repository,
-            func.max(Analysis.created_at).label('last_analysis')
-        ).outerjoin(Analysis).group_by(Repository.id).all()
-        
+        # Counts and timestamps are kept on the repository rows
         result = []
-        for repo, last_analysis in repositories:
+        for repo in Repository.query.all():
             repo_dict = repo.to_dict()
-            repo_dict['last_analysis'] = last_analysis.isoformat() if last_analysis else None
-            
-            # Add webhook and analysis counts
-            repo_dict['webhook_count'] = WebhookEvent.query.filter_by(repository_id=repo.id).count()
-            repo_dict['analysis_count'] = Analysis.query.filter_by(repository_id=repo.id).count()
-            repo_dict['commit_analysis_count'] = CommitAnalysis.query.filter_by(repository_id=repo.id).count()
-            
+            summary = repo_dict['summary']
+            repo_dict['last_analysis'] = summary['last_analysis']
+            repo_dict['webhook_count'] = summary['webhook_count']
+            repo_dict['analysis_count'] = summary['analysis_count']
+            repo_dict['commit_analysis_count'] = summary['commit_analysis_count']
             result.append(repo_dict)
         
         return jsonify({'repositories': result})
@@ -511,38 +747,31 @@ def get_repositories_admin():
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/admin/api/repository/<int:repo_id>')
+@conditional_get(['repositories', 'analyses', 'webhook_events', 'commit_analyses', 'action_logs'])
 def get_repository_details(repo_id):
     """Get detailed information about a specific repository"""
     try:
         repository = Repository.query.get_or_404(repo_id)
         
         # Get recent webhook events
-        recent_webhooks = WebhookEvent.query.filter_by(repository_id=repo_id)\
+        recent_webhooks = WebhookEvent.query.options(WebhookEvent.with_documents()).filter_by(repository_id=repo_id)\
             .order_by(desc(WebhookEvent.created_at)).limit(10).all()
         
         # Get recent commit analyses
-        recent_analyses = CommitAnalysis.query.filter_by(repository_id=repo_id)\
+        recent_analyses = CommitAnalysis.query.options(CommitAnalysis.with_documents()).filter_by(repository_id=repo_id)\
             .order_by(desc(CommitAnalysis.created_at)).limit(10).all()
         
         # Get recent logs
-        recent_logs = ActionLog.query.filter_by(repository_id=repo_id)\
+        recent_logs = ActionLog.query.options(ActionLog.with_documents()).filter_by(repository_id=repo_id)\
             .order_by(desc(ActionLog.created_at)).limit(20).all()
         
-        # Calculate statistics
-        total_commits_analyzed = CommitAnalysis.query.filter_by(repository_id=repo_id).count()
-        prs_generated = CommitAnalysis.query.filter_by(repository_id=repo_id, pr_generated=True).count()
-        avg_risk_score = db.session.query(func.avg(CommitAnalysis.risk_score))\
-            .filter_by(repository_id=repo_id).scalar() or 0
-        avg_quality_score = db.session.query(func.avg(CommitAnalysis.quality_score))\
-            .filter_by(repository_id=repo_id).scalar() or 0
-        
         return jsonify({
             'repository': repository.to_dict(),
             'statistics': {
-                'total_commits_analyzed': total_commits_analyzed,
-                'prs_generated': prs_generated,
-                'avg_risk_score': round(avg_risk_score, 1),
-                'avg_quality_score': round(avg_quality_score, 1)
+                'total_commits_analyzed': repository.commit_analysis_count,
+                'prs_generated': repository.prs_generated_count,
+                'avg_risk_score': round(repository.avg_risk_score, 1),
+                'avg_quality_score': round(repository.avg_quality_score, 1)
             },
             'recent_webhooks': [webhook.to_dict() for webhook in recent_webhooks],
             'recent_analyses': [analysis.to_dict() for analysis in recent_analyses],
@@ -554,53 +783,74 @@ def get_repository_details(repo_id):
 
 @admin_bp.route('/admin/api/export-logs')
 def export_logs():
-    """Export logs as CSV"""
+    """Export logs as CSV, streamed.
+
+    Query parameters: `since` and `until` (ISO 8601, default the last 30
+    days), `level` and `action_type` (comma separated) and
+    `repository_id`. Rows are read through a server-side cursor and
+    written out in chunks, so memory use does not grow with the export;
+    `details` is copied as stored instead of being decoded and re-encoded.
+    """
     try:
-        from flask import Response
-        import csv
-        from io import StringIO
-        
-        # Get logs from the last 30 days
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        logs = ActionLog.query.filter(ActionLog.created_at >= thirty_days_ago)\
-            .order_by(desc(ActionLog.created_at)).all()
-        
-        # Create CSV
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow([
+        until = parse_datetime_arg('until') or datetime.utcnow()
+        since = parse_datetime_arg('since') or until - timedelta(days=30)
+        repository_id = parse_int_arg('repository_id')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = db.session.query(
+        ActionLog.id,
+        ActionLog.created_at,
+        ActionLog.action_type,
+        ActionLog.level,
+        ActionLog.message,
+        ActionLog.repository_id,
+        ActionLog.commit_analysis_id,
+        ActionLog.duration_ms,
+        cast(ActionLog.details, Text)
+    ).filter(ActionLog.created_at >= since, ActionLog.created_at < until)
+    if request.args.get('level'):
+        query = query.filter(ActionLog.level.in_(request.args['level'].split(',')))
+    if request.args.get('action_type'):
+        query = query.filter(ActionLog.action_type.in_(request.args['action_type'].split(',')))
+    if repository_id is not None:
+        query = query.filter(ActionLog.repository_id == repository_id)
+    query = query.order_by(desc(ActionLog.created_at), desc(ActionLog.id))\
+        .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    
+    def generate():
+        writer = csv.writer(CSVLine())
+        yield writer.writerow([
             'ID', 'Timestamp', 'Action Type', 'Level', 'Message', 
             'Repository ID', 'Commit Analysis ID', 'Duration (ms)', 'Details'
         ])
         
-        # Write data
-        for log in logs:
-            writer.writerow([
-                log.id,
-                log.created_at.isoformat(),
-                log.action_type,
-                log.level,
-                log.message,
-                log.repository_id,
-                log.commit_analysis_id,
-                log.duration_ms,
-                json.dumps(log.get_details()) if log.details else ''
-            ])
-        
-        output.seek(0)
-        
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=github_automation_logs_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            }
-        )
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        chunk = []
+        for log_id, created_at, action_type, level, message, repository_id, commit_analysis_id, duration_ms, details in query:
+            chunk.append(writer.writerow([
+                log_id,
+                created_at.isoformat(),
+                action_type,
+                level,
+                message,
+                repository_id,
+                commit_analysis_id,
+                duration_ms,
+                details or ''
+            ]))
+            if len(chunk) >= EXPORT_CHUNK_ROWS:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename=github_automation_logs_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        }
+    )
 
 @admin_bp.route('/admin/api/system-health')
 def get_system_health():
@@ -615,11 +865,10 @@ def get_system_health():
         
         # Get recent error rate
         one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        total_logs = ActionLog.query.filter(ActionLog.created_at >= one_hour_ago).count()
-        error_logs = ActionLog.query.filter(
-            ActionLog.created_at >= one_hour_ago,
-            ActionLog.level == 'error'
-        ).count()
+        total_logs, error_logs = db.session.query(
+            func.count(ActionLog.id),
+            count_where(ActionLog.level == 'error')
+        ).filter(ActionLog.created_at >= one_hour_ago).one()
         
         error_rate = (error_logs / total_logs * 100) if total_logs > 0 else 0
         
@@ -641,3 +890,22 @@ def get_system_health():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/admin/api/live')
+def live_feed():
+    """Stream new webhook events, analyses, PRs and logs as Server-Sent Events.
+
+    Reconnecting clients send the last event id they received (the
+    `Last-Event-ID` header, or `cursor` for a first connection) and get
+    what they missed replayed before live events resume.
+    """
+    try:
+        stream = open_live_stream(request.headers.get('Last-Event-ID') or request.args.get('cursor'))
+    except InvalidFeedCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,92 @@
+import functools
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from flask import current_app, request
+from sqlalchemy import func, select
+from ..models.repository import db, Repository, Analysis, AutomationEntry
+from ..models.webhook import WebhookEvent, CommitAnalysis, ActionLog
+
+logger = logging.getLogger(__name__)
+
+# Per table, the model and the indexed column stamped on every write. Its
+# maximum moves with updates, the maximum id with inserts.
+VERSION_STAMPS = {
+    'repositories': (Repository, Repository.updated_at),
+    'analyses': (Analysis, Analysis.created_at),  # never updated
+    'automation_entries': (AutomationEntry, AutomationEntry.updated_at),
+    'webhook_events': (WebhookEvent, WebhookEvent.committed_at),
+    'commit_analyses': (CommitAnalysis, CommitAnalysis.committed_at),
+    'action_logs': (ActionLog, ActionLog.committed_at),
+}
+
+# Stamps are taken before COMMIT, so a write stamped earlier than the newest
+# visible one can still become visible. No ETag is issued until the newest
+# stamp is this old, which keeps such a write from hiding behind a 304.
+SETTLE_TIME = timedelta(seconds=10)
+
+def table_versions(tables):
+    """(max id, newest stamp) of each table, in one statement of index lookups"""
+    columns = []
+    for table in tables:
+        model, stamp = VERSION_STAMPS[table]
+        columns.append(select(func.max(model.id)).scalar_subquery())
+        columns.append(select(func.max(stamp)).scalar_subquery())
+    row = db.session.execute(select(*columns)).one()
+    return [(row[2 * i], row[2 * i + 1]) for i in range(len(tables))]
+
+def compute_etag(tables, time_bucket=None):
+    """Strong ETag for the current request, from the data versions of `tables`.
+
+    Returns None while a table was written within SETTLE_TIME.
+    `time_bucket='hour'` mixes in the start of the current hour, for views
+    whose windows ("last 24 hours") move with the clock even when nothing
+    is written.
+    """
+    versions = table_versions(tables)
+    now = datetime.utcnow()
+    if any(stamp is not None and stamp > now - SETTLE_TIME for _, stamp in versions):
+        return None
+    parts = [request.full_path] + [
+        f"{table}:{row_id}:{stamp.isoformat() if stamp else ''}"
+        for table, (row_id, stamp) in zip(tables, versions)
+    ]
+    if time_bucket == 'hour':
+        parts.append(now.replace(minute=0, second=0, microsecond=0).isoformat())
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+def conditional_get(tables, time_bucket=None):
+    """Tag GET responses with an ETag and answer matching If-None-Match with 304.
+
+    The ETag is computed from the data versions before the view runs, so a
+    revalidation that matches skips the queries and serialisation entirely.
+    A write racing the view can only make the tag older than the body,
+    which costs the client one extra full response, never a stale 304.
+    `tables` may be a callable returning the tables of the current request.
+    """
+    static_tables = None if callable(tables) else sorted(tables)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            try:
+                etag = compute_etag(static_tables or sorted(tables()), time_bucket)
+            except Exception as e:
+                logger.error(f"Error computing ETag: {str(e)}")
+                return view(*args, **kwargs)
+            if etag is None:
+                return view(*args, **kwargs)
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,32 @@
+from flask import request
+
+class InvalidFields(ValueError):
+    """Raised for unknown `fields` names or `view` values"""
+
+def requested_fields(model):
+    """Fields asked for with `fields=a,b` or `view=summary`, None for all of them"""
+    if request.args.get('fields'):
+        fields = {field.strip() for field in request.args['fields'].split(',') if field.strip()}
+    elif request.args.get('view') == 'summary':
+        fields = set(model.SUMMARY_FIELDS)
+    elif request.args.get('view', 'full') == 'full':
+        return None
+    else:
+        raise InvalidFields("view must be 'summary' or 'full'")
+
+    unknown = fields - model.field_names()
+    if unknown:
+        raise InvalidFields(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+def select_fields(query, model, fields):
+    """Restrict a query to the columns behind `fields`.
+
+    Without a field list every column is loaded, JSON documents included,
+    since the full representation serialises them all.
+    """
+    if fields is None:
+        if hasattr(model, 'with_documents'):
+            return query.options(model.with_documents())
+        return query
+    return query.options(model.load_fields(fields))
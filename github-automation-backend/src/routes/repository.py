@@ -1,29 +1,66 @@
 from flask import Blueprint, request, jsonify
 from src.models.repository import db, Repository, Analysis, AutomationEntry
+from src.models.rollup import sum_rollups
+from src.routes.fields import requested_fields, select_fields, InvalidFields
+from src.services.response_cache import cached_response
+from src.routes.etags import conditional_get
+from src.services.repository_import import DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, import_repositories, iter_ndjson
+from src.services.automation_batch import MAX_BATCH_ENTRIES, apply_status_transitions, create_automation_entries
 from datetime import datetime
 import json
 
 repository_bp = Blueprint('repository', __name__)
 
+def get_latest_analyses(repositories):
+    """Return the latest analysis of each repository, keyed by repository id.
+
+    Repositories carry the id of their latest analysis, so this is a single
+    primary key lookup for the whole list.
+    """
+    analysis_ids = [repo.latest_analysis_id for repo in repositories if repo.latest_analysis_id]
+    if not analysis_ids:
+        return {}
+    analyses = Analysis.query.options(Analysis.with_documents()).filter(Analysis.id.in_(analysis_ids)).all()
+    return {analysis.repository_id: analysis for analysis in analyses}
+
+def serialize_repositories_with_latest_analysis(repositories, fields=None):
+    """Serialise repositories, with their latest analysis unless `fields` leaves it out"""
+    latest_analyses = {}
+    if fields is None or 'latest_analysis' in fields:
+        # One query for all latest analyses instead of one per repository
+        latest_analyses = get_latest_analyses(repositories)
+    
+    result = []
+    for repo in repositories:
+        repo_dict = repo.to_dict(fields)
+        latest_analysis = latest_analyses.get(repo.id)
+        if latest_analysis:
+            repo_dict['latest_analysis'] = latest_analysis.to_dict()
+        result.append(repo_dict)
+    return result
+
+def invalid_fields_response(error):
+    return jsonify({
+        'success': False,
+        'error': str(error)
+    }), 400
+
 @repository_bp.route('/repositories', methods=['GET'])
+@conditional_get(['repositories', 'analyses', 'commit_analyses', 'webhook_events'])
+@cached_response(['repositories', 'analyses', 'commit_analyses', 'webhook_events'])
 def get_repositories():
     """Get all repositories with their latest analysis"""
     try:
-        repositories = Repository.query.all()
-        result = []
-        
-        for repo in repositories:
-            repo_dict = repo.to_dict()
-            # Get latest analysis
-            latest_analysis = Analysis.query.filter_by(repository_id=repo.id).order_by(Analysis.created_at.desc()).first()
-            if latest_analysis:
-                repo_dict['latest_analysis'] = latest_analysis.to_dict()
-            result.append(repo_dict)
+        fields = requested_fields(Repository)
+        repositories = select_fields(Repository.query, Repository, fields).all()
+        result = serialize_repositories_with_latest_analysis(repositories, fields)
         
         return jsonify({
             'success': True,
             'repositories': result
         }), 200
+    except InvalidFields as e:
+        return invalid_fields_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -50,6 +87,8 @@ def create_repository():
             name=data.get('name'),
             full_name=data.get('full_name'),
             url=data.get('url'),
+            clone_url=data.get('clone_url'),
+            default_branch=data.get('default_branch'),
             description=data.get('description'),
             language=data.get('language'),
             stars=data.get('stars', 0),
@@ -81,7 +120,45 @@ def create_repository():
             'error': str(e)
         }), 500
 
+@repository_bp.route('/repositories/bulk', methods=['POST'])
+def bulk_upsert_repositories():
+    """Create or update many repositories by full_name.
+
+    The body is a JSON array of repository objects, or NDJSON (one object
+    per line) with an `application/x-ndjson` content type, which is read as
+    a stream. Rows are upserted in batches of `batch_size`, each batch in
+    its own transaction. Every record gets a result: created, updated,
+    unchanged, superseded (by a later record with the same full_name),
+    invalid or failed.
+    """
+    try:
+        batch_size = max(1, min(request.args.get('batch_size', DEFAULT_BATCH_SIZE, type=int), MAX_BATCH_SIZE))
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            records = iter_ndjson(line.decode('utf-8') for line in request.stream)
+        else:
+            records = request.get_json(silent=True)
+            if not isinstance(records, list):
+                return jsonify({
+                    'success': False,
+                    'error': 'Expected a JSON array of repositories or an NDJSON body'
+                }), 400
+        
+        results, summary = import_repositories(records, batch_size=batch_size)
+        
+        return jsonify({
+            'success': summary['invalid'] == 0 and summary['failed'] == 0,
+            'summary': summary,
+            'results': results
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @repository_bp.route('/repositories/<int:repo_id>', methods=['GET'])
+@conditional_get(['repositories', 'analyses', 'automation_entries', 'commit_analyses', 'webhook_events'])
 def get_repository(repo_id):
     """Get a specific repository with all its analyses"""
     try:
@@ -89,11 +166,11 @@ def get_repository(repo_id):
         repo_dict = repo.to_dict()
         
         # Get all analyses for this repository
-        analyses = Analysis.query.filter_by(repository_id=repo_id).order_by(Analysis.created_at.desc()).all()
+        analyses = Analysis.query.options(Analysis.with_documents()).filter_by(repository_id=repo_id).order_by(Analysis.created_at.desc()).all()
         repo_dict['analyses'] = [analysis.to_dict() for analysis in analyses]
         
         # Get automation entries
-        automation_entries = AutomationEntry.query.filter_by(repository_id=repo_id).order_by(AutomationEntry.created_at.desc()).all()
+        automation_entries = AutomationEntry.query.options(AutomationEntry.with_documents()).filter_by(repository_id=repo_id).order_by(AutomationEntry.created_at.desc()).all()
         repo_dict['automation_entries'] = [entry.to_dict() for entry in automation_entries]
         
         return jsonify({
@@ -154,18 +231,23 @@ def create_analysis():
         }), 500
 
 @repository_bp.route('/repositories/<int:repo_id>/analyses', methods=['GET'])
+@conditional_get(['analyses'])
 def get_analyses(repo_id):
     """Get all analyses for a repository"""
     try:
         # Verify repository exists
         repo = Repository.query.get_or_404(repo_id)
         
-        analyses = Analysis.query.filter_by(repository_id=repo_id).order_by(Analysis.created_at.desc()).all()
+        fields = requested_fields(Analysis)
+        analyses = select_fields(Analysis.query, Analysis, fields)\
+            .filter_by(repository_id=repo_id).order_by(Analysis.created_at.desc()).all()
         
         return jsonify({
             'success': True,
-            'analyses': [analysis.to_dict() for analysis in analyses]
+            'analyses': [analysis.to_dict(fields) for analysis in analyses]
         }), 200
+    except InvalidFields as e:
+        return invalid_fields_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -173,10 +255,11 @@ def get_analyses(repo_id):
         }), 500
 
 @repository_bp.route('/repositories/<int:repo_id>/analyses/<int:analysis_id>', methods=['GET'])
+@conditional_get(['analyses'])
 def get_analysis(repo_id, analysis_id):
     """Get a specific analysis"""
     try:
-        analysis = Analysis.query.filter_by(id=analysis_id, repository_id=repo_id).first_or_404()
+        analysis = Analysis.query.options(Analysis.with_documents()).filter_by(id=analysis_id, repository_id=repo_id).first_or_404()
         
         return jsonify({
             'success': True,
@@ -226,25 +309,106 @@ def create_automation_entry():
         }), 500
 
 @repository_bp.route('/repositories/<int:repo_id>/automation-entries', methods=['GET'])
+@conditional_get(['automation_entries'])
 def get_automation_entries(repo_id):
     """Get all automation entries for a repository"""
     try:
         # Verify repository exists
         repo = Repository.query.get_or_404(repo_id)
         
-        entries = AutomationEntry.query.filter_by(repository_id=repo_id).order_by(AutomationEntry.created_at.desc()).all()
+        fields = requested_fields(AutomationEntry)
+        entries = select_fields(AutomationEntry.query, AutomationEntry, fields)\
+            .filter_by(repository_id=repo_id).order_by(AutomationEntry.created_at.desc()).all()
         
         return jsonify({
             'success': True,
-            'automation_entries': [entry.to_dict() for entry in entries]
+            'automation_entries': [entry.to_dict(fields) for entry in entries]
+        }), 200
+    except InvalidFields as e:
+        return invalid_fields_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def batch_records(data, key):
+    """Records of a batch request: a JSON array, or an object holding one under `key`"""
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a JSON array or an object with a '{key}' array")
+    if len(data) > MAX_BATCH_ENTRIES:
+        raise ValueError(f"At most {MAX_BATCH_ENTRIES} records per batch")
+    return data
+
+@repository_bp.route('/repositories/<int:repo_id>/automation-entries/batch', methods=['POST'])
+def create_automation_entries_batch(repo_id):
+    """Create many automation entries in one statement and one transaction.
+
+    Valid entries are created together; invalid ones are reported per index
+    and skipped.
+    """
+    Repository.query.get_or_404(repo_id)
+    
+    try:
+        try:
+            records = batch_records(request.get_json(silent=True), 'entries')
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        results, summary = create_automation_entries(repo_id, records)
+        
+        return jsonify({
+            'success': summary['invalid'] == 0,
+            'summary': summary,
+            'results': results
+        }), 201 if summary['created'] else 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@repository_bp.route('/automation-entries/transitions', methods=['POST'])
+def transition_automation_entries():
+    """Change the status of many automation entries at once.
+
+    Each transition is `{"id", "status", "updated_at"}`, optionally with
+    details, branch_name, pr_title and pr_url. `updated_at` is the value
+    last read; entries modified since then are reported as conflicts and
+    left unchanged. Results are: updated, conflict, invalid_transition,
+    not_found or invalid.
+    """
+    try:
+        try:
+            records = batch_records(request.get_json(silent=True), 'transitions')
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        results, summary = apply_status_transitions(records)
+        
+        return jsonify({
+            'success': summary['updated'] == len(results),
+            'summary': summary,
+            'results': results
         }), 200
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 @repository_bp.route('/repositories/search', methods=['GET'])
+@conditional_get(['repositories', 'analyses', 'commit_analyses', 'webhook_events'])
 def search_repositories():
     """Search repositories by name or full_name"""
     try:
@@ -255,7 +419,8 @@ def search_repositories():
                 'error': 'Query parameter "q" is required'
             }), 400
         
-        repositories = Repository.query.filter(
+        fields = requested_fields(Repository)
+        repositories = select_fields(Repository.query, Repository, fields).filter(
             db.or_(
                 Repository.name.ilike(f'%{query}%'),
                 Repository.full_name.ilike(f'%{query}%'),
@@ -263,19 +428,14 @@ def search_repositories():
             )
         ).all()
         
-        result = []
-        for repo in repositories:
-            repo_dict = repo.to_dict()
-            # Get latest analysis
-            latest_analysis = Analysis.query.filter_by(repository_id=repo.id).order_by(Analysis.created_at.desc()).first()
-            if latest_analysis:
-                repo_dict['latest_analysis'] = latest_analysis.to_dict()
-            result.append(repo_dict)
+        result = serialize_repositories_with_latest_analysis(repositories, fields)
         
         return jsonify({
             'success': True,
             'repositories': result
         }), 200
+    except InvalidFields as e:
+        return invalid_fields_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -283,16 +443,19 @@ def search_repositories():
         }), 500
 
 @repository_bp.route('/statistics', methods=['GET'])
+@conditional_get(['repositories', 'analyses', 'automation_entries'])
+@cached_response(['repositories', 'analyses', 'automation_entries'])
 def get_statistics():
     """Get overall statistics"""
     try:
         total_repos = Repository.query.count()
-        total_analyses = Analysis.query.count()
-        total_automation_entries = AutomationEntry.query.count()
+        totals = sum_rollups(['analyses', 'automation_entries'])
+        total_analyses = totals['analyses']
+        total_automation_entries = totals['automation_entries']
         
         # Get recent activity
-        recent_analyses = Analysis.query.order_by(Analysis.created_at.desc()).limit(5).all()
-        recent_automation = AutomationEntry.query.order_by(AutomationEntry.created_at.desc()).limit(5).all()
+        recent_analyses = Analysis.query.options(Analysis.with_documents()).order_by(Analysis.created_at.desc()).limit(5).all()
+        recent_automation = AutomationEntry.query.options(AutomationEntry.with_documents()).order_by(AutomationEntry.created_at.desc()).limit(5).all()
         
         return jsonify({
             'success': True,
@@ -1,17 +1,60 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 import hashlib
 import hmac
-import json
 from datetime import datetime
 from ..models.webhook import WebhookEvent, CommitAnalysis, ActionLog, db
 from ..models.repository import Repository
-from ..services.github_service import GitHubService
+from ..models import json_codec
+from ..services.github_service import GitHubService, remember_branch_head
 from ..services.openai_service import OpenAIService
+from ..services.git_mirror import get_git_mirror
+from ..services.push_changes import is_large_push, fetch_push_changes, build_push_commit_data
+from ..services.response_cache import cached_response
+from ..services.analytics_export import (
+    DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, MAX_CHUNK_SIZE, ExportUnavailable,
+    encode_export, export_watermark, iter_export_chunks
+)
+from .etags import conditional_get
+from .pagination import keyset_paginate, InvalidCursor
+from .fields import requested_fields, select_fields, InvalidFields
 import logging
 
 webhook_bp = Blueprint('webhook', __name__)
 logger = logging.getLogger(__name__)
 
+def paginated_response(key, query, model, per_page):
+    """Serialise a listing, by cursor when `cursor` is passed and by page otherwise.
+
+    `fields=` or `view=summary` restrict both the columns selected and the
+    keys serialised, see routes/fields.py.
+
+    Cursor mode: pass `cursor` empty for the first page, then the returned
+    `next_cursor`; `total=exact` or `total=estimate` adds a total. Page
+    mode keeps the original `page` parameter and exact totals.
+    """
+    fields = requested_fields(model)
+    query = select_fields(query, model, fields)
+    
+    if 'cursor' in request.args:
+        items, meta = keyset_paginate(
+            query, model, per_page,
+            cursor=request.args.get('cursor') or None,
+            total=request.args.get('total')
+        )
+        return jsonify({key: [item.to_dict(fields) for item in items], **meta})
+    
+    page = request.args.get('page', 1, type=int)
+    results = query.order_by(model.created_at.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    return jsonify({
+        key: [item.to_dict(fields) for item in results.items],
+        'total': results.total,
+        'pages': results.pages,
+        'current_page': page,
+        'per_page': per_page
+    })
+
 def verify_github_signature(payload_body, signature_header, secret):
     """Verify that the payload was sent from GitHub by validating SHA256 signature."""
     if not signature_header:
@@ -48,8 +91,8 @@ def handle_github_webhook():
         
         # Parse JSON payload
         try:
-            payload = json.loads(payload_body.decode('utf-8'))
-        except json.JSONDecodeError:
+            payload = json_codec.loads(payload_body)
+        except json_codec.JSONDecodeError:
             logger.error(f"Invalid JSON payload for delivery {delivery_id}")
             return jsonify({'error': 'Invalid JSON payload'}), 400
         
@@ -68,6 +111,7 @@ def handle_github_webhook():
                 github_id=repo_data['id'],
                 url=repo_data['html_url'],
                 clone_url=repo_data['clone_url'],
+                default_branch=repo_data.get('default_branch'),
                 description=repo_data.get('description', ''),
                 language=repo_data.get('language', ''),
                 stars=repo_data.get('stargazers_count', 0),
@@ -77,6 +121,9 @@ def handle_github_webhook():
             )
             db.session.add(repository)
             db.session.flush()  # Get the ID
+        elif repo_data.get('default_branch') and repository.default_branch != repo_data['default_branch']:
+            # Keep the default branch fresh, it can be renamed at any time
+            repository.default_branch = repo_data['default_branch']
         
         # Check if we've already processed this delivery
         existing_event = WebhookEvent.query.filter_by(github_delivery_id=delivery_id).first()
@@ -160,95 +207,37 @@ def process_push_event(webhook_event, payload):
         
         logger.info(f"Processing {len(commits)} commits for {repository.full_name}")
         
-        for commit_data in commits:
-            # Skip merge commits
-            if len(commit_data.get('parents', [])) > 1:
-                continue
-            
-            # Create commit analysis record
-            commit_analysis = CommitAnalysis(
-                webhook_event_id=webhook_event.id,
-                repository_id=repository.id,
-                commit_sha=commit_data['id'],
-                commit_message=commit_data['message'],
-                author_name=commit_data['author']['name'],
-                author_email=commit_data['author']['email']
+        # Remember the new branch head so PR creation can skip the lookup
+        ref = payload.get('ref', '')
+        if ref.startswith('refs/heads/'):
+            head_commit = payload.get('head_commit') or {}
+            remember_branch_head(
+                repository.full_name,
+                ref[len('refs/heads/'):],
+                payload.get('after'),
+                head_commit.get('tree_id')
             )
-            db.session.add(commit_analysis)
-            db.session.flush()  # Get the ID
-            
-            # Analyze the commit with OpenAI
-            try:
-                openai_service = OpenAIService()
-                analysis_result = openai_service.analyze_commit(commit_data, repository)
-                
-                commit_analysis.set_ai_analysis(analysis_result.get('analysis', {}))
-                commit_analysis.set_suggestions(analysis_result.get('suggestions', []))
-                commit_analysis.risk_score = analysis_result.get('risk_score', 0)
-                commit_analysis.quality_score = analysis_result.get('quality_score', 0)
-                commit_analysis.analyzed_at = datetime.utcnow()
-                
-                # Log successful analysis
-                log_entry = ActionLog(
-                    action_type='commit_analyzed',
-                    repository_id=repository.id,
-                    commit_analysis_id=commit_analysis.id,
-                    message=f"Analyzed commit {commit_data['id'][:8]} by {commit_data['author']['name']}",
-                    level='success'
-                )
-                log_entry.set_details({
-                    'commit_sha': commit_data['id'],
-                    'risk_score': commit_analysis.risk_score,
-                    'quality_score': commit_analysis.quality_score,
-                    'suggestions_count': len(analysis_result.get('suggestions', []))
-                })
-                db.session.add(log_entry)
-                
-                # Generate PR if needed
-                if analysis_result.get('should_create_pr', False):
-                    github_service = GitHubService()
-                    pr_result = github_service.create_improvement_pr(
-                        repository, 
-                        commit_analysis, 
-                        analysis_result
-                    )
-                    
-                    if pr_result.get('success'):
-                        commit_analysis.pr_generated = True
-                        commit_analysis.pr_url = pr_result.get('pr_url')
-                        commit_analysis.pr_title = pr_result.get('pr_title')
-                        commit_analysis.pr_description = pr_result.get('pr_description')
-                        
-                        # Log PR generation
-                        pr_log = ActionLog(
-                            action_type='pr_generated',
-                            repository_id=repository.id,
-                            commit_analysis_id=commit_analysis.id,
-                            message=f"Generated PR for commit {commit_data['id'][:8]}",
-                            level='success'
-                        )
-                        pr_log.set_details({
-                            'pr_url': pr_result.get('pr_url'),
-                            'pr_title': pr_result.get('pr_title')
-                        })
-                        db.session.add(pr_log)
-                
-            except Exception as e:
-                logger.error(f"Error analyzing commit {commit_data['id']}: {str(e)}")
-                
-                # Log analysis error
-                error_log = ActionLog(
-                    action_type='analysis_error',
-                    repository_id=repository.id,
-                    commit_analysis_id=commit_analysis.id,
-                    message=f"Failed to analyze commit {commit_data['id'][:8]}: {str(e)}",
-                    level='error'
-                )
-                error_log.set_details({
-                    'commit_sha': commit_data['id'],
-                    'error': str(e)
-                })
-                db.session.add(error_log)
+        
+        mirror = get_git_mirror()
+        if mirror and repository.clone_url and not payload.get('deleted'):
+            # Clone or catch up in the background, never on the webhook path.
+            # Until the push lands in the mirror, the comparison and diffs
+            # below fall back to the REST API.
+            mirror.schedule_sync(repository.full_name, repository.clone_url)
+        
+        push_changes = None
+        if is_large_push(payload):
+            push_changes = fetch_push_changes(repository, payload)
+        
+        if push_changes is not None:
+            # One analysis over the authoritative file set of the whole push
+            analyze_commit(webhook_event, repository, build_push_commit_data(payload, push_changes))
+        else:
+            # Skip merge commits; copies, so the diffs stay out of the stored payload
+            commits = [dict(commit_data) for commit_data in commits if len(commit_data.get('parents', [])) <= 1]
+            attach_commit_diffs(repository, commits)
+            for commit_data in commits:
+                analyze_commit(webhook_event, repository, commit_data)
         
         # Mark webhook as processed
         webhook_event.processed = True
@@ -262,6 +251,121 @@ def process_push_event(webhook_event, payload):
         db.session.rollback()
         raise
 
+def attach_commit_diffs(repository, commits):
+    """Fetch the diffs of the pushed commits concurrently for their prompts.
+
+    Commits whose diff cannot be fetched are analyzed from the file lists
+    alone, as before.
+    """
+    shas = [commit_data['id'] for commit_data in commits if commit_data.get('id')]
+    if not shas:
+        return
+    try:
+        diffs = GitHubService().fan_out().get_commit_diffs(repository.full_name, shas)
+    except Exception as e:
+        logger.warning(f"Could not fetch commit diffs for {repository.full_name}: {str(e)}")
+        return
+    
+    diffs_by_sha = dict(zip(shas, diffs))
+    for commit_data in commits:
+        diff = diffs_by_sha.get(commit_data.get('id'))
+        if diff:
+            commit_data['diff'] = diff
+
+def analyze_commit(webhook_event, repository, commit_data):
+    """Analyze one commit (or a whole push) and record the results"""
+    # Create commit analysis record
+    commit_analysis = CommitAnalysis(
+        webhook_event_id=webhook_event.id,
+        repository_id=repository.id,
+        commit_sha=commit_data['id'],
+        commit_message=commit_data['message'],
+        author_name=commit_data['author']['name'],
+        author_email=commit_data['author']['email']
+    )
+    db.session.add(commit_analysis)
+    db.session.flush()  # Get the ID
+    
+    # Analyze the commit with OpenAI
+    try:
+        openai_service = OpenAIService()
+        analysis_result = openai_service.analyze_commit(commit_data, repository)
+        
+        analysis = analysis_result.get('analysis', {})
+        if commit_data.get('push_level'):
+            analysis['push'] = {
+                'commit_count': commit_data['commit_count'],
+                'files_changed': len(commit_data['added']) + len(commit_data['modified']) + len(commit_data['removed']),
+                'files_truncated': commit_data['files_truncated']
+            }
+        commit_analysis.set_ai_analysis(analysis)
+        commit_analysis.set_suggestions(analysis_result.get('suggestions', []))
+        commit_analysis.risk_score = analysis_result.get('risk_score', 0)
+        commit_analysis.quality_score = analysis_result.get('quality_score', 0)
+        commit_analysis.analyzed_at = datetime.utcnow()
+        
+        # Log successful analysis
+        log_entry = ActionLog(
+            action_type='commit_analyzed',
+            repository_id=repository.id,
+            commit_analysis_id=commit_analysis.id,
+            message=f"Analyzed commit {commit_data['id'][:8]} by {commit_data['author']['name']}",
+            level='success'
+        )
+        log_entry.set_details({
+            'commit_sha': commit_data['id'],
+            'risk_score': commit_analysis.risk_score,
+            'quality_score': commit_analysis.quality_score,
+            'suggestions_count': len(analysis_result.get('suggestions', []))
+        })
+        db.session.add(log_entry)
+        
+        # Generate PR if needed
+        if analysis_result.get('should_create_pr', False):
+            github_service = GitHubService()
+            pr_result = github_service.create_improvement_pr(
+                repository, 
+                commit_analysis, 
+                analysis_result
+            )
+            
+            if pr_result.get('success'):
+                commit_analysis.pr_generated = True
+                commit_analysis.pr_url = pr_result.get('pr_url')
+                commit_analysis.pr_title = pr_result.get('pr_title')
+                commit_analysis.pr_description = pr_result.get('pr_description')
+                
+                # Log PR generation
+                pr_log = ActionLog(
+                    action_type='pr_generated',
+                    repository_id=repository.id,
+                    commit_analysis_id=commit_analysis.id,
+                    message=f"Generated PR for commit {commit_data['id'][:8]}",
+                    level='success'
+                )
+                pr_log.set_details({
+                    'pr_url': pr_result.get('pr_url'),
+                    'pr_title': pr_result.get('pr_title')
+                })
+                db.session.add(pr_log)
+        
+    except Exception as e:
+        logger.error(f"Error analyzing commit {commit_data['id']}: {str(e)}")
+        
+        # Log analysis error
+        error_log = ActionLog(
+            action_type='analysis_error',
+            repository_id=repository.id,
+            commit_analysis_id=commit_analysis.id,
+            message=f"Failed to analyze commit {commit_data['id'][:8]}: {str(e)}",
+            level='error'
+        )
+        error_log.set_details({
+            'commit_sha': commit_data['id'],
+            'error': str(e)
+        })
+        db.session.add(error_log)
+
 def process_pull_request_event(webhook_event, payload):
     """Process a pull request event"""
     try:
@@ -300,33 +404,28 @@ def process_pull_request_event(webhook_event, payload):
         raise
 
 @webhook_bp.route('/webhook/events', methods=['GET'])
+@conditional_get(['webhook_events'])
+@cached_response(['webhook_events'])
 def get_webhook_events():
     """Get recent webhook events"""
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
+        query = WebhookEvent.query
         
-        events = WebhookEvent.query.order_by(WebhookEvent.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'events': [event.to_dict() for event in events.items],
-            'total': events.total,
-            'pages': events.pages,
-            'current_page': page,
-            'per_page': per_page
-        })
+        return paginated_response('events', query, WebhookEvent, per_page)
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching webhook events: {str(e)}")
         return jsonify({'error': 'Failed to fetch events'}), 500
 
 @webhook_bp.route('/webhook/commits', methods=['GET'])
+@conditional_get(['commit_analyses'])
+@cached_response(['commit_analyses'])
 def get_commit_analyses():
     """Get recent commit analyses"""
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
         repository_id = request.args.get('repository_id', type=int)
         
@@ -334,27 +433,61 @@ def get_commit_analyses():
         if repository_id:
             query = query.filter_by(repository_id=repository_id)
         
-        analyses = query.order_by(CommitAnalysis.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'analyses': [analysis.to_dict() for analysis in analyses.items],
-            'total': analyses.total,
-            'pages': analyses.pages,
-            'current_page': page,
-            'per_page': per_page
-        })
+        return paginated_response('analyses', query, CommitAnalysis, per_page)
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching commit analyses: {str(e)}")
         return jsonify({'error': 'Failed to fetch analyses'}), 500
 
+@webhook_bp.route('/webhook/commits/export', methods=['GET'])
+def export_commit_analyses():
+    """Stream commit analyses with scores and log aggregates, for analytics.
+
+    Query parameters: `format` (ndjson, parquet or arrow, default ndjson),
+    `after` to export only analyses committed since a previous export, and
+    `chunk_size`. The `X-Export-Watermark` response header is the `after`
+    to pass next time. Parquet and arrow need the optional pyarrow package
+    and are answered with a 400 naming it when it is missing.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    after = None
+    if request.args.get('after'):
+        try:
+            after = datetime.fromisoformat(request.args['after'])
+        except ValueError:
+            return jsonify({'error': 'after must be an ISO 8601 datetime'}), 400
+    chunk_size = max(1, min(request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int), MAX_CHUNK_SIZE))
+    
+    try:
+        upper = export_watermark()
+        encoded = encode_export(export_format, iter_export_chunks(after, upper, chunk_size))
+    except ExportUnavailable as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exporting commit analyses: {str(e)}")
+        return jsonify({'error': 'Failed to export analyses'}), 500
+    
+    watermark = max(upper, after) if after else upper
+    content_type, extension = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(encoded),
+        mimetype=content_type,
+        headers={
+            'X-Export-Watermark': watermark.isoformat(),
+            'Content-Disposition': f'attachment; filename=commit_analyses_{watermark:%Y%m%dT%H%M%S}.{extension}'
+        }
+    )
+
 @webhook_bp.route('/webhook/logs', methods=['GET'])
+@conditional_get(['action_logs'])
+@cached_response(['action_logs'])
 def get_action_logs():
     """Get recent action logs"""
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 50, type=int), 200)
         level = request.args.get('level')
         action_type = request.args.get('action_type')
@@ -368,18 +501,10 @@ def get_action_logs():
         if repository_id:
             query = query.filter_by(repository_id=repository_id)
         
-        logs = query.order_by(ActionLog.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'logs': [log.to_dict() for log in logs.items],
-            'total': logs.total,
-            'pages': logs.pages,
-            'current_page': page,
-            'per_page': per_page
-        })
+        return paginated_response('logs', query, ActionLog, per_page)
         
+    except (InvalidCursor, InvalidFields) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching action logs: {str(e)}")
         return jsonify({'error': 'Failed to fetch logs'}), 500
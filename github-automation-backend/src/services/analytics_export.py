@@ -0,0 +1,231 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, tuple_
+from ..models.repository import db, Repository
+from ..models.webhook import CommitAnalysis, ActionLog
+from ..models.rollup import count_where
+from ..models import json_codec
+
+# Optional, from requirements-analytics.txt. Without it only NDJSON exports
+# are available, and the columnar formats raise ExportUnavailable.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Commit analyses read from the database, and written out, per chunk
+DEFAULT_CHUNK_SIZE = 5000
+MAX_CHUNK_SIZE = 50000
+
+# How far the export upper bound trails the clock. committed_at is stamped
+# just before COMMIT, so a row can become visible slightly after its stamp,
+# and app servers' clocks may disagree by a little
+EXPORT_LAG = timedelta(seconds=60)
+
+# Exported columns in order, with their Arrow types
+EXPORT_COLUMNS = (
+    ('id', 'int64'),
+    ('repository_id', 'int64'),
+    ('repository', 'string'),
+    ('webhook_event_id', 'int64'),
+    ('commit_sha', 'string'),
+    ('commit_message', 'string'),
+    ('author_name', 'string'),
+    ('author_email', 'string'),
+    ('risk_score', 'int32'),
+    ('quality_score', 'int32'),
+    ('pr_generated', 'bool'),
+    ('pr_url', 'string'),
+    ('created_at', 'timestamp[us]'),
+    ('analyzed_at', 'timestamp[us]'),
+    ('committed_at', 'timestamp[us]'),
+    ('suggestion_count', 'int32'),
+    ('log_count', 'int32'),
+    ('error_log_count', 'int32'),
+    ('log_duration_ms', 'int64'),
+)
+
+# Format name -> (content type, file extension)
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+class ExportUnavailable(RuntimeError):
+    """Raised for formats whose optional dependency is not installed"""
+
+def suggestion_count_column():
+    """Length of the suggestions array, computed by the database"""
+    if db.engine.dialect.name == 'postgresql':
+        return case(
+            (func.jsonb_typeof(CommitAnalysis.suggestions) == 'array', func.jsonb_array_length(CommitAnalysis.suggestions)),
+            else_=0
+        )
+    return func.coalesce(func.json_array_length(CommitAnalysis.suggestions), 0)
+
+def export_watermark():
+    """Upper bound of an export started now, and the `after` of the next one.
+
+    Incremental exports walk committed_at rather than the id: ids are
+    assigned at the first flush, and an analysis waiting on OpenAI commits
+    after others with higher ids.
+    """
+    return datetime.utcnow() - EXPORT_LAG
+
+def fetch_export_chunk(after, upper, chunk_size, position=None):
+    """Export rows committed in (after, upper], at most `chunk_size` of them,
+    continuing past the (committed_at, id) `position` of the previous chunk.
+
+    Log aggregates are computed for the whole chunk in one grouped query
+    over the commit_analysis_id index.
+    """
+    query = db.session.query(
+        CommitAnalysis.id,
+        CommitAnalysis.repository_id,
+        Repository.full_name,
+        CommitAnalysis.webhook_event_id,
+        CommitAnalysis.commit_sha,
+        CommitAnalysis.commit_message,
+        CommitAnalysis.author_name,
+        CommitAnalysis.author_email,
+        CommitAnalysis.risk_score,
+        CommitAnalysis.quality_score,
+        CommitAnalysis.pr_generated,
+        CommitAnalysis.pr_url,
+        CommitAnalysis.created_at,
+        CommitAnalysis.analyzed_at,
+        CommitAnalysis.committed_at,
+        suggestion_count_column()
+    ).outerjoin(Repository, Repository.id == CommitAnalysis.repository_id)\
+        .filter(CommitAnalysis.committed_at <= upper)
+    if position is not None:
+        query = query.filter(tuple_(CommitAnalysis.committed_at, CommitAnalysis.id) > position)
+    elif after is not None:
+        query = query.filter(CommitAnalysis.committed_at > after)
+    rows = query.order_by(CommitAnalysis.committed_at, CommitAnalysis.id).limit(chunk_size).all()
+    if not rows:
+        return []
+
+    log_aggregates = {
+        analysis_id: (log_count, error_count, duration)
+        for analysis_id, log_count, error_count, duration in db.session.query(
+            ActionLog.commit_analysis_id,
+            func.count(ActionLog.id),
+            count_where(ActionLog.level == 'error'),
+            func.coalesce(func.sum(ActionLog.duration_ms), 0)
+        ).filter(ActionLog.commit_analysis_id.in_([row[0] for row in rows]))
+        .group_by(ActionLog.commit_analysis_id)
+    }
+
+    names = [name for name, _ in EXPORT_COLUMNS]
+    chunk = []
+    for row in rows:
+        log_count, error_count, duration = log_aggregates.get(row[0], (0, 0, 0))
+        chunk.append(dict(zip(names, (*row, log_count, int(error_count), int(duration)))))
+    return chunk
+
+def iter_export_chunks(after=None, upper=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of export rows committed after `after`, walking (committed_at, id).
+
+    Each chunk is a range seek on the committed_at index, so memory stays
+    at one chunk and the cost of a chunk does not depend on how far the
+    export has got. An analysis changed again after an export is exported
+    again; consumers keep the last row per id.
+    """
+    if upper is None:
+        upper = export_watermark()
+    position = None
+    while True:
+        chunk = fetch_export_chunk(after, upper, chunk_size, position)
+        if not chunk:
+            return
+        yield chunk
+        position = (chunk[-1]['committed_at'], chunk[-1]['id'])
+
+def arrow_schema():
+    return pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in EXPORT_COLUMNS])
+
+class ChunkSink:
+    """Write-only file for pyarrow writers, handing back the bytes written since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # Parquet records absolute offsets in its footer
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+def encode_ndjson(chunks):
+    for rows in chunks:
+        yield b''.join(json_codec.dumps_bytes(row) + b'\n' for row in rows)
+
+def encode_arrow(chunks, make_writer):
+    """Encode chunks through a pyarrow writer, one row group / record batch per chunk"""
+    schema = arrow_schema()
+    sink = ChunkSink()
+    writer = make_writer(sink, schema)
+    for rows in chunks:
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def encode_export(export_format, chunks):
+    """Bytes of an export in `export_format`, produced chunk by chunk"""
+    if export_format == 'ndjson':
+        return encode_ndjson(chunks)
+    if pa is None:
+        raise ExportUnavailable(
+            f"{export_format} export requires the pyarrow package "
+            f"(pip install -r requirements-analytics.txt); use format ndjson instead"
+        )
+    if export_format == 'parquet':
+        return encode_arrow(chunks, pq.ParquetWriter)
+    if export_format == 'arrow':
+        return encode_arrow(chunks, pa.ipc.new_stream)
+    raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+def write_export(path, export_format, after=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write an export to `path`, atomically; returns (rows written, new watermark)"""
+    upper = export_watermark()
+    row_count = 0
+
+    def counted(chunks):
+        nonlocal row_count
+        for rows in chunks:
+            row_count += len(rows)
+            yield rows
+
+    encoded = encode_export(export_format, counted(iter_export_chunks(after, upper, chunk_size)))
+    temporary_path = f"{path}.partial"
+    try:
+        with open(temporary_path, 'wb') as output:
+            for data in encoded:
+                output.write(data)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return row_count, max(upper, after) if after else upper
@@ -0,0 +1,546 @@
+import asyncio
+import atexit
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+import aiohttp
+
+from .github_service import (
+    GitHubService, build_diff_from_files, _commit_cache, _diff_cache, _branch_heads,
+    MAX_COMMIT_FILES
+)
+from .rate_limiter import (
+    MAX_WAIT_SECONDS, PRIORITY_INTERACTIVE, PRIORITY_NORMAL,
+    RESOURCE_CORE, RESOURCE_GRAPHQL, RateLimitExceeded
+)
+
+logger = logging.getLogger(__name__)
+
+# Default number of GitHub requests a client keeps in flight
+DEFAULT_MAX_CONCURRENCY = 10
+
+# Per-request timeout, matching what the synchronous paths wait for a mirror
+REQUEST_TIMEOUT_SECONDS = 30
+
+class GitHubRequestError(Exception):
+    """Raised for non-2xx GitHub responses"""
+
+    def __init__(self, status, url):
+        super().__init__(f"GitHub returned {status} for {url}")
+        self.status = status
+        self.url = url
+
+# Just enough of a response for the rate limiter
+ResponseInfo = namedtuple('ResponseInfo', ['status_code', 'headers'])
+
+class AsyncGitHubService(GitHubService):
+    """asyncio variant of GitHubService for fan-out work.
+
+    Every network method of GitHubService is available as a coroutine with
+    the same arguments and return values. All calls share one aiohttp
+    session, so connections are pooled, and a semaphore bounds how many
+    requests are in flight at once. Caches and the rate limiter are shared
+    with the synchronous client.
+    """
+
+    def __init__(self, token=None, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        super().__init__(token)
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _wait_for_quota(self, priority, resource):
+        """Sleep until the limiter lets a call through, without blocking the loop.
+
+        Same contract as `GitHubRateLimiter.acquire`: raises
+        RateLimitExceeded when the quota will not free up within
+        MAX_WAIT_SECONDS for the priority.
+        """
+        clock = self.rate_limiter.clock
+        deadline = clock() + MAX_WAIT_SECONDS[priority]
+        while True:
+            delay = self.rate_limiter.delay_for(self.token, priority, resource)
+            if delay <= 0:
+                break
+            now = clock()
+            if now + delay > deadline:
+                raise RateLimitExceeded(resource, now + delay)
+            await asyncio.sleep(delay)
+        self.rate_limiter.consume(self.token, resource)
+
+    async def _request(self, method, url, priority=PRIORITY_NORMAL, resource=RESOURCE_CORE, raw=False, **kwargs):
+        """Send a request and return the decoded JSON body (or text if `raw`)"""
+        session = self._get_session()
+        for attempt in range(2):
+            await self._wait_for_quota(priority, resource)
+            async with self._semaphore:
+                async with session.request(method, url, **kwargs) as response:
+                    info = ResponseInfo(response.status, response.headers)
+                    self.rate_limiter.update(self.token, info, resource)
+
+                    retry_after = self.rate_limiter.retry_after(info)
+                    if retry_after is not None and retry_after <= MAX_WAIT_SECONDS[priority] and not attempt:
+                        logger.info(f"Retrying {method} {url} after rate limit")
+                        continue
+
+                    if response.status >= 400:
+                        raise GitHubRequestError(response.status, url)
+                    if raw:
+                        return await response.text()
+                    return await response.json()
+
+    async def graphql(self, query, variables=None, priority=PRIORITY_NORMAL):
+        """Run a GraphQL query and return its `data`"""
+        result = await self._request(
+            'POST', self.graphql_url, priority=priority, resource=RESOURCE_GRAPHQL,
+            json={'query': query, 'variables': variables or {}}
+        )
+        for error in result.get('errors') or []:
+            logger.warning(f"GraphQL error: {error.get('message')}")
+        if result.get('data') is None:
+            raise ValueError('GraphQL query returned no data')
+        return result['data']
+
+    async def graphql_many(self, queries, priority=PRIORITY_NORMAL):
+        """Run several (query, variables) pairs concurrently, in input order.
+
+        A failed query yields its exception in place of the data, so one
+        bad batch does not discard the others.
+        """
+        return list(await asyncio.gather(
+            *(self.graphql(query, variables, priority=priority) for query, variables in queries),
+            return_exceptions=True
+        ))
+
+    async def get_commit(self, repo_full_name, commit_sha):
+        """Get commit metadata, file stats and patches with a single request"""
+        cache_key = (repo_full_name, commit_sha)
+        cached = _commit_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/commits/{commit_sha}"
+            commit = await self._request('GET', url)
+        except Exception as e:
+            logger.error(f"Error fetching commit {commit_sha}: {str(e)}")
+            return None
+
+        _commit_cache.set(cache_key, commit)
+        if commit.get('sha') and commit['sha'] != commit_sha:
+            _commit_cache.set((repo_full_name, commit['sha']), commit)
+        return commit
+
+    async def get_commit_details(self, repo_full_name, commit_sha):
+        """Get detailed information about a specific commit"""
+        return await self.get_commit(repo_full_name, commit_sha)
+
+    async def get_commit_diff(self, repo_full_name, commit_sha):
+        """Get the diff for a specific commit, from the local mirror when possible"""
+        if self.mirror and await asyncio.to_thread(self.mirror.has_commit, repo_full_name, commit_sha):
+            diff = await asyncio.to_thread(self.mirror.get_commit_diff, repo_full_name, commit_sha)
+            if diff is not None:
+                return diff
+
+        commit = await self.get_commit(repo_full_name, commit_sha)
+        if commit is None:
+            return None
+
+        diff = build_diff_from_files(commit.get('files', []))
+        if diff is not None and len(commit.get('files', [])) < MAX_COMMIT_FILES:
+            return diff
+
+        cache_key = (repo_full_name, commit.get('sha', commit_sha))
+        cached = _diff_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/commits/{commit_sha}"
+            headers = {**self.headers, 'Accept': 'application/vnd.github.v3.diff'}
+            diff = await self._request('GET', url, raw=True, headers=headers)
+        except Exception as e:
+            logger.error(f"Error fetching commit diff for {commit_sha}: {str(e)}")
+            return None
+
+        _diff_cache.set(cache_key, diff)
+        return diff
+
+    async def compare_commits(self, repo_full_name, base, head, per_page=100):
+        """Get every commit and the changed files between two refs"""
+        if self.mirror:
+            comparison = await asyncio.to_thread(self.mirror.compare, repo_full_name, base, head)
+            if comparison is not None:
+                return comparison
+
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/compare/{base}...{head}"
+            commits = []
+            files = None
+            total_commits = 0
+            page = 1
+            while True:
+                comparison = await self._request('GET', url, params={'per_page': per_page, 'page': page})
+
+                if files is None:
+                    files = comparison.get('files', [])
+                    total_commits = comparison.get('total_commits', 0)
+
+                page_commits = comparison.get('commits', [])
+                commits.extend(page_commits)
+                if len(page_commits) < per_page or len(commits) >= total_commits:
+                    break
+                page += 1
+
+            return {
+                'commits': commits,
+                'files': files,
+                'total_commits': total_commits,
+                'files_truncated': len(files) >= MAX_COMMIT_FILES
+            }
+        except Exception as e:
+            logger.error(f"Error comparing {base}...{head} in {repo_full_name}: {str(e)}")
+            return None
+
+    async def get_commit_files(self, repo_full_name, commit_sha):
+        """Get the changed files of a commit, from the local mirror when possible"""
+        if self.mirror and await asyncio.to_thread(self.mirror.has_commit, repo_full_name, commit_sha):
+            files = await asyncio.to_thread(self.mirror.get_changed_files, repo_full_name, commit_sha)
+            if files is not None:
+                return files
+
+        commit = await self.get_commit(repo_full_name, commit_sha)
+        return commit.get('files', []) if commit else None
+
+    async def get_commits(self, repo_full_name, commit_shas):
+        """Fetch several commits concurrently, in input order"""
+        return await asyncio.gather(*(self.get_commit(repo_full_name, sha) for sha in commit_shas))
+
+    async def get_commit_diffs(self, repo_full_name, commit_shas):
+        """Fetch the diffs of several commits concurrently, in input order"""
+        return await asyncio.gather(*(self.get_commit_diff(repo_full_name, sha) for sha in commit_shas))
+
+    async def get_repository(self, repo_full_name, priority=PRIORITY_NORMAL):
+        """Get the REST representation of a repository"""
+        try:
+            return await self._request('GET', f"{self.base_url}/repos/{repo_full_name}", priority=priority)
+        except Exception as e:
+            logger.error(f"Error fetching repository {repo_full_name}: {str(e)}")
+            return None
+
+    async def get_repositories(self, repo_full_names, priority=PRIORITY_NORMAL):
+        """Fetch several repositories concurrently, in input order"""
+        return await asyncio.gather(*(self.get_repository(name, priority) for name in repo_full_names))
+
+    async def create_branch(self, repo_full_name, branch_name, base_sha):
+        """Create a new branch from a base commit"""
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/refs"
+            data = {
+                'ref': f'refs/heads/{branch_name}',
+                'sha': base_sha
+            }
+            return await self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
+        except Exception as e:
+            logger.error(f"Error creating branch {branch_name}: {str(e)}")
+            return None
+
+    async def create_file(self, repo_full_name, file_path, content, message, branch):
+        """Create or update a file in the repository"""
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/contents/{file_path}"
+
+            try:
+                existing_file = await self._request(
+                    'GET', url, priority=PRIORITY_INTERACTIVE, params={'ref': branch}
+                )
+            except GitHubRequestError:
+                existing_file = None
+
+            data = {
+                'message': message,
+                'content': content,
+                'branch': branch
+            }
+            if existing_file and 'sha' in existing_file:
+                data['sha'] = existing_file['sha']
+
+            return await self._request('PUT', url, priority=PRIORITY_INTERACTIVE, json=data)
+        except Exception as e:
+            logger.error(f"Error creating/updating file {file_path}: {str(e)}")
+            return None
+
+    async def create_blob(self, repo_full_name, content):
+        """Create a Git blob from base64 encoded content"""
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/blobs"
+            data = {
+                'content': content,
+                'encoding': 'base64'
+            }
+            return await self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
+        except Exception as e:
+            logger.error(f"Error creating blob in {repo_full_name}: {str(e)}")
+            return None
+
+    async def create_blobs(self, repo_full_name, contents):
+        """Create several blobs concurrently, returning them in input order"""
+        if not contents:
+            return []
+        return list(await asyncio.gather(*(self.create_blob(repo_full_name, content) for content in contents)))
+
+    async def create_tree(self, repo_full_name, base_tree_sha, entries):
+        """Create a tree on top of a base tree"""
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/trees"
+            data = {
+                'base_tree': base_tree_sha,
+                'tree': [
+                    {'path': path, 'mode': '100644', 'type': 'blob', 'sha': blob_sha}
+                    for path, blob_sha in entries
+                ]
+            }
+            return await self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
+        except Exception as e:
+            logger.error(f"Error creating tree in {repo_full_name}: {str(e)}")
+            return None
+
+    async def create_git_commit(self, repo_full_name, message, tree_sha, parent_sha):
+        """Create a commit object pointing at a tree"""
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/commits"
+            data = {
+                'message': message,
+                'tree': tree_sha,
+                'parents': [parent_sha]
+            }
+            return await self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
+        except Exception as e:
+            logger.error(f"Error creating commit in {repo_full_name}: {str(e)}")
+            return None
+
+    async def get_tree_sha(self, repo_full_name, commit):
+        """Return the tree SHA of a commit, fetching the commit only if needed"""
+        tree_sha = commit.get('commit', {}).get('tree', {}).get('sha')
+        if tree_sha:
+            return tree_sha
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/commits/{commit['sha']}"
+            git_commit = await self._request('GET', url, priority=PRIORITY_INTERACTIVE)
+            return git_commit['tree']['sha']
+        except Exception as e:
+            logger.error(f"Error getting tree for {commit['sha']}: {str(e)}")
+            return None
+
+    async def commit_files_to_branch(self, repo_full_name, branch_name, base_commit, files, message):
+        """Create a new branch holding all `files` in a single commit"""
+        base_tree_sha = await self.get_tree_sha(repo_full_name, base_commit)
+        if not base_tree_sha:
+            return None
+
+        paths = list(files)
+        blobs = await self.create_blobs(repo_full_name, [files[path] for path in paths])
+        if not blobs or any(blob is None for blob in blobs):
+            return None
+
+        tree = await self.create_tree(
+            repo_full_name,
+            base_tree_sha,
+            [(path, blob['sha']) for path, blob in zip(paths, blobs)]
+        )
+        if not tree:
+            return None
+
+        commit = await self.create_git_commit(repo_full_name, message, tree['sha'], base_commit['sha'])
+        if not commit:
+            return None
+
+        if not await self.create_branch(repo_full_name, branch_name, commit['sha']):
+            return None
+        return commit
+
+    async def create_pull_request(self, repo_full_name, title, body, head_branch, base_branch='main'):
+        """Create a pull request"""
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/pulls"
+            data = {
+                'title': title,
+                'body': body,
+                'head': head_branch,
+                'base': base_branch
+            }
+            return await self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
+        except Exception as e:
+            logger.error(f"Error creating pull request: {str(e)}")
+            return None
+
+    async def get_default_branch(self, repository):
+        """Resolve the default branch of a repository"""
+        if repository.default_branch:
+            return repository.default_branch
+        repo = await self.get_repository(repository.full_name, priority=PRIORITY_INTERACTIVE)
+        if repo is None:
+            return None
+        repository.default_branch = repo['default_branch']
+        return repository.default_branch
+
+    async def get_latest_commit(self, repo_full_name, branch):
+        """Get the latest commit SHA for a branch"""
+        cached = _branch_heads.get((repo_full_name, branch))
+        if cached is not None:
+            return cached
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/branches/{branch}"
+            branch_data = await self._request('GET', url, priority=PRIORITY_INTERACTIVE)
+            return branch_data['commit']
+        except Exception as e:
+            logger.error(f"Error getting latest commit for {branch}: {str(e)}")
+            return None
+
+    async def create_improvement_pr(self, repository, commit_analysis, analysis_result):
+        """Create a PR with improvements based on commit analysis"""
+        try:
+            suggestions = analysis_result.get('suggestions', [])
+            if not suggestions:
+                return {'success': False, 'error': 'No suggestions to implement'}
+
+            timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            branch_name = f"auto-improvement-{commit_analysis.commit_sha[:8]}-{timestamp}"
+
+            files = {}
+            improvements_implemented = []
+            for i, suggestion in enumerate(suggestions[:3]):  # Limit to 3 suggestions
+                if suggestion.get('type') == 'code_improvement':
+                    file_path = f"improvements/suggestion_{i+1}_{timestamp}.md"
+                    files[file_path] = self.generate_improvement_content(suggestion, commit_analysis)
+                    improvements_implemented.append({
+                        'file': file_path,
+                        'title': suggestion.get('title', 'Code improvement'),
+                        'description': suggestion.get('description', '')
+                    })
+
+            if not improvements_implemented:
+                return {'success': False, 'error': 'No improvements could be implemented'}
+
+            default_branch = await self.get_default_branch(repository)
+            if not default_branch:
+                return {'success': False, 'error': 'Could not resolve default branch'}
+            latest_commit = await self.get_latest_commit(repository.full_name, default_branch)
+            if not latest_commit:
+                return {'success': False, 'error': 'Could not get latest commit'}
+
+            commit_result = await self.commit_files_to_branch(
+                repository.full_name,
+                branch_name,
+                latest_commit,
+                files,
+                f"Add {len(files)} improvement suggestion(s) for commit {commit_analysis.commit_sha[:8]}"
+            )
+            if not commit_result:
+                return {'success': False, 'error': 'Could not create branch'}
+
+            pr_title = f"🤖 Auto-generated improvements for commit {commit_analysis.commit_sha[:8]}"
+            pr_body = self.generate_pr_description(commit_analysis, improvements_implemented, analysis_result)
+
+            pr_result = await self.create_pull_request(
+                repository.full_name,
+                pr_title,
+                pr_body,
+                branch_name,
+                default_branch
+            )
+
+            if pr_result:
+                return {
+                    'success': True,
+                    'pr_url': pr_result['html_url'],
+                    'pr_title': pr_title,
+                    'pr_description': pr_body,
+                    'branch_name': branch_name,
+                    'improvements_count': len(improvements_implemented)
+                }
+            else:
+                return {'success': False, 'error': 'Could not create pull request'}
+
+        except Exception as e:
+            logger.error(f"Error creating improvement PR: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+class SyncGitHubFacade:
+    """Blocking wrapper around AsyncGitHubService for Flask routes.
+
+    The async client lives on a private event loop running in a daemon
+    thread, so its connection pool survives across requests. Each method
+    call submits the coroutine to that loop and waits for the result.
+    """
+
+    def __init__(self, token=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, base_url=None, graphql_url=None):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='github-async', daemon=True)
+        self._thread.start()
+        self.service = AsyncGitHubService(token, max_concurrency=max_concurrency)
+        if base_url:
+            self.service.base_url = base_url
+        if graphql_url:
+            self.service.graphql_url = graphql_url
+
+    def run(self, coroutine):
+        """Run a coroutine on the client's loop and return its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.service, name)
+        if not asyncio.iscoroutinefunction(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self.run(attribute(*args, **kwargs))
+        return call
+
+    def close(self):
+        self.run(self.service.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+_facades = {}
+_facades_lock = threading.Lock()
+
+def get_github_facade(token=None, base_url=None, graphql_url=None):
+    """Return the process-wide synchronous facade for a token and endpoint"""
+    key = (token, base_url, graphql_url)
+    with _facades_lock:
+        if key not in _facades:
+            _facades[key] = SyncGitHubFacade(token, base_url=base_url, graphql_url=graphql_url)
+        return _facades[key]
+
+@atexit.register
+def _close_facades():
+    with _facades_lock:
+        facades = list(_facades.values())
+        _facades.clear()
+    for facade in facades:
+        facade.close()
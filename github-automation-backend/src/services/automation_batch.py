@@ -0,0 +1,223 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import and_, case, or_, tuple_
+from ..models.repository import db, Analysis, AutomationEntry
+
+# Entries created or transitioned per request
+MAX_BATCH_ENTRIES = 1000
+
+AUTOMATION_STATUSES = ('pending', 'in_progress', 'completed', 'failed')
+
+# Status -> the statuses an entry may move to from it. Staying in the same
+# status is always allowed, to update the PR fields alone.
+STATUS_TRANSITIONS = {
+    'pending': {'in_progress', 'completed', 'failed'},
+    'in_progress': {'pending', 'completed', 'failed'},
+    'failed': {'pending', 'in_progress'},
+    'completed': set(),
+}
+
+# Text fields a transition may set along with the status
+TRANSITION_FIELDS = ('details', 'branch_name', 'pr_title', 'pr_url')
+
+ENTRY_FIELDS = ('analysis_id', 'action', 'status', 'details', 'branch_name', 'pr_title', 'pr_url', 'metadata')
+
+class InvalidEntry(ValueError):
+    """Raised for batch records that cannot be applied"""
+
+def _check_text_fields(record, fields):
+    for field in fields:
+        if record.get(field) is not None and not isinstance(record[field], str):
+            raise InvalidEntry(f"{field} must be a string")
+
+def _check_id(value, field):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise InvalidEntry(f"{field} must be an integer")
+
+def validate_entry(record):
+    if not isinstance(record, dict):
+        raise InvalidEntry('Entry must be a JSON object')
+    unknown = set(record) - set(ENTRY_FIELDS)
+    if unknown:
+        raise InvalidEntry(f"Unknown fields: {', '.join(sorted(unknown))}")
+    if not isinstance(record.get('action'), str) or not record['action']:
+        raise InvalidEntry('action is required')
+    if record.get('status', 'pending') not in AUTOMATION_STATUSES:
+        raise InvalidEntry(f"status must be one of {', '.join(AUTOMATION_STATUSES)}")
+    if record.get('analysis_id') is not None:
+        _check_id(record['analysis_id'], 'analysis_id')
+    if record.get('metadata') is not None and not isinstance(record['metadata'], dict):
+        raise InvalidEntry('metadata must be an object')
+    _check_text_fields(record, TRANSITION_FIELDS)
+    return record
+
+def _summarise(results, statuses):
+    summary = dict.fromkeys(statuses, 0)
+    for result in results:
+        summary[result['status']] += 1
+    return summary
+
+def create_automation_entries(repository_id, records):
+    """Create the valid entries of a batch in one flush and one commit.
+
+    SQLAlchemy sends the flush as a single multi-row INSERT ... RETURNING,
+    and going through the ORM keeps the rollups and live feed listeners in
+    step. Invalid records, including analyses of other repositories, are
+    reported and skipped. Returns per-record results and a count per status.
+    """
+    results = []
+    valid = []
+    for index, record in enumerate(records):
+        try:
+            valid.append((index, validate_entry(record)))
+        except InvalidEntry as e:
+            results.append({'index': index, 'status': 'invalid', 'error': str(e)})
+
+    analysis_ids = {record['analysis_id'] for _, record in valid if record.get('analysis_id') is not None}
+    known_analyses = set()
+    if analysis_ids:
+        known_analyses = {analysis_id for analysis_id, in db.session.query(Analysis.id).filter(
+            Analysis.id.in_(analysis_ids), Analysis.repository_id == repository_id
+        )}
+
+    created = []
+    for index, record in valid:
+        if record.get('analysis_id') is not None and record['analysis_id'] not in known_analyses:
+            results.append({'index': index, 'status': 'invalid', 'error': 'analysis_id does not belong to this repository'})
+            continue
+        entry = AutomationEntry(
+            repository_id=repository_id,
+            analysis_id=record.get('analysis_id'),
+            action=record['action'],
+            status=record.get('status', 'pending'),
+            details=record.get('details'),
+            branch_name=record.get('branch_name'),
+            pr_title=record.get('pr_title'),
+            pr_url=record.get('pr_url')
+        )
+        entry.set_metadata(record.get('metadata', {}))
+        created.append((index, entry))
+
+    if created:
+        db.session.add_all([entry for _, entry in created])
+        db.session.flush()
+        # Serialise before the commit expires the entries
+        results.extend(
+            {'index': index, 'status': 'created', 'automation_entry': entry.to_dict()}
+            for index, entry in created
+        )
+        db.session.commit()
+
+    results.sort(key=lambda result: result['index'])
+    return results, _summarise(results, ('created', 'invalid'))
+
+def parse_timestamp(value):
+    """Naive UTC datetime from an ISO 8601 string, as stored in updated_at"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidEntry('updated_at must be an ISO 8601 timestamp')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def validate_transition(record):
+    if not isinstance(record, dict):
+        raise InvalidEntry('Transition must be a JSON object')
+    unknown = set(record) - {'id', 'status', 'updated_at', *TRANSITION_FIELDS}
+    if unknown:
+        raise InvalidEntry(f"Unknown fields: {', '.join(sorted(unknown))}")
+    _check_id(record.get('id'), 'id')
+    if record.get('status') not in AUTOMATION_STATUSES:
+        raise InvalidEntry(f"status must be one of {', '.join(AUTOMATION_STATUSES)}")
+    _check_text_fields(record, TRANSITION_FIELDS)
+    return {**record, 'updated_at': parse_timestamp(record.get('updated_at'))}
+
+def source_statuses(status):
+    """Statuses an entry may be in to move to `status`"""
+    return {source for source, targets in STATUS_TRANSITIONS.items() if status in targets} | {status}
+
+def apply_status_transitions(records):
+    """Move entries to new statuses with one UPDATE, guarded by optimistic concurrency.
+
+    Every transition carries the `updated_at` the caller last saw; an entry
+    changed since then is left alone and reported as a conflict, with its
+    current status and updated_at so the caller can decide again. The
+    statement only matches entries whose current status allows the move.
+    Returns per-record results and a count per status.
+    """
+    results = []
+    transitions = {}
+    for index, record in enumerate(records):
+        try:
+            transition = validate_transition(record)
+        except InvalidEntry as e:
+            results.append({'index': index, 'status': 'invalid', 'error': str(e)})
+            continue
+        if transition['id'] in transitions:
+            results.append({'index': index, 'id': transition['id'], 'status': 'invalid', 'error': 'Duplicate id in batch'})
+            continue
+        transitions[transition['id']] = (index, transition)
+
+    if transitions:
+        table = AutomationEntry.__table__
+        ids_by_status = defaultdict(list)
+        for entry_id, (_, transition) in transitions.items():
+            ids_by_status[transition['status']].append(entry_id)
+
+        allowed = []
+        for status, entry_ids in ids_by_status.items():
+            sources = source_statuses(status)
+            current_status = table.c.status.in_(sources)
+            if 'pending' in sources:
+                # Rows written before the column had a default
+                current_status = or_(current_status, table.c.status.is_(None))
+            allowed.append(and_(table.c.id.in_(entry_ids), current_status))
+
+        values = {
+            'status': case({entry_id: transition['status'] for entry_id, (_, transition) in transitions.items()}, value=table.c.id),
+            'updated_at': datetime.utcnow()
+        }
+        for field in TRANSITION_FIELDS:
+            field_values = {
+                entry_id: transition[field] for entry_id, (_, transition) in transitions.items() if field in transition
+            }
+            if field_values:
+                values[field] = case(field_values, value=table.c.id, else_=table.c[field])
+
+        statement = table.update().where(
+            tuple_(table.c.id, table.c.updated_at).in_(
+                [(entry_id, transition['updated_at']) for entry_id, (_, transition) in transitions.items()]
+            ),
+            or_(*allowed)
+        ).values(values).returning(table.c.id, table.c.status, table.c.updated_at)
+        updated = {row.id: row for row in db.session.execute(statement)}
+
+        # One read explains every transition that did not apply
+        current = {}
+        skipped = set(transitions) - set(updated)
+        if skipped:
+            current = {row.id: row for row in db.session.query(
+                AutomationEntry.id, AutomationEntry.status, AutomationEntry.updated_at
+            ).filter(AutomationEntry.id.in_(skipped))}
+        db.session.commit()
+
+        for entry_id, (index, transition) in transitions.items():
+            if entry_id in updated:
+                row = updated[entry_id]
+                results.append({'index': index, 'id': entry_id, 'status': 'updated',
+                                'entry_status': row.status, 'updated_at': row.updated_at})
+            elif entry_id not in current:
+                results.append({'index': index, 'id': entry_id, 'status': 'not_found'})
+            else:
+                row = current[entry_id]
+                results.append({
+                    'index': index,
+                    'id': entry_id,
+                    'status': 'conflict' if row.updated_at != transition['updated_at'] else 'invalid_transition',
+                    'entry_status': row.status,
+                    'updated_at': row.updated_at
+                })
+
+    results.sort(key=lambda result: result['index'])
+    return results, _summarise(results, ('updated', 'conflict', 'invalid_transition', 'not_found', 'invalid'))
@@ -0,0 +1,392 @@
+import base64
+import fcntl
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Default disk budget for all mirrors together
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+# Seconds a single git invocation may run
+GIT_TIMEOUT = 300
+
+# Seconds an incremental fetch may take when the caller waits on it
+FETCH_TIMEOUT = 30
+
+# Marker touched whenever a mirror is used, for least-recently-used eviction
+LAST_USED_FILE = 'last-used'
+
+class GitMirrorBackend:
+    """Keeps a bare mirror per repository and answers diff queries locally.
+
+    Mirrors are cloned from the stored `clone_url` and kept up to date with
+    incremental `git fetch`es, both on a background thread (`schedule_sync`)
+    so webhooks never wait for a clone. The disk quota is enforced by
+    `gc_all` (`flask gc-mirrors`, from cron), which removes the least
+    recently used mirrors; they are simply cloned again the next time they
+    are needed. Any URL git understands works, including local paths and
+    file:// URLs.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, token=None):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.token = token
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._sync_queue = queue.Queue()
+        self._pending_syncs = set()
+        self._sync_worker = None
+        os.makedirs(self.root, exist_ok=True)
+
+    def mirror_path(self, repo_full_name):
+        """Return the directory holding the mirror of a repository"""
+        safe_name = re.sub(r'[^A-Za-z0-9._-]', '_', repo_full_name.replace('/', '__'))
+        return os.path.join(self.root, f"{safe_name}.git")
+
+    def has_mirror(self, repo_full_name):
+        return os.path.isdir(self.mirror_path(repo_full_name))
+
+    def _lock(self, repo_full_name):
+        return self._lock_path(self.mirror_path(repo_full_name))
+
+    @contextmanager
+    def _lock_path(self, path):
+        """Serialise git operations on one mirror across threads and processes"""
+        with self._locks_guard:
+            thread_lock = self._locks.setdefault(path, threading.Lock())
+        with thread_lock:
+            with open(f"{path}.lock", 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield path
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _git_env(self, url=None):
+        env = {**os.environ, 'GIT_TERMINAL_PROMPT': '0'}
+        if self.token and url and url.startswith('https://'):
+            # Pass credentials through the environment so they never show up in argv
+            credentials = base64.b64encode(f"x-access-token:{self.token}".encode('utf-8')).decode('ascii')
+            env.update({
+                'GIT_CONFIG_COUNT': '1',
+                'GIT_CONFIG_KEY_0': 'http.extraHeader',
+                'GIT_CONFIG_VALUE_0': f"Authorization: Basic {credentials}"
+            })
+        return env
+
+    def _git(self, path, *args, url=None, input=None, timeout=GIT_TIMEOUT):
+        result = subprocess.run(
+            ['git', '--git-dir', path, *args],
+            input=input,
+            capture_output=True,
+            env=self._git_env(url),
+            timeout=timeout
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip())
+        return result.stdout.decode('utf-8', 'replace')
+
+    def _touch(self, path):
+        with open(os.path.join(path, LAST_USED_FILE), 'w') as marker:
+            marker.write(str(time.time()))
+
+    def sync(self, repo_full_name, clone_url):
+        """Clone the mirror if it is missing, otherwise fetch new objects.
+
+        Can take up to GIT_TIMEOUT; call it from background work only.
+        """
+        try:
+            with self._lock(repo_full_name) as path:
+                if os.path.isdir(path):
+                    self._git(path, 'fetch', '--prune', '--quiet', 'origin', url=clone_url)
+                else:
+                    result = subprocess.run(
+                        ['git', 'clone', '--mirror', '--quiet', clone_url, path],
+                        capture_output=True,
+                        env=self._git_env(clone_url),
+                        timeout=GIT_TIMEOUT
+                    )
+                    if result.returncode != 0:
+                        shutil.rmtree(path, ignore_errors=True)
+                        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip())
+                self._touch(path)
+        except Exception as e:
+            logger.error(f"Error syncing mirror for {repo_full_name}: {str(e)}")
+            return False
+        return True
+
+    def fetch(self, repo_full_name, clone_url, timeout=FETCH_TIMEOUT):
+        """Fetch new objects into an existing mirror, never cloning.
+
+        For callers about to read from the mirror; returns False when there
+        is no mirror yet or the fetch did not finish in time.
+        """
+        if not self.has_mirror(repo_full_name):
+            return False
+        try:
+            with self._lock(repo_full_name) as path:
+                self._git(path, 'fetch', '--prune', '--quiet', 'origin', url=clone_url, timeout=timeout)
+                self._touch(path)
+            return True
+        except Exception as e:
+            logger.error(f"Error fetching into mirror of {repo_full_name}: {str(e)}")
+            return False
+
+    def schedule_sync(self, repo_full_name, clone_url):
+        """Queue a sync on this process's background thread and return at once.
+
+        A repository already waiting in the queue is not queued twice.
+        """
+        with self._locks_guard:
+            if repo_full_name in self._pending_syncs:
+                return
+            self._pending_syncs.add(repo_full_name)
+            if self._sync_worker is None or not self._sync_worker.is_alive():
+                self._sync_worker = threading.Thread(target=self._run_syncs, name='git-mirror-sync', daemon=True)
+                self._sync_worker.start()
+        self._sync_queue.put((repo_full_name, clone_url))
+
+    def _run_syncs(self):
+        while True:
+            repo_full_name, clone_url = self._sync_queue.get()
+            with self._locks_guard:
+                self._pending_syncs.discard(repo_full_name)
+            try:
+                self.sync(repo_full_name, clone_url)
+            finally:
+                self._sync_queue.task_done()
+
+    def has_commit(self, repo_full_name, commit_sha):
+        """Whether the mirror exists and already contains the commit"""
+        if not self.has_mirror(repo_full_name):
+            return False
+        try:
+            self._git(self.mirror_path(repo_full_name), 'cat-file', '-e', f"{commit_sha}^{{commit}}")
+            return True
+        except Exception:
+            return False
+
+    def _read(self, repo_full_name, *args, input=None):
+        with self._lock(repo_full_name) as path:
+            output = self._git(path, *args, input=input)
+            self._touch(path)
+            return output
+
+    def get_commit_diff(self, repo_full_name, commit_sha):
+        """Get the diff a commit introduces, as the diff media type would"""
+        try:
+            return self._read(
+                repo_full_name, 'diff-tree', '-p', '-M', '--root', '--no-commit-id', '--no-color', commit_sha
+            )
+        except Exception as e:
+            logger.error(f"Error reading diff of {commit_sha} from mirror: {str(e)}")
+            return None
+
+    def get_patch_id(self, repo_full_name, commit_sha):
+        """Get the stable patch-id of a commit, which survives rebases and cherry-picks"""
+        diff = self.get_commit_diff(repo_full_name, commit_sha)
+        if not diff:
+            return None
+        try:
+            output = self._read(repo_full_name, 'patch-id', '--stable', input=diff.encode('utf-8'))
+            return output.split()[0] if output else None
+        except Exception as e:
+            logger.error(f"Error computing patch-id of {commit_sha}: {str(e)}")
+            return None
+
+    def get_changed_files(self, repo_full_name, commit_sha):
+        """List changed files in the shape of the `files` of a GitHub commit"""
+        try:
+            return self._changed_files(repo_full_name, '--root', commit_sha)
+        except Exception as e:
+            logger.error(f"Error listing files of {commit_sha} from mirror: {str(e)}")
+            return None
+
+    def _changed_files(self, repo_full_name, *revisions):
+        name_status = self._read(
+            repo_full_name, 'diff-tree', '-r', '-M', '--no-commit-id', '--name-status', *revisions
+        )
+        numstat = self._read(
+            repo_full_name, 'diff-tree', '-r', '-M', '--no-commit-id', '--numstat', *revisions
+        )
+
+        statuses = {'A': 'added', 'M': 'modified', 'D': 'removed', 'R': 'renamed', 'C': 'copied', 'T': 'changed'}
+        files = []
+        for status_line, stat_line in zip(name_status.splitlines(), numstat.splitlines()):
+            status_fields = status_line.split('\t')
+            additions, deletions = stat_line.split('\t')[:2]
+            file = {
+                'filename': status_fields[-1],
+                'status': statuses.get(status_fields[0][0], 'modified'),
+                # Binary files report '-' for both counts
+                'additions': int(additions) if additions.isdigit() else 0,
+                'deletions': int(deletions) if deletions.isdigit() else 0,
+            }
+            file['changes'] = file['additions'] + file['deletions']
+            if len(status_fields) == 3:
+                file['previous_filename'] = status_fields[1]
+            files.append(file)
+        return files
+
+    def compare(self, repo_full_name, base, head):
+        """Compare two refs like the compare API, or None when the mirror lacks either.
+
+        Returns the commits reachable from `head` but not `base`, oldest
+        first, and the files changed since their merge base, in the shapes
+        GitHubService.compare_commits returns. Nothing is truncated.
+        """
+        if not (self.has_commit(repo_full_name, base) and self.has_commit(repo_full_name, head)):
+            return None
+        try:
+            merge_base = self._read(repo_full_name, 'merge-base', base, head).strip()
+            log = self._read(
+                repo_full_name, 'log', '--reverse', '--format=%H%x00%an%x00%ae%x00%aI%x00%B%x1e', f"{base}..{head}"
+            )
+            files = self._changed_files(repo_full_name, merge_base, head)
+        except Exception as e:
+            logger.error(f"Error comparing {base}...{head} in mirror of {repo_full_name}: {str(e)}")
+            return None
+
+        commits = []
+        for entry in log.split('\x1e'):
+            entry = entry.strip('\n')
+            if not entry:
+                continue
+            sha, name, email, date, message = entry.split('\x00', 4)
+            commits.append({
+                'sha': sha,
+                'commit': {'message': message.rstrip('\n'), 'author': {'name': name, 'email': email, 'date': date}}
+            })
+        return {'commits': commits, 'files': files, 'total_commits': len(commits), 'files_truncated': False}
+
+    def get_history_stats(self, repo_full_name, ref='HEAD', since=None, max_count=None):
+        """Summarise commit history without blame: commits, authors and line churn"""
+        args = ['log', '--no-merges', '--numstat', '--format=%x00%H%x09%ae%x09%at', ref]
+        if since:
+            args.insert(1, f"--since={since}")
+        if max_count:
+            args.insert(1, f"--max-count={max_count}")
+        try:
+            output = self._read(repo_full_name, *args)
+        except Exception as e:
+            logger.error(f"Error reading history of {repo_full_name} from mirror: {str(e)}")
+            return None
+
+        stats = {'commits': 0, 'authors': set(), 'additions': 0, 'deletions': 0, 'files': set()}
+        for entry in output.split('\x00')[1:]:
+            lines = entry.strip().splitlines()
+            if not lines:
+                continue
+            _sha, author_email, _timestamp = lines[0].split('\t')
+            stats['commits'] += 1
+            stats['authors'].add(author_email)
+            for line in lines[1:]:
+                fields = line.split('\t')
+                if len(fields) != 3:
+                    continue
+                if fields[0].isdigit():
+                    stats['additions'] += int(fields[0])
+                if fields[1].isdigit():
+                    stats['deletions'] += int(fields[1])
+                stats['files'].add(fields[2])
+
+        return {
+            'commits': stats['commits'],
+            'authors': len(stats['authors']),
+            'additions': stats['additions'],
+            'deletions': stats['deletions'],
+            'files_touched': len(stats['files'])
+        }
+
+    def gc(self, repo_full_name):
+        """Let git repack the mirror if it decides it is worth it"""
+        try:
+            self._read(repo_full_name, 'gc', '--auto', '--quiet')
+            return True
+        except Exception as e:
+            logger.error(f"Error running gc on mirror of {repo_full_name}: {str(e)}")
+            return False
+
+    def gc_all(self):
+        """Run gc on every mirror and enforce the disk quota"""
+        collected = 0
+        for path in list(self._mirrors()):
+            try:
+                with self._lock_path(path):
+                    self._git(path, 'gc', '--auto', '--quiet')
+                collected += 1
+            except Exception as e:
+                logger.error(f"Error running gc on {os.path.basename(path)}: {str(e)}")
+        return {'collected': collected, 'evicted': self.enforce_quota()}
+
+    def _mirrors(self):
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.name.endswith('.git'):
+                yield entry.path
+
+    @staticmethod
+    def _disk_usage(path):
+        total = 0
+        for directory, _subdirs, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.lstat(os.path.join(directory, filename)).st_size
+                except OSError:
+                    pass
+        return total
+
+    @staticmethod
+    def _last_used(path):
+        try:
+            return os.path.getmtime(os.path.join(path, LAST_USED_FILE))
+        except OSError:
+            return 0.0
+
+    def enforce_quota(self, keep=None):
+        """Remove least recently used mirrors until the total fits the quota"""
+        keep_path = self.mirror_path(keep) if keep else None
+        mirrors = sorted(self._mirrors(), key=self._last_used)
+        sizes = {path: self._disk_usage(path) for path in mirrors}
+        total = sum(sizes.values())
+
+        removed = []
+        for path in mirrors:
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            with self._lock_path(path):
+                shutil.rmtree(path, ignore_errors=True)
+            total -= sizes[path]
+            removed.append(os.path.basename(path))
+
+        if removed:
+            logger.info(f"Evicted {len(removed)} git mirrors to stay within quota")
+        return removed
+
+_mirror_backend = None
+_mirror_lock = threading.Lock()
+
+def get_git_mirror():
+    """Return the shared mirror backend, or None when GIT_MIRROR_ROOT is unset"""
+    global _mirror_backend
+    root = os.environ.get('GIT_MIRROR_ROOT')
+    if not root:
+        return None
+    with _mirror_lock:
+        if _mirror_backend is None:
+            _mirror_backend = GitMirrorBackend(
+                root,
+                max_bytes=int(os.environ.get('GIT_MIRROR_MAX_BYTES', DEFAULT_MAX_BYTES)),
+                token=os.environ.get('GITHUB_TOKEN')
+            )
+        return _mirror_backend
@@ -3,41 +3,280 @@ import json
 import os
 from datetime import datetime
 import logging
+import threading
+from collections import OrderedDict
+from .git_mirror import get_git_mirror
+from .rate_limiter import (
+    get_rate_limiter, MAX_WAIT_SECONDS,
+    PRIORITY_INTERACTIVE, PRIORITY_NORMAL, RESOURCE_CORE, RESOURCE_GRAPHQL
+)
 
 logger = logging.getLogger(__name__)
 
+# GitHub returns at most this many files for a single commit
+MAX_COMMIT_FILES = 300
+
+class CommitCache:
+    """Small thread-safe LRU cache for immutable commit data"""
+    
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_commit_cache = CommitCache()
+_diff_cache = CommitCache(max_entries=128)
+# Head commit per (repository, branch), fed by push webhooks
+_branch_heads = CommitCache(max_entries=2048)
+
+def remember_branch_head(repo_full_name, branch, sha, tree_sha=None):
+    """Record the head of a branch as reported by a push event.
+
+    The entry mirrors the `commit` object of the branches API so it can be
+    used in place of a `get_latest_commit` response.
+    """
+    if not sha or set(sha) == {'0'}:
+        # Deleted branch, forget whatever we knew about it
+        _branch_heads.discard((repo_full_name, branch))
+        return
+    commit = {'sha': sha}
+    if tree_sha:
+        commit['commit'] = {'tree': {'sha': tree_sha}}
+    _branch_heads.set((repo_full_name, branch), commit)
+
+def build_diff_from_files(files):
+    """Build a unified diff from the `files` of a JSON commit response.
+
+    Returns None when any changed file is missing its patch, which GitHub
+    does for binary files and for patches that are too large to inline.
+    """
+    parts = []
+    for file in files:
+        patch = file.get('patch')
+        if patch is None:
+            if file.get('changes', 0):
+                return None
+            continue  # pure renames and empty files carry no hunks
+        
+        filename = file['filename']
+        previous = file.get('previous_filename', filename)
+        old_path = '/dev/null' if file.get('status') == 'added' else f"a/{previous}"
+        new_path = '/dev/null' if file.get('status') == 'removed' else f"b/{filename}"
+        parts.append(
+            f"diff --git a/{previous} b/{filename}\n"
+            f"--- {old_path}\n"
+            f"+++ {new_path}\n"
+            f"{patch}\n"
+        )
+    return ''.join(parts)
+
 class GitHubService:
     def __init__(self, token=None):
         self.token = token or os.environ.get('GITHUB_TOKEN')
-        self.base_url = 'https://api.github.com'
+        # GITHUB_API_URL points the client at GitHub Enterprise or a stand-in server
+        self.base_url = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+        self.graphql_url = os.environ.get('GITHUB_GRAPHQL_URL', f"{self.base_url}/graphql")
         self.headers = {
             'Authorization': f'token {self.token}' if self.token else '',
             'Accept': 'application/vnd.github.v3+json',
             'User-Agent': 'GitHub-Automation-Bot/1.0'
         }
+        self.rate_limiter = get_rate_limiter()
+        self.mirror = get_git_mirror()
     
-    def get_commit_details(self, repo_full_name, commit_sha):
-        """Get detailed information about a specific commit"""
+    def fan_out(self):
+        """Return the asyncio client facade for this token and endpoint.
+
+        Use it for work that sends many independent requests at once; it
+        shares the caches and the rate limiter with this client.
+        """
+        # Imported lazily, the async client subclasses this one
+        from .async_github_service import get_github_facade
+        return get_github_facade(self.token, self.base_url, self.graphql_url)
+    
+    def _request(self, method, url, priority=PRIORITY_NORMAL, resource=RESOURCE_CORE, **kwargs):
+        """Send a request through the shared rate limiter.
+
+        Calls that hit a primary or secondary rate limit are retried once
+        after the back-off GitHub asked for, as long as the priority may wait
+        that long. Raises RateLimitExceeded when the quota is exhausted for
+        longer than that.
+        """
+        kwargs.setdefault('headers', self.headers)
+        for attempt in range(2):
+            self.rate_limiter.acquire(self.token, priority, resource)
+            response = requests.request(method, url, **kwargs)
+            self.rate_limiter.update(self.token, response, resource)
+            
+            retry_after = self.rate_limiter.retry_after(response)
+            if retry_after is None or retry_after > MAX_WAIT_SECONDS[priority] or attempt:
+                return response
+            logger.info(f"Retrying {method} {url} after rate limit")
+        return response
+    
+    def graphql(self, query, variables=None, priority=PRIORITY_NORMAL):
+        """Run a GraphQL query and return its `data`.
+
+        Partial results are returned as long as GitHub sent any data; errors
+        for individual fields (e.g. a deleted repository) are only logged.
+        """
+        response = self._request(
+            'POST', self.graphql_url, priority=priority, resource=RESOURCE_GRAPHQL,
+            json={'query': query, 'variables': variables or {}}
+        )
+        response.raise_for_status()
+        result = response.json()
+        
+        for error in result.get('errors') or []:
+            logger.warning(f"GraphQL error: {error.get('message')}")
+        if result.get('data') is None:
+            raise ValueError('GraphQL query returned no data')
+        return result['data']
+    
+    def get_commit(self, repo_full_name, commit_sha):
+        """Get commit metadata, file stats and patches with a single request.
+
+        Commits are immutable, so results are cached by SHA and later calls
+        for the same commit are served without touching the API.
+        """
+        cache_key = (repo_full_name, commit_sha)
+        cached = _commit_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             url = f"{self.base_url}/repos/{repo_full_name}/commits/{commit_sha}"
-            response = requests.get(url, headers=self.headers)
+            response = self._request('GET', url)
             response.raise_for_status()
-            return response.json()
+            commit = response.json()
         except Exception as e:
-            logger.error(f"Error fetching commit details for {commit_sha}: {str(e)}")
+            logger.error(f"Error fetching commit {commit_sha}: {str(e)}")
             return None
+        
+        _commit_cache.set(cache_key, commit)
+        # Abbreviated SHAs resolve to the same immutable commit
+        if commit.get('sha') and commit['sha'] != commit_sha:
+            _commit_cache.set((repo_full_name, commit['sha']), commit)
+        return commit
+    
+    def get_commit_details(self, repo_full_name, commit_sha):
+        """Get detailed information about a specific commit"""
+        return self.get_commit(repo_full_name, commit_sha)
     
     def get_commit_diff(self, repo_full_name, commit_sha):
-        """Get the diff for a specific commit"""
+        """Get the diff for a specific commit.
+
+        A local git mirror is used when one holds the commit. Otherwise the
+        diff is assembled from the per-file patches of the JSON commit; the
+        diff media type is only requested when GitHub left patches out
+        (large or binary files) or truncated the file list.
+        """
+        if self.mirror and self.mirror.has_commit(repo_full_name, commit_sha):
+            diff = self.mirror.get_commit_diff(repo_full_name, commit_sha)
+            if diff is not None:
+                return diff
+        
+        commit = self.get_commit(repo_full_name, commit_sha)
+        if commit is None:
+            return None
+        
+        diff = build_diff_from_files(commit.get('files', []))
+        if diff is not None and len(commit.get('files', [])) < MAX_COMMIT_FILES:
+            return diff
+        
+        cache_key = (repo_full_name, commit.get('sha', commit_sha))
+        cached = _diff_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             url = f"{self.base_url}/repos/{repo_full_name}/commits/{commit_sha}"
             headers = {**self.headers, 'Accept': 'application/vnd.github.v3.diff'}
-            response = requests.get(url, headers=headers)
+            response = self._request('GET', url, headers=headers)
             response.raise_for_status()
-            return response.text
         except Exception as e:
             logger.error(f"Error fetching commit diff for {commit_sha}: {str(e)}")
             return None
+        
+        _diff_cache.set(cache_key, response.text)
+        return response.text
+    
+    def compare_commits(self, repo_full_name, base, head, per_page=100):
+        """Get every commit and the changed files between two refs.
+
+        A local git mirror holding both refs answers without any API call
+        and without the 300 file cap. Otherwise the compare API paginates
+        commits, while the changed files (at most 300) only come with the
+        first page. Returns a dict with `commits`, `files`, `total_commits`
+        and `files_truncated`, or None on error.
+        """
+        if self.mirror:
+            comparison = self.mirror.compare(repo_full_name, base, head)
+            if comparison is not None:
+                return comparison
+        
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/compare/{base}...{head}"
+            commits = []
+            files = None
+            total_commits = 0
+            page = 1
+            while True:
+                response = self._request('GET', url, params={'per_page': per_page, 'page': page})
+                response.raise_for_status()
+                comparison = response.json()
+                
+                if files is None:
+                    files = comparison.get('files', [])
+                    total_commits = comparison.get('total_commits', 0)
+                
+                page_commits = comparison.get('commits', [])
+                commits.extend(page_commits)
+                if len(page_commits) < per_page or len(commits) >= total_commits:
+                    break
+                page += 1
+            
+            return {
+                'commits': commits,
+                'files': files,
+                'total_commits': total_commits,
+                'files_truncated': len(files) >= MAX_COMMIT_FILES
+            }
+        except Exception as e:
+            logger.error(f"Error comparing {base}...{head} in {repo_full_name}: {str(e)}")
+            return None
+    
+    def get_commit_files(self, repo_full_name, commit_sha):
+        """Get the changed files of a commit, from the local mirror when possible"""
+        if self.mirror and self.mirror.has_commit(repo_full_name, commit_sha):
+            files = self.mirror.get_changed_files(repo_full_name, commit_sha)
+            if files is not None:
+                return files
+        
+        commit = self.get_commit(repo_full_name, commit_sha)
+        return commit.get('files', []) if commit else None
     
     def create_branch(self, repo_full_name, branch_name, base_sha):
         """Create a new branch from a base commit"""
@@ -47,7 +286,7 @@ class GitHubService:
                 'ref': f'refs/heads/{branch_name}',
                 'sha': base_sha
             }
-            response = requests.post(url, headers=self.headers, json=data)
+            response = self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -61,7 +300,7 @@ class GitHubService:
             
             # Check if file exists
             try:
-                existing_response = requests.get(url, headers=self.headers, params={'ref': branch})
+                existing_response = self._request('GET', url, priority=PRIORITY_INTERACTIVE, params={'ref': branch})
                 existing_file = existing_response.json() if existing_response.status_code == 200 else None
             except:
                 existing_file = None
@@ -75,13 +314,118 @@ class GitHubService:
             if existing_file and 'sha' in existing_file:
                 data['sha'] = existing_file['sha']
             
-            response = requests.put(url, headers=self.headers, json=data)
+            response = self._request('PUT', url, priority=PRIORITY_INTERACTIVE, json=data)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Error creating/updating file {file_path}: {str(e)}")
             return None
     
+    def create_blob(self, repo_full_name, content):
+        """Create a Git blob from base64 encoded content"""
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/blobs"
+            data = {
+                'content': content,
+                'encoding': 'base64'
+            }
+            response = self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error creating blob in {repo_full_name}: {str(e)}")
+            return None
+    
+    def create_blobs(self, repo_full_name, contents):
+        """Create several blobs concurrently, returning them in input order"""
+        if not contents:
+            return []
+        return self.fan_out().create_blobs(repo_full_name, contents)
+    
+    def create_tree(self, repo_full_name, base_tree_sha, entries):
+        """Create a tree on top of a base tree.
+
+        `entries` is a list of (path, blob_sha) tuples for regular files.
+        """
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/trees"
+            data = {
+                'base_tree': base_tree_sha,
+                'tree': [
+                    {'path': path, 'mode': '100644', 'type': 'blob', 'sha': blob_sha}
+                    for path, blob_sha in entries
+                ]
+            }
+            response = self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error creating tree in {repo_full_name}: {str(e)}")
+            return None
+    
+    def create_git_commit(self, repo_full_name, message, tree_sha, parent_sha):
+        """Create a commit object pointing at a tree"""
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/commits"
+            data = {
+                'message': message,
+                'tree': tree_sha,
+                'parents': [parent_sha]
+            }
+            response = self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error creating commit in {repo_full_name}: {str(e)}")
+            return None
+    
+    def get_tree_sha(self, repo_full_name, commit):
+        """Return the tree SHA of a commit, fetching the commit only if needed"""
+        tree_sha = commit.get('commit', {}).get('tree', {}).get('sha')
+        if tree_sha:
+            return tree_sha
+        try:
+            url = f"{self.base_url}/repos/{repo_full_name}/git/commits/{commit['sha']}"
+            response = self._request('GET', url, priority=PRIORITY_INTERACTIVE)
+            response.raise_for_status()
+            return response.json()['tree']['sha']
+        except Exception as e:
+            logger.error(f"Error getting tree for {commit['sha']}: {str(e)}")
+            return None
+    
+    def commit_files_to_branch(self, repo_full_name, branch_name, base_commit, files, message):
+        """Create a new branch holding all `files` in a single commit.
+
+        `files` maps paths to base64 encoded content. Blobs are created in
+        parallel, followed by one tree, one commit and the branch ref, so the
+        request count does not grow with the number of files apart from the
+        blobs themselves. The branch is only created once the commit exists.
+        """
+        base_tree_sha = self.get_tree_sha(repo_full_name, base_commit)
+        if not base_tree_sha:
+            return None
+        
+        paths = list(files)
+        blobs = self.create_blobs(repo_full_name, [files[path] for path in paths])
+        if not blobs or any(blob is None for blob in blobs):
+            return None
+        
+        tree = self.create_tree(
+            repo_full_name,
+            base_tree_sha,
+            [(path, blob['sha']) for path, blob in zip(paths, blobs)]
+        )
+        if not tree:
+            return None
+        
+        commit = self.create_git_commit(repo_full_name, message, tree['sha'], base_commit['sha'])
+        if not commit:
+            return None
+        
+        if not self.create_branch(repo_full_name, branch_name, commit['sha']):
+            return None
+        return commit
+    
     def create_pull_request(self, repo_full_name, title, body, head_branch, base_branch='main'):
         """Create a pull request"""
         try:
@@ -92,7 +436,7 @@ class GitHubService:
                 'head': head_branch,
                 'base': base_branch
             }
-            response = requests.post(url, headers=self.headers, json=data)
+            response = self._request('POST', url, priority=PRIORITY_INTERACTIVE, json=data)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -110,43 +454,41 @@ class GitHubService:
             timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
             branch_name = f"auto-improvement-{commit_analysis.commit_sha[:8]}-{timestamp}"
             
-            # Get the latest commit SHA for the default branch
-            default_branch = 'main'  # You might want to get this from repository data
-            latest_commit = self.get_latest_commit(repository.full_name, default_branch)
-            if not latest_commit:
-                return {'success': False, 'error': 'Could not get latest commit'}
-            
-            # Create new branch
-            branch_result = self.create_branch(repository.full_name, branch_name, latest_commit['sha'])
-            if not branch_result:
-                return {'success': False, 'error': 'Could not create branch'}
-            
             # Generate improvement files
+            files = {}
             improvements_implemented = []
             for i, suggestion in enumerate(suggestions[:3]):  # Limit to 3 suggestions
                 if suggestion.get('type') == 'code_improvement':
                     file_path = f"improvements/suggestion_{i+1}_{timestamp}.md"
-                    content = self.generate_improvement_content(suggestion, commit_analysis)
-                    
-                    # Create the improvement file
-                    file_result = self.create_file(
-                        repository.full_name,
-                        file_path,
-                        content,
-                        f"Add improvement suggestion: {suggestion.get('title', 'Code improvement')}",
-                        branch_name
-                    )
-                    
-                    if file_result:
-                        improvements_implemented.append({
-                            'file': file_path,
-                            'title': suggestion.get('title', 'Code improvement'),
-                            'description': suggestion.get('description', '')
-                        })
+                    files[file_path] = self.generate_improvement_content(suggestion, commit_analysis)
+                    improvements_implemented.append({
+                        'file': file_path,
+                        'title': suggestion.get('title', 'Code improvement'),
+                        'description': suggestion.get('description', '')
+                    })
             
             if not improvements_implemented:
                 return {'success': False, 'error': 'No improvements could be implemented'}
             
+            # Get the latest commit SHA for the default branch
+            default_branch = self.get_default_branch(repository)
+            if not default_branch:
+                return {'success': False, 'error': 'Could not resolve default branch'}
+            latest_commit = self.get_latest_commit(repository.full_name, default_branch)
+            if not latest_commit:
+                return {'success': False, 'error': 'Could not get latest commit'}
+            
+            # Create the branch with every improvement file in a single commit
+            commit_result = self.commit_files_to_branch(
+                repository.full_name,
+                branch_name,
+                latest_commit,
+                files,
+                f"Add {len(files)} improvement suggestion(s) for commit {commit_analysis.commit_sha[:8]}"
+            )
+            if not commit_result:
+                return {'success': False, 'error': 'Could not create branch'}
+            
             # Create PR
             pr_title = f"🤖 Auto-generated improvements for commit {commit_analysis.commit_sha[:8]}"
             pr_body = self.generate_pr_description(commit_analysis, improvements_implemented, analysis_result)
@@ -175,11 +517,33 @@ class GitHubService:
             logger.error(f"Error creating improvement PR: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def get_default_branch(self, repository):
+        """Resolve the default branch of a repository.
+
+        The branch stored from webhook payloads is used as is; only
+        repositories registered without one cost a request, and the answer
+        is kept on the record for next time.
+        """
+        if repository.default_branch:
+            return repository.default_branch
+        try:
+            url = f"{self.base_url}/repos/{repository.full_name}"
+            response = self._request('GET', url, priority=PRIORITY_INTERACTIVE)
+            response.raise_for_status()
+            repository.default_branch = response.json()['default_branch']
+            return repository.default_branch
+        except Exception as e:
+            logger.error(f"Error resolving default branch for {repository.full_name}: {str(e)}")
+            return None
+    
     def get_latest_commit(self, repo_full_name, branch):
         """Get the latest commit SHA for a branch"""
+        cached = _branch_heads.get((repo_full_name, branch))
+        if cached is not None:
+            return cached
         try:
             url = f"{self.base_url}/repos/{repo_full_name}/branches/{branch}"
-            response = requests.get(url, headers=self.headers)
+            response = self._request('GET', url, priority=PRIORITY_INTERACTIVE)
             response.raise_for_status()
             return response.json()['commit']
         except Exception as e:
@@ -0,0 +1,334 @@
+import base64
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session
+from ..models.repository import db
+from ..models.webhook import WebhookEvent, CommitAnalysis, ActionLog
+from ..models import json_codec
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Session.info keys holding the rows the current transaction announces,
+# and their events once serialised at commit
+PENDING_ROWS_KEY = 'live_feed_rows'
+PENDING_EVENTS_KEY = 'live_feed_events'
+
+# Redis channel the feed events of every process are published on
+FEED_CHANNEL = 'live-feed'
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+
+# Events buffered per stream; a client that falls further behind is dropped
+# and resumes from its Last-Event-ID on reconnect
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Rows replayed per event type on reconnect before asking for a full reload
+BACKFILL_LIMIT = 200
+
+# How far behind the cursor a reconnect scans again. committed_at is stamped
+# just before COMMIT, so a transaction stamped earlier can become visible
+# after a later stamp was delivered; clock skew between hosts adds to that.
+# Rows in the window are sent again and clients replace them by id.
+RESCAN_WINDOW = timedelta(seconds=30)
+
+# Event types, in the order their cursor positions are encoded. Positions
+# are (committed_at, id) of a row, in microseconds since the epoch; a 'pr'
+# position is that of the 'pr_generated' action log recording the PR.
+EVENT_TYPES = ('webhook', 'analysis', 'pr', 'log')
+
+EPOCH = datetime(1970, 1, 1)
+START_POSITION = (0, 0)
+
+class InvalidFeedCursor(ValueError):
+    """Raised for Last-Event-ID values that were not produced by `encode_feed_cursor`"""
+
+def feed_position(committed_at, row_id):
+    """Commit-ordered position of a row, as plain integers"""
+    return ((committed_at - EPOCH) // timedelta(microseconds=1), row_id)
+
+def position_time(position):
+    return EPOCH + timedelta(microseconds=position[0])
+
+def encode_feed_cursor(cursor):
+    """Opaque event id holding the last position seen for every event type"""
+    value = '.'.join('{}:{}'.format(*cursor[event_type]) for event_type in EVENT_TYPES)
+    return base64.urlsafe_b64encode(value.encode('ascii')).decode('ascii').rstrip('=')
+
+def decode_feed_cursor(value):
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        positions = base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii').split('.')
+        if len(positions) != len(EVENT_TYPES):
+            raise ValueError(value)
+        cursor = {}
+        for event_type, position in zip(EVENT_TYPES, positions):
+            committed, row_id = position.split(':')
+            cursor[event_type] = (int(committed), int(row_id))
+        return cursor
+    except Exception:
+        raise InvalidFeedCursor('Invalid Last-Event-ID')
+
+def format_sse(event_type, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json_codec.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+def build_feed_event(event_type, position, instance):
+    return {'type': event_type, 'position': position, 'data': instance.to_dict(instance.SUMMARY_FIELDS)}
+
+class Subscription:
+    """Events queued for one connected stream"""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+class LiveFeedBroker:
+    """Fans committed feed events out to the streams connected to this process"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, events):
+        self.deliver(events)
+
+    def deliver(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                for feed_event in events:
+                    subscription.queue.put_nowait(feed_event)
+            except queue.Full:
+                # Never block the publisher on a slow client
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+class RedisLiveFeedBroker(LiveFeedBroker):
+    """Broker shared by all processes through Redis pub/sub.
+
+    Each process keeps a single subscription to the channel, on a
+    background thread, and delivers what it receives to its own streams,
+    so Redis sees one connection per process however many clients are
+    connected.
+    """
+
+    def __init__(self, url, channel=FEED_CHANNEL):
+        if redis is None:
+            raise RuntimeError('LIVE_FEED_BACKEND=redis requires the redis package')
+        super().__init__()
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._listener = None
+
+    def subscribe(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='live-feed-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe()
+
+    def publish(self, events):
+        self.client.publish(self.channel, json_codec.dumps_bytes(events))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.deliver(json_codec.loads(message['data']))
+            except Exception as e:
+                logger.error(f"Live feed listener disconnected: {str(e)}")
+                time.sleep(1)
+
+_live_feed = None
+_live_feed_lock = threading.Lock()
+
+def get_live_feed():
+    """Return the process-wide broker chosen by LIVE_FEED_BACKEND (memory or redis)"""
+    global _live_feed
+    with _live_feed_lock:
+        if _live_feed is None:
+            if os.environ.get('LIVE_FEED_BACKEND', 'memory') == 'redis':
+                _live_feed = RedisLiveFeedBroker(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+            else:
+                _live_feed = LiveFeedBroker()
+        return _live_feed
+
+def latest_position(query, model):
+    """Position of the last committed row of a query over a feed table"""
+    row = query.with_entities(model.committed_at, model.id)\
+        .filter(model.committed_at.isnot(None))\
+        .order_by(model.committed_at.desc(), model.id.desc()).first()
+    return feed_position(*row) if row else START_POSITION
+
+def current_feed_cursor():
+    """Cursor positioned after the last committed row of every event type"""
+    log_position = latest_position(ActionLog.query, ActionLog)
+    return {
+        'webhook': latest_position(WebhookEvent.query, WebhookEvent),
+        'analysis': latest_position(CommitAnalysis.query, CommitAnalysis),
+        'pr': log_position,
+        'log': log_position,
+    }
+
+def rescan_after(position):
+    """committed_at bound a reconnect scans from, RESCAN_WINDOW before the cursor"""
+    if position == START_POSITION:
+        return EPOCH
+    return position_time(position) - RESCAN_WINDOW
+
+def backfill_events(cursor):
+    """Events committed after `cursor`, in commit order, or None when too many were missed.
+
+    Rows are read by committed_at rather than id: ids are assigned at
+    insert, so a transaction can commit a lower id after a higher one was
+    already delivered. The RESCAN_WINDOW before the cursor is read again,
+    so rows may repeat events the client has already seen.
+    """
+    events = []
+    for event_type, model in (('webhook', WebhookEvent), ('analysis', CommitAnalysis), ('log', ActionLog)):
+        rows = model.query.options(model.load_fields(model.SUMMARY_FIELDS + ('committed_at',)))\
+            .filter(model.committed_at > rescan_after(cursor[event_type]))\
+            .order_by(model.committed_at, model.id).limit(BACKFILL_LIMIT + 1).all()
+        if len(rows) > BACKFILL_LIMIT:
+            return None
+        events.extend(build_feed_event(event_type, feed_position(row.committed_at, row.id), row) for row in rows)
+
+    rows = db.session.query(ActionLog.committed_at, ActionLog.id, CommitAnalysis)\
+        .join(CommitAnalysis, CommitAnalysis.id == ActionLog.commit_analysis_id)\
+        .options(CommitAnalysis.load_fields(CommitAnalysis.SUMMARY_FIELDS))\
+        .filter(ActionLog.action_type == 'pr_generated', ActionLog.committed_at > rescan_after(cursor['pr']))\
+        .order_by(ActionLog.committed_at, ActionLog.id).limit(BACKFILL_LIMIT + 1).all()
+    if len(rows) > BACKFILL_LIMIT:
+        return None
+    events.extend(build_feed_event('pr', feed_position(committed_at, log_id), analysis) for committed_at, log_id, analysis in rows)
+    return events
+
+def open_live_stream(last_event_id=None):
+    """Subscribe to the feed and return the Server-Sent Events generator.
+
+    The subscription is taken before the backfill query, so nothing
+    committed in between is lost, and live events already replayed are
+    skipped. Other live events are never filtered against the cursor, as
+    they may arrive out of commit order; clients replace rows they already
+    show by id. All database work happens here, so the generator holds no
+    connection while the stream stays open.
+    """
+    cursor = decode_feed_cursor(last_event_id) if last_event_id else None
+    broker = get_live_feed()
+    subscription = broker.subscribe()
+    try:
+        backlog = backfill_events(cursor) if cursor else None
+        if backlog is None:
+            reset = cursor is not None
+            cursor = current_feed_cursor()
+            backlog = []
+        else:
+            reset = False
+    except Exception:
+        broker.unsubscribe(subscription)
+        raise
+    replayed = {(feed_event['type'], tuple(feed_event['position'])) for feed_event in backlog}
+
+    def send(feed_event):
+        # Positions arrive as lists from the Redis broker
+        event_type, position = feed_event['type'], tuple(feed_event['position'])
+        cursor[event_type] = max(cursor[event_type], position)
+        return format_sse(event_type, feed_event['data'], encode_feed_cursor(cursor))
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            # 'reset' tells a resuming client it missed too much and must reload
+            yield format_sse('reset' if reset else 'ready', {}, encode_feed_cursor(cursor))
+            for feed_event in backlog:
+                yield send(feed_event)
+            while not subscription.overflowed:
+                try:
+                    feed_event = subscription.queue.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if (feed_event['type'], tuple(feed_event['position'])) in replayed:
+                    continue
+                yield send(feed_event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return stream()
+
+@event.listens_for(Session, 'after_flush')
+def collect_feed_rows(session, flush_context):
+    """Remember the rows the feed announces, now that they have ids"""
+    new_rows = [instance for instance in session.new if isinstance(instance, (WebhookEvent, CommitAnalysis, ActionLog))]
+    if new_rows:
+        session.info.setdefault(PENDING_ROWS_KEY, []).extend(
+            sorted(new_rows, key=lambda row: (row.__tablename__, row.id))
+        )
+
+@event.listens_for(Session, 'before_commit')
+def serialise_feed_events(session):
+    """Serialise the announced rows with their final values.
+
+    Rows are often updated after the flush that inserted them, such as an
+    analysis getting its scores once OpenAI answers, and after commit they
+    are expired, so this is the last point where they are current and loaded.
+    """
+    # before_commit runs ahead of the commit's own flush
+    session.flush()
+    rows = session.info.pop(PENDING_ROWS_KEY, None)
+    if not rows:
+        return
+    events = session.info.setdefault(PENDING_EVENTS_KEY, [])
+    for instance in rows:
+        # committed_at was stamped by stamp_committed_at, which runs first
+        position = feed_position(instance.committed_at, instance.id)
+        if isinstance(instance, WebhookEvent):
+            events.append(build_feed_event('webhook', position, instance))
+        elif isinstance(instance, CommitAnalysis):
+            events.append(build_feed_event('analysis', position, instance))
+        else:
+            events.append(build_feed_event('log', position, instance))
+            if instance.action_type == 'pr_generated' and instance.commit_analysis_id:
+                analysis = session.get(CommitAnalysis, instance.commit_analysis_id)
+                if analysis is not None:
+                    events.append(build_feed_event('pr', position, analysis))
+
+@event.listens_for(Session, 'after_commit')
+def publish_after_commit(session):
+    events = session.info.pop(PENDING_EVENTS_KEY, None)
+    if events:
+        try:
+            get_live_feed().publish(events)
+        except Exception as e:
+            logger.error(f"Error publishing live feed events: {str(e)}")
+
+@event.listens_for(Session, 'after_rollback')
+def discard_events_after_rollback(session):
+    session.info.pop(PENDING_ROWS_KEY, None)
+    session.info.pop(PENDING_EVENTS_KEY, None)
@@ -0,0 +1,135 @@
+import logging
+from sqlalchemy import update
+from ..models.repository import db, Repository
+from .github_service import GitHubService
+from .rate_limiter import PRIORITY_BACKGROUND, RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# Repositories looked up per GraphQL query
+DEFAULT_BATCH_SIZE = 50
+
+# GraphQL queries in flight at once; GitHub discourages heavy concurrency
+# against the GraphQL API, so keep this small
+METADATA_CONCURRENCY = 4
+
+REPOSITORY_FIELDS = """
+fragment RepositoryMetadata on Repository {
+  stargazerCount
+  forkCount
+  openIssues: issues(states: OPEN) { totalCount }
+  openPullRequests: pullRequests(states: OPEN) { totalCount }
+  pullRequests { totalCount }
+  mentionableUsers { totalCount }
+  defaultBranchRef { name }
+}
+"""
+
+def build_metadata_query(full_names):
+    """Build one aliased GraphQL query covering every repository in the batch"""
+    variables = {}
+    declarations = []
+    selections = []
+    for i, full_name in enumerate(full_names):
+        owner, name = full_name.split('/', 1)
+        variables[f'owner{i}'] = owner
+        variables[f'name{i}'] = name
+        declarations.append(f'$owner{i}: String!, $name{i}: String!')
+        selections.append(f'  r{i}: repository(owner: $owner{i}, name: $name{i}) {{ ...RepositoryMetadata }}')
+
+    query = (
+        f"query({', '.join(declarations)}) {{\n"
+        + '\n'.join(selections)
+        + '\n}\n'
+        + REPOSITORY_FIELDS
+    )
+    return query, variables
+
+def metadata_from_graphql(node):
+    """Map a GraphQL repository node onto Repository column values"""
+    values = {
+        'stars': node['stargazerCount'],
+        'forks': node['forkCount'],
+        # Match the REST `open_issues_count`, which includes open PRs
+        'open_issues': node['openIssues']['totalCount'] + node['openPullRequests']['totalCount'],
+        'pr_count': node['pullRequests']['totalCount'],
+        # Approximation: GraphQL has no contributor count. Mentionable users
+        # (everyone who can be @mentioned in the repository) can differ from
+        # the commit authors the REST contributors endpoint lists
+        'contributor_count': node['mentionableUsers']['totalCount'],
+    }
+    if node.get('defaultBranchRef'):
+        values['default_branch'] = node['defaultBranchRef']['name']
+    return values
+
+def sync_repository_metadata(github_service=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Refresh metadata of all tracked repositories through batched GraphQL.
+
+    Only rows whose values changed are written, with one bulk UPDATE per
+    batch. `contributor_count` is approximated by the mentionable users
+    count, see `metadata_from_graphql`. Up to METADATA_CONCURRENCY batches
+    are fetched at once through the asyncio client and written in order.
+    When the GraphQL quota runs out the run stops, leaving the rest for the
+    next one rather than spending quota kept for other callers.
+    Returns a summary of how many repositories were checked, updated, could
+    not be found and were deferred.
+    """
+    github_service = github_service or GitHubService()
+    columns = ['stars', 'forks', 'open_issues', 'pr_count', 'contributor_count', 'default_branch']
+    rows = db.session.query(
+        Repository.id, Repository.full_name, *(getattr(Repository, column) for column in columns)
+    ).order_by(Repository.id).all()
+
+    batches = []
+    for start in range(0, len(rows), batch_size):
+        batch = [row for row in rows[start:start + batch_size] if '/' in row.full_name]
+        if batch:
+            batches.append((start, batch))
+
+    summary = {'checked': 0, 'updated': 0, 'missing': 0, 'deferred': 0, 'failed_batches': 0}
+    client = github_service.fan_out()
+    for wave_start in range(0, len(batches), METADATA_CONCURRENCY):
+        wave = batches[wave_start:wave_start + METADATA_CONCURRENCY]
+        results = client.graphql_many(
+            [build_metadata_query([row.full_name for row in batch]) for _, batch in wave],
+            priority=PRIORITY_BACKGROUND
+        )
+
+        stopped = False
+        for (start, batch), data in zip(wave, results):
+            if isinstance(data, RateLimitExceeded):
+                logger.warning(f"Stopping metadata sync: {str(data)}")
+                summary['deferred'] = len(rows) - start
+                stopped = True
+                break
+            if isinstance(data, Exception):
+                logger.error(f"Error syncing metadata batch starting at {batch[0].full_name}: {str(data)}")
+                summary['failed_batches'] += 1
+                continue
+
+            changes = []
+            for i, row in enumerate(batch):
+                summary['checked'] += 1
+                node = data.get(f'r{i}')
+                if node is None:
+                    summary['missing'] += 1
+                    continue
+
+                values = metadata_from_graphql(node)
+                changed = {column: value for column, value in values.items() if getattr(row, column) != value}
+                if changed:
+                    changes.append({'id': row.id, **changed})
+
+            if changes:
+                # Bulk UPDATE by primary key, only for the rows that changed
+                db.session.execute(update(Repository), changes)
+                db.session.commit()
+                summary['updated'] += len(changes)
+        if stopped:
+            break
+
+    logger.info(
+        f"Metadata sync checked {summary['checked']} repositories, "
+        f"updated {summary['updated']}, missing {summary['missing']}, deferred {summary['deferred']}"
+    )
+    return summary
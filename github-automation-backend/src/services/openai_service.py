@@ -6,6 +6,9 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Diff text included in a commit prompt, the rest is cut off
+MAX_PROMPT_DIFF_CHARS = 12000
+
 class OpenAIService:
     def __init__(self, api_key=None):
         self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
@@ -27,7 +30,8 @@ class OpenAIService:
                 'added_files': commit_data.get('added', []),
                 'modified_files': commit_data.get('modified', []),
                 'removed_files': commit_data.get('removed', []),
-                'url': commit_data.get('url', '')
+                'url': commit_data.get('url', ''),
+                'diff': commit_data.get('diff')
             }
             
             # Create analysis prompt
@@ -63,6 +67,13 @@ class OpenAIService:
     
     def create_commit_analysis_prompt(self, commit_info, repository):
         """Create a detailed prompt for commit analysis"""
+        diff_section = ''
+        if commit_info.get('diff'):
+            diff = commit_info['diff']
+            if len(diff) > MAX_PROMPT_DIFF_CHARS:
+                diff = diff[:MAX_PROMPT_DIFF_CHARS] + '\n... (diff truncated)'
+            diff_section = f"\n### Diff:\n```diff\n{diff}\n```\n"
+        
         prompt = f"""Analyze this Git commit and provide detailed feedback and improvement suggestions.
 
 ## Repository Context
@@ -91,7 +102,7 @@ class OpenAIService:
 
 ### Files Removed:
 {chr(10).join(f"- {file}" for file in commit_info['removed_files'][:10])}
-
+{diff_section}
 ## Analysis Requirements
 
 Please provide a comprehensive analysis in JSON format with the following structure:
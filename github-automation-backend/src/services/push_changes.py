@@ -0,0 +1,70 @@
+from datetime import datetime
+from .github_service import GitHubService
+
+# Pushes with at least this many commits are analyzed as a whole
+LARGE_PUSH_COMMITS = 10
+
+def is_large_push(payload):
+    """Whether a push is too big to analyze commit by commit"""
+    commits = payload.get('commits', [])
+    if payload.get('size', len(commits)) > len(commits):
+        # GitHub truncated the commit list
+        return True
+    return len(commits) >= LARGE_PUSH_COMMITS
+
+def fetch_push_changes(repository, payload):
+    """Fetch the full set of changes of a push through the compare API"""
+    before = payload.get('before') or ''
+    after = payload.get('after')
+    if not after or set(after) == {'0'}:
+        return None  # branch deletion
+    if not before or set(before) == {'0'}:
+        # New branch, compare against where it forked from the default branch
+        before = payload.get('base_ref') or repository.default_branch
+        if not before:
+            return None
+    
+    github_service = GitHubService()
+    return github_service.compare_commits(repository.full_name, before, after)
+
+def build_push_commit_data(payload, push_changes):
+    """Describe a whole push in the shape of a single push payload commit"""
+    head_commit = payload.get('head_commit') or {}
+    pusher = payload.get('pusher') or {}
+    author = head_commit.get('author') or {
+        'name': pusher.get('name', 'unknown'),
+        'email': pusher.get('email') or 'unknown'
+    }
+    
+    files = {'added': [], 'modified': [], 'removed': []}
+    for file in push_changes['files']:
+        status = file.get('status')
+        if status == 'added':
+            files['added'].append(file['filename'])
+        elif status == 'removed':
+            files['removed'].append(file['filename'])
+        else:
+            files['modified'].append(file['filename'])
+    
+    commit_count = push_changes['total_commits']
+    headlines = [
+        commit['commit']['message'].split('\n', 1)[0]
+        for commit in push_changes['commits'][-20:]
+    ]
+    message = f"Push of {commit_count} commits to {payload.get('ref', '')}\n\n" + '\n'.join(
+        f"- {headline}" for headline in headlines
+    )
+    
+    return {
+        'id': payload['after'],
+        'message': message,
+        'timestamp': head_commit.get('timestamp', datetime.utcnow().isoformat()),
+        'url': payload.get('compare', head_commit.get('url', '')),
+        'author': author,
+        'added': files['added'],
+        'modified': files['modified'],
+        'removed': files['removed'],
+        'push_level': True,
+        'commit_count': commit_count,
+        'files_truncated': push_changes['files_truncated']
+    }
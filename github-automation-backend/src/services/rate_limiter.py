@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Request priorities, lower values are served first
+PRIORITY_INTERACTIVE = 0  # PR creation and anything a user is waiting on
+PRIORITY_NORMAL = 1       # webhook processing, diff fetching
+PRIORITY_BACKGROUND = 2   # metadata sync and other bulk jobs
+
+# Fraction of the hourly quota that lower priorities leave untouched
+RESERVED_FRACTION = {
+    PRIORITY_INTERACTIVE: 0.0,
+    PRIORITY_NORMAL: 0.05,
+    PRIORITY_BACKGROUND: 0.25,
+}
+
+# Longest a call of each priority waits for quota before RateLimitExceeded.
+# Interactive and normal calls run on request threads and give up quickly;
+# background jobs run from the CLI and can afford to wait longer.
+MAX_WAIT_SECONDS = {
+    PRIORITY_INTERACTIVE: 10,
+    PRIORITY_NORMAL: 15,
+    PRIORITY_BACKGROUND: 300,
+}
+
+# GitHub keeps a separate quota per resource (`X-RateLimit-Resource`)
+RESOURCE_CORE = 'core'
+RESOURCE_GRAPHQL = 'graphql'
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when a call cannot be sent without eating into quota it may not use"""
+
+    def __init__(self, resource, retry_at):
+        super().__init__(f"GitHub {resource} rate limit exhausted until {retry_at:.0f}")
+        self.resource = resource
+        self.retry_at = retry_at
+
+class TokenQuota:
+    """Rate limit state GitHub reported for one token and resource"""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+        self.waiting = {priority: 0 for priority in RESERVED_FRACTION}
+
+class GitHubRateLimiter:
+    """Schedules GitHub API calls against the quota of each token.
+
+    Quota is learned from the `X-RateLimit-*` headers of every response, per
+    token and resource (core REST, GraphQL, ...), and `Retry-After` is
+    honoured for secondary rate limits. Lower priority calls are delayed
+    until the reset once the remaining quota drops into the share reserved
+    for higher priorities, and they yield while higher priority calls for the
+    same quota are waiting. A call that would wait longer than its priority
+    allows raises RateLimitExceeded instead of being sent.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._quotas = {}
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def _token_key(token):
+        # Never keep raw tokens around as dictionary keys
+        return hashlib.sha256((token or '').encode('utf-8')).hexdigest()[:16]
+
+    def _quota(self, token, resource):
+        key = (self._token_key(token), resource)
+        if key not in self._quotas:
+            self._quotas[key] = TokenQuota()
+        return self._quotas[key]
+
+    def delay_for(self, token, priority=PRIORITY_NORMAL, resource=RESOURCE_CORE):
+        """Return how many seconds a call should wait before it is sent"""
+        with self._condition:
+            return self._delay_locked(self._quota(token, resource), priority)
+
+    def _delay_locked(self, quota, priority):
+        now = self.clock()
+        if quota.blocked_until > now:
+            return quota.blocked_until - now
+
+        if quota.remaining is None or quota.limit is None:
+            return 0.0
+
+        if quota.reset_at <= now:
+            # The window rolled over, the next response will tell us the new quota
+            return 0.0
+
+        reserved = int(quota.limit * RESERVED_FRACTION.get(priority, 0.0))
+        if quota.remaining <= reserved:
+            return quota.reset_at - now
+
+        if any(count for waiting_priority, count in quota.waiting.items() if waiting_priority < priority):
+            # Let the more urgent callers go first
+            return 0.05
+
+        return 0.0
+
+    def acquire(self, token, priority=PRIORITY_NORMAL, resource=RESOURCE_CORE, timeout=None):
+        """Block until a call with the given priority may be sent.
+
+        Waits at most `timeout` seconds (default: MAX_WAIT_SECONDS for the
+        priority). When the quota will not free up in time, raises
+        RateLimitExceeded right away without consuming anything, so the
+        caller can fail or retry later.
+        """
+        if timeout is None:
+            timeout = MAX_WAIT_SECONDS.get(priority, MAX_WAIT_SECONDS[PRIORITY_NORMAL])
+        deadline = self.clock() + timeout
+        with self._condition:
+            quota = self._quota(token, resource)
+            quota.waiting[priority] = quota.waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    delay = self._delay_locked(quota, priority)
+                    if delay <= 0:
+                        break
+                    now = self.clock()
+                    if now + delay > deadline:
+                        raise RateLimitExceeded(resource, now + delay)
+                    self._condition.wait(delay)
+
+                self._consume_locked(quota)
+            finally:
+                quota.waiting[priority] -= 1
+                self._condition.notify_all()
+
+    def consume(self, token, resource=RESOURCE_CORE):
+        """Count a call against the quota without waiting, for callers that
+        wait on `delay_for` themselves, such as the asyncio client"""
+        with self._condition:
+            self._consume_locked(self._quota(token, resource))
+
+    def _consume_locked(self, quota):
+        # Spend the quota optimistically so concurrent callers see it
+        if quota.remaining is not None and quota.remaining > 0:
+            quota.remaining -= 1
+
+    def update(self, token, response, resource=RESOURCE_CORE):
+        """Record the rate limit headers of a GitHub response.
+
+        The quota updated is the one named by `X-RateLimit-Resource`, falling
+        back to the resource the call was made against.
+        """
+        headers = response.headers
+        now = self.clock()
+
+        with self._condition:
+            quota = self._quota(token, headers.get('X-RateLimit-Resource') or resource)
+
+            if headers.get('X-RateLimit-Limit'):
+                quota.limit = int(headers['X-RateLimit-Limit'])
+            if headers.get('X-RateLimit-Remaining'):
+                quota.remaining = int(headers['X-RateLimit-Remaining'])
+            if headers.get('X-RateLimit-Reset'):
+                quota.reset_at = float(headers['X-RateLimit-Reset'])
+
+            retry_after = self.retry_after(response)
+            if retry_after is not None:
+                quota.blocked_until = max(quota.blocked_until, now + retry_after)
+                logger.warning(f"GitHub rate limit hit, backing off for {retry_after:.0f}s")
+
+            self._condition.notify_all()
+
+    def retry_after(self, response):
+        """Return the back-off GitHub asked for, or None if the call was not limited"""
+        if response.status_code not in (403, 429):
+            return None
+
+        headers = response.headers
+        if headers.get('Retry-After'):
+            try:
+                return float(headers['Retry-After'])
+            except ValueError:
+                return 60.0
+
+        if headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset'):
+            return max(0.0, float(headers['X-RateLimit-Reset']) - self.clock())
+
+        if response.status_code == 429:
+            return 60.0
+
+        # A 403 without rate limit headers is a permission error, not a limit
+        return None
+
+_rate_limiter = GitHubRateLimiter()
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter shared by all GitHub clients"""
+    return _rate_limiter
@@ -0,0 +1,162 @@
+import logging
+from datetime import datetime
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
+from ..models.repository import db, Repository
+from ..models import json_codec
+
+logger = logging.getLogger(__name__)
+
+# Rows upserted per statement and per transaction
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+
+# Columns an import may set; everything else on Repository is derived
+IMPORT_COLUMNS = (
+    'name', 'full_name', 'github_id', 'url', 'clone_url', 'default_branch', 'private',
+    'description', 'language', 'stars', 'forks', 'open_issues',
+    'has_readme', 'has_license', 'has_issues', 'contributor_count', 'pr_count',
+    'total_files', 'has_tests', 'has_documentation', 'has_ci', 'config_files_count',
+)
+
+class InvalidRecord(ValueError):
+    """Raised for import records that cannot be upserted"""
+
+def iter_ndjson(lines):
+    """Parse NDJSON lines lazily; unparseable lines come out as InvalidRecord instances"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json_codec.loads(line)
+        except json_codec.JSONDecodeError as e:
+            yield InvalidRecord(f"Invalid JSON: {str(e)}")
+
+def validate_record(record):
+    """Column values of one import record, with name and url defaulted from full_name"""
+    if isinstance(record, InvalidRecord):
+        raise record
+    if not isinstance(record, dict):
+        raise InvalidRecord('Record must be a JSON object')
+
+    unknown = set(record) - set(IMPORT_COLUMNS)
+    if unknown:
+        raise InvalidRecord(f"Unknown fields: {', '.join(sorted(unknown))}")
+    full_name = record.get('full_name')
+    if not isinstance(full_name, str) or full_name.count('/') != 1 or not all(full_name.split('/')):
+        raise InvalidRecord('full_name must look like owner/name')
+
+    values = dict(record)
+    values.setdefault('name', full_name.split('/')[1])
+    values.setdefault('url', f"https://github.com/{full_name}")
+    for column_name, value in values.items():
+        column = Repository.__table__.c[column_name]
+        if value is None:
+            if not column.nullable:
+                raise InvalidRecord(f"{column_name} cannot be null")
+            continue
+        python_type = column.type.python_type
+        # bool is an int subclass, do not let it pass for a count
+        if not isinstance(value, python_type) or (python_type is int and isinstance(value, bool)):
+            raise InvalidRecord(f"{column_name} must be of type {python_type.__name__}")
+    return values
+
+def upsert_statement(dialect_name, rows):
+    """Multi-row INSERT ... ON CONFLICT (full_name) DO UPDATE for rows sharing their keys.
+
+    Conflicting rows are only rewritten when a value differs, so RETURNING
+    lists exactly the rows that were created or changed.
+    """
+    table = Repository.__table__
+    insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+    statement = insert(table).values(rows)
+    updated_columns = [column_name for column_name in rows[0] if column_name != 'full_name']
+    set_ = {column_name: statement.excluded[column_name] for column_name in updated_columns}
+    set_['updated_at'] = datetime.utcnow()
+    return statement.on_conflict_do_update(
+        index_elements=['full_name'],
+        set_=set_,
+        where=or_(*(table.c[column_name].is_distinct_from(statement.excluded[column_name]) for column_name in updated_columns))
+    ).returning(table.c.id, table.c.full_name)
+
+def upsert_batch(batch):
+    """Upsert one batch of (index, values) in a single transaction; returns per-row results"""
+    by_full_name = {}
+    results = []
+    for index, values in batch:
+        # Within a statement a row can only be upserted once; the last record wins
+        previous = by_full_name.get(values['full_name'])
+        if previous is not None:
+            results.append({'index': previous[0], 'full_name': values['full_name'], 'status': 'superseded'})
+        by_full_name[values['full_name']] = (index, values)
+
+    existing = dict(
+        db.session.query(Repository.full_name, Repository.id)
+        .filter(Repository.full_name.in_(list(by_full_name))).all()
+    )
+
+    # A multi-row INSERT needs the same columns in every row
+    groups = {}
+    for index, values in by_full_name.values():
+        groups.setdefault(tuple(sorted(values)), []).append(values)
+
+    written = {}
+    dialect_name = db.engine.dialect.name
+    for rows in groups.values():
+        for repository_id, full_name in db.session.execute(upsert_statement(dialect_name, rows)):
+            written[full_name] = repository_id
+    db.session.commit()
+
+    for index, values in by_full_name.values():
+        full_name = values['full_name']
+        if full_name not in written:
+            status, repository_id = 'unchanged', existing.get(full_name)
+        else:
+            status = 'updated' if full_name in existing else 'created'
+            repository_id = written[full_name]
+        results.append({'index': index, 'full_name': full_name, 'status': status, 'id': repository_id})
+    return results
+
+def import_repositories(records, batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert repositories by full_name from an iterable of records.
+
+    Records are consumed lazily and upserted in batches, each batch in its
+    own transaction: a failing batch is rolled back and reported row by row
+    without undoing the batches before it. Returns the per-row results,
+    ordered by record index, and a count per status.
+    """
+    results = []
+    batch = []
+
+    def flush_batch():
+        try:
+            results.extend(upsert_batch(batch))
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error importing repository batch: {str(e)}")
+            # Report the database's message rather than the whole statement
+            error = str(getattr(e, 'orig', None) or e)
+            results.extend(
+                {'index': index, 'full_name': values['full_name'], 'status': 'failed', 'error': error}
+                for index, values in batch
+            )
+        batch.clear()
+
+    for index, record in enumerate(records):
+        try:
+            batch.append((index, validate_record(record)))
+        except InvalidRecord as e:
+            full_name = record.get('full_name') if isinstance(record, dict) else None
+            results.append({'index': index, 'full_name': full_name, 'status': 'invalid', 'error': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            flush_batch()
+    if batch:
+        flush_batch()
+
+    results.sort(key=lambda result: result['index'])
+    summary = dict.fromkeys(('created', 'updated', 'unchanged', 'superseded', 'invalid', 'failed'), 0)
+    for result in results:
+        summary[result['status']] += 1
+    return results, summary
@@ -0,0 +1,235 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached response is served when no write invalidates it first
+DEFAULT_TTL = 15
+
+# Session.info key collecting the tables written in the current transaction
+PENDING_TAGS_KEY = 'response_cache_tags'
+
+class MemoryCacheBackend:
+    """Per-process cache: responses in an LRU dict, tag versions in a dict"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return [self._tags.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+class RedisCacheBackend:
+    """Cache shared by all processes; invalidations reach every worker"""
+
+    def __init__(self, url, prefix='response-cache:'):
+        if redis is None:
+            raise RuntimeError('RESPONSE_CACHE_BACKEND=redis requires the redis package')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        entry = self.client.hgetall(f"{self.prefix}{key}")
+        if not entry:
+            return None
+        return {
+            'body': entry[b'body'],
+            'status': int(entry[b'status']),
+            'content_type': entry[b'content_type'].decode('utf-8')
+        }
+
+    def set(self, key, value, ttl):
+        name = f"{self.prefix}{key}"
+        pipeline = self.client.pipeline()
+        pipeline.hset(name, mapping=value)
+        pipeline.expire(name, ttl)
+        pipeline.execute()
+
+    def tag_versions(self, tags):
+        versions = self.client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return [int(version or 0) for version in versions]
+
+    def bump_tags(self, tags):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr(f"{self.prefix}tag:{tag}")
+        pipeline.execute()
+
+class ResponseCache:
+    """Caches GET responses under keys that include the versions of their tags.
+
+    Tags are table names. Committing a write to a table bumps its version,
+    so every cached response that read the table misses from then on, and
+    the stale entries simply age out. Concurrent misses for the same key in
+    one process are collapsed into a single computation.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    def _key(self, tags):
+        versions = self.backend.tag_versions(tags)
+        raw = f"{request.full_path}|{'|'.join(f'{tag}:{version}' for tag, version in zip(tags, versions))}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _make_response(entry, state):
+        response = current_app.response_class(entry['body'], status=entry['status'], content_type=entry['content_type'])
+        response.headers['X-Cache'] = state
+        return response
+
+    def serve(self, tags, ttl, view, *args, **kwargs):
+        try:
+            key = self._key(tags)
+            entry = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Response cache unavailable: {str(e)}")
+            return view(*args, **kwargs)
+        if entry is not None:
+            return self._make_response(entry, 'HIT')
+
+        with self._flights_lock:
+            flight = self._flights.setdefault(key, threading.Lock())
+        try:
+            with flight:
+                # Another request may have filled the entry while we waited
+                entry = self.backend.get(key)
+                if entry is not None:
+                    return self._make_response(entry, 'HIT')
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = {
+                    'body': response.get_data(),
+                    'status': response.status_code,
+                    'content_type': response.content_type
+                }
+                self.backend.set(key, entry, ttl)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+        finally:
+            with self._flights_lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def invalidate(self, tags):
+        try:
+            self.backend.bump_tags(sorted(tags))
+        except Exception as e:
+            logger.error(f"Error invalidating response cache tags {sorted(tags)}: {str(e)}")
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Return the shared response cache, or None when RESPONSE_CACHE_BACKEND=none"""
+    global _response_cache
+    backend_name = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+    if backend_name == 'none':
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            if backend_name == 'redis':
+                backend = RedisCacheBackend(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+            else:
+                backend = MemoryCacheBackend()
+            _response_cache = ResponseCache(backend)
+        return _response_cache
+
+def cached_response(tags, ttl=DEFAULT_TTL):
+    """Cache a GET view for `ttl` seconds or until one of the `tags` tables is written.
+
+    `tags` may be a callable returning the tables of the current request.
+    """
+    static_tags = None if callable(tags) else sorted(tags)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None or request.method != 'GET':
+                return view(*args, **kwargs)
+            return cache.serve(static_tags or sorted(tags()), ttl, view, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def _pending_tags(session):
+    return session.info.setdefault(PENDING_TAGS_KEY, set())
+
+@event.listens_for(Session, 'after_flush')
+def collect_cache_tags(session, flush_context):
+    """Remember which tables this transaction wrote through the unit of work"""
+    tags = _pending_tags(session)
+    for instance in chain(session.new, session.deleted, session.dirty):
+        table_name = getattr(instance, '__tablename__', None)
+        if table_name and (instance not in session.dirty or session.is_modified(instance)):
+            tags.add(table_name)
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_bulk_cache_tags(orm_execute_state):
+    """Remember tables written by bulk INSERT/UPDATE/DELETE statements"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            _pending_tags(orm_execute_state.session).add(table.name)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_after_commit(session):
+    """Bump the written tags once the data is visible.
+
+    Bumping any earlier would let a concurrent reader store the old data
+    under the new versions.
+    """
+    tags = session.info.pop(PENDING_TAGS_KEY, None)
+    if tags:
+        cache = get_response_cache()
+        if cache is not None:
+            cache.invalidate(tags)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_tags_after_rollback(session):
+    session.info.pop(PENDING_TAGS_KEY, None)
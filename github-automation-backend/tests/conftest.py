@@ -0,0 +1,76 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+import pytest
+from flask import Flask
+from src.models.repository import db
+from src.models import json_codec
+from src.services import github_service
+
+@pytest.fixture
+def app():
+    """App on an in-memory SQLite database with every table created"""
+    app = Flask(__name__)
+    app.json = json_codec.FastJSONProvider(app)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'json_serializer': json_codec.dumps,
+        'json_deserializer': json_codec.loads
+    }
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+class GitHubStandInHandler(BaseHTTPRequestHandler):
+    """Records each request and answers it through the server's `route`"""
+    protocol_version = 'HTTP/1.1'
+
+    def handle_one(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        request = (self.command, url.path, dict(parse_qsl(url.query)), body)
+        with self.server.lock:
+            self.server.requests.append(request)
+        status, payload = self.server.route(*request)
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = handle_one
+
+    def log_message(self, *args):
+        pass
+
+class GitHubStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for every concurrent connection, a full backlog stalls clients for a second
+    request_queue_size = 64
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), GitHubStandInHandler)
+        self.url = f"http://127.0.0.1:{self.server_port}"
+        self.lock = threading.Lock()
+        self.requests = []
+        self.route = lambda method, path, query, body: (404, {'message': 'Not Found'})
+
+@pytest.fixture
+def github_api(monkeypatch):
+    """Local GitHub API stand-in; tests set `route(method, path, query, body)`
+    to return (status, payload), and read the requests it received"""
+    server = GitHubStandIn()
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    monkeypatch.setenv('GITHUB_API_URL', server.url)
+    monkeypatch.delenv('GITHUB_GRAPHQL_URL', raising=False)
+    monkeypatch.delenv('GIT_MIRROR_ROOT', raising=False)
+    github_service._commit_cache.clear()
+    github_service._diff_cache.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
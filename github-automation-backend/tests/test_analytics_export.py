@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+import pytest
+from src.models.repository import db, Repository
+from src.models.webhook import WebhookEvent, CommitAnalysis
+from src.services import analytics_export
+from src.services.analytics_export import ExportUnavailable, export_watermark, iter_export_chunks, write_export
+
+@pytest.fixture
+def event(app, monkeypatch):
+    # Export everything committed so far
+    monkeypatch.setattr(analytics_export, 'EXPORT_LAG', timedelta(0))
+    repository = Repository(name='app', full_name='octo/app', url='https://github.com/octo/app')
+    db.session.add(repository)
+    db.session.flush()
+    event = WebhookEvent(event_type='push', repository_id=repository.id, github_delivery_id='d1', payload={})
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+def new_analysis(event, sha, **values):
+    return CommitAnalysis(
+        webhook_event_id=event.id, repository_id=event.repository_id, commit_sha=sha,
+        commit_message='Fix', author_name='Octo', author_email='octo@example.com', **values
+    )
+
+def export(after):
+    upper = export_watermark()
+    rows = [row for chunk in iter_export_chunks(after, upper, chunk_size=1) for row in chunk]
+    return [row['commit_sha'] for row in rows], upper
+
+def test_analysis_committed_after_a_higher_id_is_exported(event):
+    # The first analysis gets its id, then waits on OpenAI while another
+    # request inserts and commits a second one
+    slow = new_analysis(event, 'slow', id=1)
+    fast = new_analysis(event, 'fast', id=2)
+    db.session.add(fast)
+    db.session.commit()
+
+    exported, watermark = export(None)
+    assert exported == ['fast']
+
+    db.session.add(slow)
+    db.session.commit()
+    exported, watermark = export(watermark)
+    assert exported == ['slow']
+    assert slow.id < fast.id
+
+    assert export(watermark)[0] == []
+
+def test_recent_commits_are_held_back(event, monkeypatch):
+    monkeypatch.setattr(analytics_export, 'EXPORT_LAG', timedelta(minutes=1))
+    db.session.add(new_analysis(event, 'recent'))
+    db.session.commit()
+    assert export(None)[0] == []
+    assert export_watermark() < datetime.utcnow()
+
+def test_updated_analysis_is_exported_again(event):
+    analysis = new_analysis(event, 'sha')
+    db.session.add(analysis)
+    db.session.commit()
+    exported, watermark = export(None)
+    assert exported == ['sha']
+
+    analysis.risk_score = 80
+    db.session.commit()
+    exported, _ = export(watermark)
+    assert exported == ['sha']
+
+@pytest.mark.parametrize('export_format', ['parquet', 'arrow'])
+def test_columnar_formats_without_pyarrow_fail_clearly(event, export_format, tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics_export, 'pa', None)
+    monkeypatch.setattr(analytics_export, 'pq', None)
+    db.session.add(new_analysis(event, 'sha'))
+    db.session.commit()
+    path = tmp_path / f'export.{export_format}'
+
+    with pytest.raises(ExportUnavailable, match=f'{export_format} export requires the pyarrow package.*ndjson'):
+        write_export(str(path), export_format)
+    assert list(tmp_path.iterdir()) == []
+
+    # NDJSON needs no optional packages
+    assert write_export(str(tmp_path / 'export.ndjson'), 'ndjson')[0] == 1
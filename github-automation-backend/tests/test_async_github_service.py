@@ -0,0 +1,154 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from src.services import github_service
+from src.services.async_github_service import AsyncGitHubService, get_github_facade
+from src.services.github_service import GitHubService
+from src.services.rate_limiter import PRIORITY_NORMAL, RESOURCE_CORE, RateLimitExceeded
+
+# Latency of every stand-in response, long enough for overlap to show
+LATENCY = 0.05
+
+class GitHubStandIn(BaseHTTPRequestHandler):
+    """Answers the commit, blob and GraphQL endpoints after a short delay"""
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def handle_one(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        with self.lock:
+            type(self).requests.append((method, self.path, body))
+            type(self).in_flight += 1
+            type(self).max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(LATENCY)
+            status, payload = self.route(method, self.path, body)
+        finally:
+            with self.lock:
+                type(self).in_flight -= 1
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-RateLimit-Limit', '5000')
+        self.send_header('X-RateLimit-Remaining', '4000')
+        self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def route(method, path, body):
+        commit = re.match(r'^/repos/octo/app/commits/(\w+)$', path)
+        if method == 'GET' and commit:
+            sha = commit.group(1)
+            return 200, {'sha': sha, 'files': [{
+                'filename': f'{sha}.py', 'status': 'modified', 'patch': f'@@ -1 +1 @@\n-old {sha}\n+new {sha}'
+            }]}
+        if method == 'POST' and path == '/repos/octo/app/git/blobs':
+            if body['content'] == 'broken':
+                return 422, {'message': 'Invalid content'}
+            return 201, {'sha': f"blob-{body['content']}"}
+        if method == 'POST' and path == '/graphql':
+            if body['variables'].get('fail'):
+                return 502, {'message': 'Bad gateway'}
+            return 200, {'data': {'echo': body['variables']}}
+        return 404, {'message': 'Not Found'}
+
+    def do_GET(self):
+        self.handle_one('GET')
+
+    def do_POST(self):
+        self.handle_one('POST')
+
+    def log_message(self, *args):
+        pass
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for every concurrent connection, a full backlog stalls clients for a second
+    request_queue_size = 64
+
+@pytest.fixture
+def api_url(monkeypatch):
+    GitHubStandIn.requests = []
+    GitHubStandIn.in_flight = 0
+    GitHubStandIn.max_in_flight = 0
+    server = StandInServer(('127.0.0.1', 0), GitHubStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setenv('GITHUB_API_URL', url)
+    monkeypatch.delenv('GITHUB_GRAPHQL_URL', raising=False)
+    monkeypatch.delenv('GIT_MIRROR_ROOT', raising=False)
+    github_service._commit_cache.clear()
+    github_service._diff_cache.clear()
+    yield url
+    server.shutdown()
+
+def test_commit_diffs_are_fetched_concurrently_in_input_order(api_url):
+    facade = GitHubService(token='async-diffs').fan_out()
+    shas = [f'c{index}' for index in range(8)]
+
+    started = time.monotonic()
+    diffs = facade.get_commit_diffs('octo/app', shas)
+    elapsed = time.monotonic() - started
+
+    assert [diff.splitlines()[0] for diff in diffs] == [f'diff --git a/{sha}.py b/{sha}.py' for sha in shas]
+    assert GitHubStandIn.max_in_flight > 1
+    assert elapsed < LATENCY * len(shas)
+
+    # Commits are immutable, the sync client reads them from the shared cache
+    assert GitHubService(token='async-diffs').get_commit_diff('octo/app', 'c3') == diffs[3]
+    assert len(GitHubStandIn.requests) == len(shas)
+
+def test_sync_create_blobs_fans_out_through_the_async_client(api_url):
+    service = GitHubService(token='async-blobs')
+
+    blobs = service.create_blobs('octo/app', [f'file{index}' for index in range(6)] + ['broken'])
+
+    assert [blob and blob['sha'] for blob in blobs] == [f'blob-file{index}' for index in range(6)] + [None]
+    assert GitHubStandIn.max_in_flight > 1
+    assert service.create_blobs('octo/app', []) == []
+
+def test_graphql_many_keeps_failed_queries_in_place(api_url):
+    facade = GitHubService(token='async-graphql').fan_out()
+
+    results = facade.graphql_many([
+        ('query { a }', {'n': 1}),
+        ('query { b }', {'fail': True}),
+        ('query { c }', {'n': 3}),
+    ])
+
+    assert results[0] == {'echo': {'n': 1}}
+    assert isinstance(results[1], Exception)
+    assert results[2] == {'echo': {'n': 3}}
+
+def test_exhausted_quota_fails_fast_without_sending(api_url):
+    service = AsyncGitHubService(token='async-exhausted')
+    quota = service.rate_limiter._quota(service.token, RESOURCE_CORE)
+    quota.limit, quota.remaining, quota.reset_at = 5000, 0, time.time() + 3600
+
+    async def fetch():
+        async with service:
+            return await service.get_commit('octo/app', 'c1')
+
+    # get_commit logs the failure and reports no commit, like the sync client
+    assert asyncio.run(fetch()) is None
+    assert GitHubStandIn.requests == []
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(service._wait_for_quota(PRIORITY_NORMAL, RESOURCE_CORE))
+
+def test_facades_are_kept_per_token_and_endpoint(api_url):
+    first = get_github_facade('async-facade', api_url, f'{api_url}/graphql')
+
+    assert get_github_facade('async-facade', api_url, f'{api_url}/graphql') is first
+    assert get_github_facade('async-other', api_url, f'{api_url}/graphql') is not first
+    assert first.service.base_url == api_url
@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from src.models.repository import db, Repository, AutomationEntry
+from src.routes.repository import repository_bp
+from src.services.automation_batch import apply_status_transitions
+
+SEEN = datetime(2024, 1, 1, 12, 0, 0, 123456)
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_BACKEND', 'none')
+    app.register_blueprint(repository_bp, url_prefix='/api')
+    return app.test_client()
+
+@pytest.fixture
+def repository(app):
+    repository = Repository(name='app', full_name='octo/app', url='https://github.com/octo/app')
+    db.session.add(repository)
+    db.session.commit()
+    return repository
+
+def add_entry(repository, status, updated_at=SEEN, **values):
+    entry = AutomationEntry(repository_id=repository.id, action='improvement', status=status, updated_at=updated_at, **values)
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+def current(entry):
+    db.session.expire(entry)
+    return entry.status, entry.updated_at
+
+def transition(entry, status, updated_at=SEEN, **values):
+    return {'id': entry.id, 'status': status, 'updated_at': updated_at.isoformat(), **values}
+
+def test_stale_updated_at_is_a_conflict_and_writes_nothing(repository):
+    entry = add_entry(repository, 'pending', updated_at=SEEN + timedelta(seconds=5))
+
+    results, summary = apply_status_transitions([transition(entry, 'in_progress', pr_title='Improve')])
+
+    assert summary['conflict'] == 1 and summary['updated'] == 0
+    assert results[0]['entry_status'] == 'pending'
+    assert results[0]['updated_at'] == SEEN + timedelta(seconds=5)
+    assert current(entry) == ('pending', SEEN + timedelta(seconds=5))
+    assert entry.pr_title is None
+
+def test_illegal_move_is_rejected_and_writes_nothing(repository):
+    entry = add_entry(repository, 'completed')
+
+    results, summary = apply_status_transitions([transition(entry, 'pending')])
+
+    assert summary['invalid_transition'] == 1
+    assert results[0]['entry_status'] == 'completed'
+    assert current(entry) == ('completed', SEEN)
+
+def test_mixed_batch_is_one_update(repository):
+    started = add_entry(repository, 'pending')
+    finished = add_entry(repository, 'in_progress', branch_name='improve', pr_url='https://github.com/octo/app/pull/1')
+    stale = add_entry(repository, 'pending', updated_at=SEEN + timedelta(minutes=1))
+    done = add_entry(repository, 'completed')
+    retried = add_entry(repository, 'failed')
+    records = [
+        transition(started, 'in_progress', details='Working on it'),
+        transition(finished, 'completed', pr_title='Improve things'),
+        transition(stale, 'failed'),
+        transition(done, 'in_progress'),
+        # Timezone-aware timestamps are compared in UTC
+        {**transition(retried, 'pending'), 'updated_at': '2024-01-01T13:00:00.123456+01:00'},
+        transition(started, 'failed'),
+        {'id': 999, 'status': 'completed', 'updated_at': SEEN.isoformat()},
+        {'id': 'x', 'status': 'completed', 'updated_at': SEEN.isoformat()},
+        {'id': 998, 'status': 'merged', 'updated_at': SEEN.isoformat()},
+    ]
+
+    with count_statements() as statements:
+        results, summary = apply_status_transitions(records)
+
+    assert [result['status'] for result in results] == [
+        'updated', 'updated', 'conflict', 'invalid_transition', 'updated', 'invalid', 'not_found', 'invalid', 'invalid'
+    ]
+    assert summary == {'updated': 3, 'conflict': 1, 'invalid_transition': 1, 'not_found': 1, 'invalid': 3}
+    assert results[5]['error'] == 'Duplicate id in batch'
+    # One UPDATE for every transition, one SELECT to explain the rest
+    assert [statement.split()[0] for statement in statements] == ['UPDATE', 'SELECT']
+    assert 'CASE automation_entries.id' in statements[0]
+
+    assert current(started)[0] == 'in_progress' and started.details == 'Working on it'
+    assert current(finished)[0] == 'completed'
+    # Fields not in a transition keep their values
+    assert (finished.pr_title, finished.branch_name) == ('Improve things', 'improve')
+    assert current(retried)[0] == 'pending'
+    assert current(stale) == ('pending', SEEN + timedelta(minutes=1))
+    assert current(done) == ('completed', SEEN)
+    assert started.updated_at > SEEN and results[0]['updated_at'] == started.updated_at
+
+def test_transitions_endpoint_round_trips_updated_at(client, repository):
+    entry = add_entry(repository, 'pending', updated_at=datetime.utcnow())
+    seen = client.get(f'/api/repositories/{repository.id}/automation-entries').get_json()
+
+    listed = next(item for item in seen['automation_entries'] if item['id'] == entry.id)
+    response = client.post('/api/automation-entries/transitions', json={'transitions': [
+        {'id': entry.id, 'status': 'in_progress', 'updated_at': listed['updated_at']}
+    ]})
+    assert response.get_json()['summary']['updated'] == 1
+
+    # Replaying the same transition now conflicts
+    response = client.post('/api/automation-entries/transitions', json={'transitions': [
+        {'id': entry.id, 'status': 'completed', 'updated_at': listed['updated_at']}
+    ]})
+    assert response.get_json()['results'][0]['status'] == 'conflict'
+    assert current(entry)[0] == 'in_progress'
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import jsonify
+from src.models.repository import db, Repository
+from src.routes.etags import conditional_get
+from src.services import response_cache
+
+# Long past the settle time
+SETTLED = datetime(2024, 1, 1)
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_BACKEND', 'none')
+    monkeypatch.setattr(response_cache, '_response_cache', None)
+
+    @app.route('/repositories')
+    @conditional_get(['repositories'])
+    def list_repositories():
+        return jsonify([repository.full_name for repository in Repository.query.order_by(Repository.id)])
+
+    return app.test_client()
+
+def add_repository(name, updated_at=None):
+    repository = Repository(name=name, full_name=f'octo/{name}', url=f'https://github.com/octo/{name}', updated_at=updated_at)
+    db.session.add(repository)
+    db.session.commit()
+    return repository
+
+def test_etags_come_from_the_data_without_a_response_cache(client):
+    add_repository('app', SETTLED)
+    etag = client.get('/repositories').headers['ETag']
+    assert client.get('/repositories', headers={'If-None-Match': etag}).status_code == 304
+
+def test_etag_changes_with_inserts_and_updates(client):
+    app_repository = add_repository('app', SETTLED)
+    first = client.get('/repositories').headers['ETag']
+
+    # Stamped before the newest row, but still a new id
+    add_repository('lib', SETTLED - timedelta(days=1))
+    response = client.get('/repositories', headers={'If-None-Match': first})
+    assert response.status_code == 200
+    assert response.get_json() == ['octo/app', 'octo/lib']
+    second = response.headers['ETag']
+    assert second != first
+
+    app_repository.updated_at = SETTLED + timedelta(minutes=1)
+    db.session.commit()
+    assert client.get('/repositories', headers={'If-None-Match': second}).status_code == 200
+
+def test_no_etag_while_recent_writes_may_still_commit(client):
+    add_repository('app')
+    response = client.get('/repositories')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+def test_etag_does_not_depend_on_the_cache_backend(client, monkeypatch):
+    add_repository('app', SETTLED)
+    etag = client.get('/repositories').headers['ETag']
+
+    monkeypatch.setenv('RESPONSE_CACHE_BACKEND', 'memory')
+    monkeypatch.setattr(response_cache, '_response_cache', None)
+    assert client.get('/repositories').headers['ETag'] == etag
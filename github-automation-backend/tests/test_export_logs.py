@@ -0,0 +1,28 @@
+import csv
+import io
+import pytest
+from src.models.repository import db
+from src.models.webhook import ActionLog
+from src.routes.admin import admin_bp
+
+@pytest.fixture
+def client(app):
+    app.register_blueprint(admin_bp)
+    for repository_id in (1, 2, None):
+        db.session.add(ActionLog(action_type='webhook_received', repository_id=repository_id, message='push'))
+    db.session.commit()
+    return app.test_client()
+
+def exported_repository_ids(response):
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    return [row[5] for row in rows[1:]]
+
+def test_filters_by_repository(client):
+    response = client.get('/admin/api/export-logs?repository_id=2')
+    assert response.status_code == 200
+    assert exported_repository_ids(response) == ['2']
+
+def test_rejects_non_integer_repository_id(client):
+    response = client.get('/admin/api/export-logs?repository_id=abc')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'repository_id must be an integer'}
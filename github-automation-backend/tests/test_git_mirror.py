@@ -0,0 +1,83 @@
+import os
+import subprocess
+import pytest
+from src.services.git_mirror import GitMirrorBackend
+
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'Octo Cat', 'GIT_AUTHOR_EMAIL': 'octo@example.com',
+    'GIT_COMMITTER_NAME': 'Octo Cat', 'GIT_COMMITTER_EMAIL': 'octo@example.com',
+}
+
+def git(cwd, *args):
+    result = subprocess.run(
+        ['git', *args], cwd=cwd, capture_output=True, text=True, check=True,
+        env={**os.environ, **GIT_ENV}
+    )
+    return result.stdout.strip()
+
+def commit(source, path, content, message):
+    with open(os.path.join(source, path), 'w') as f:
+        f.write(content)
+    git(source, 'add', path)
+    git(source, 'commit', '-q', '-m', message)
+    return git(source, 'rev-parse', 'HEAD')
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'source'
+    path.mkdir()
+    git(path, 'init', '-q', '-b', 'main')
+    return str(path)
+
+@pytest.fixture
+def mirror(tmp_path):
+    # A quota of one byte: syncing must not evict anything on its own
+    return GitMirrorBackend(str(tmp_path / 'mirrors'), max_bytes=1)
+
+def test_sync_clones_and_fetches_from_file_url(source, mirror):
+    url = f"file://{source}"
+    first = commit(source, 'README.md', 'hello\n', 'Add readme')
+    assert mirror.fetch('octo/app', url) is False  # fetch never clones
+    
+    assert mirror.sync('octo/app', url)
+    assert mirror.has_commit('octo/app', first)
+    
+    second = commit(source, 'README.md', 'hello\nworld\n', 'Extend readme')
+    assert not mirror.has_commit('octo/app', second)
+    assert mirror.fetch('octo/app', url)
+    assert mirror.has_commit('octo/app', second)
+    
+    diff = mirror.get_commit_diff('octo/app', second)
+    assert '+world' in diff
+    assert mirror.get_changed_files('octo/app', first) == [
+        {'filename': 'README.md', 'status': 'added', 'additions': 1, 'deletions': 0, 'changes': 1}
+    ]
+    # Quota enforcement is left to gc_all
+    assert mirror.has_mirror('octo/app')
+    assert mirror.gc_all()['evicted'] == ['octo__app.git']
+
+def test_compare_matches_the_compare_api_shape(source, mirror):
+    url = f"file://{source}"
+    base = commit(source, 'app.py', 'print(1)\n', 'Start')
+    commit(source, 'app.py', 'print(2)\n', 'Change output')
+    head = commit(source, 'test_app.py', 'assert True\n', 'Add test\n\nWith a body')
+    mirror.sync('octo/app', url)
+    
+    comparison = mirror.compare('octo/app', base, head)
+    assert comparison['total_commits'] == 2
+    assert [c['commit']['message'] for c in comparison['commits']] == ['Change output', 'Add test\n\nWith a body']
+    assert comparison['commits'][-1]['sha'] == head
+    assert comparison['commits'][0]['commit']['author']['email'] == 'octo@example.com'
+    assert sorted((f['filename'], f['status']) for f in comparison['files']) == [
+        ('app.py', 'modified'), ('test_app.py', 'added')
+    ]
+    assert comparison['files_truncated'] is False
+    # Branch names work as refs, unknown commits fall back to the API
+    assert mirror.compare('octo/app', base, 'main')['total_commits'] == 2
+    assert mirror.compare('octo/app', base, '0' * 40) is None
+
+def test_schedule_sync_runs_in_background(source, mirror):
+    head = commit(source, 'README.md', 'hello\n', 'Add readme')
+    mirror.schedule_sync('octo/app', f"file://{source}")
+    mirror._sync_queue.join()
+    assert mirror.has_commit('octo/app', head)
@@ -0,0 +1,87 @@
+import threading
+import time
+import pytest
+from src.services.github_service import GitHubService
+
+BASE_COMMIT = {'sha': 'base-commit', 'commit': {'tree': {'sha': 'base-tree'}}}
+
+FILES = {f'improvements/file{index}.md': f'Y29udGVudHs{index}' for index in range(6)}
+
+class GitDataAPI:
+    """Answers the Git Data endpoints, with slow blob uploads to show overlap"""
+
+    def __init__(self, failing_blob=None, failing_tree=False):
+        self.failing_blob = failing_blob
+        self.failing_tree = failing_tree
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def __call__(self, method, path, query, body):
+        if method == 'GET' and path == '/repos/octo/app/git/commits/base-commit':
+            return 200, {'sha': 'base-commit', 'tree': {'sha': 'base-tree'}}
+        if method == 'POST' and path == '/repos/octo/app/git/blobs':
+            with self.lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(0.05)
+            with self.lock:
+                self.in_flight -= 1
+            if body['content'] == self.failing_blob:
+                return 422, {'message': 'Invalid content'}
+            return 201, {'sha': f"blob-{body['content']}"}
+        if method == 'POST' and path == '/repos/octo/app/git/trees':
+            if self.failing_tree:
+                return 500, {'message': 'Server Error'}
+            return 201, {'sha': 'new-tree'}
+        if method == 'POST' and path == '/repos/octo/app/git/commits':
+            return 201, {'sha': 'new-commit', 'tree': {'sha': body['tree']}}
+        if method == 'POST' and path == '/repos/octo/app/git/refs':
+            return 201, {'ref': body['ref'], 'object': {'sha': body['sha']}}
+        return 404, {'message': 'Not Found'}
+
+def paths(github_api, method='POST'):
+    return [path for request_method, path, _, _ in github_api.requests if request_method == method]
+
+@pytest.fixture
+def service(github_api):
+    return GitHubService(token='git-data')
+
+def test_files_are_committed_to_a_new_branch(github_api, service):
+    github_api.route = api = GitDataAPI()
+
+    commit = service.commit_files_to_branch('octo/app', 'improve', BASE_COMMIT, FILES, 'Improve things')
+
+    assert commit['sha'] == 'new-commit'
+    assert api.max_in_flight > 1  # blobs upload in parallel
+    assert paths(github_api) == ['/repos/octo/app/git/blobs'] * len(FILES) + [
+        '/repos/octo/app/git/trees', '/repos/octo/app/git/commits', '/repos/octo/app/git/refs'
+    ]
+    bodies = {path: body for _, path, _, body in github_api.requests if path != '/repos/octo/app/git/blobs'}
+    assert bodies['/repos/octo/app/git/trees'] == {'base_tree': 'base-tree', 'tree': [
+        {'path': path, 'mode': '100644', 'type': 'blob', 'sha': f'blob-{content}'} for path, content in FILES.items()
+    ]}
+    assert bodies['/repos/octo/app/git/commits'] == {
+        'message': 'Improve things', 'tree': 'new-tree', 'parents': ['base-commit']
+    }
+    # The ref is created last, pointing at the finished commit
+    assert bodies['/repos/octo/app/git/refs'] == {'ref': 'refs/heads/improve', 'sha': 'new-commit'}
+
+def test_base_tree_is_looked_up_when_the_head_lacks_it(github_api, service):
+    github_api.route = GitDataAPI()
+
+    assert service.commit_files_to_branch('octo/app', 'improve', {'sha': 'base-commit'}, FILES, 'Improve')
+    assert paths(github_api, 'GET') == ['/repos/octo/app/git/commits/base-commit']
+
+def test_failed_blob_creates_no_tree_commit_or_ref(github_api, service):
+    github_api.route = GitDataAPI(failing_blob=FILES['improvements/file3.md'])
+
+    assert service.commit_files_to_branch('octo/app', 'improve', BASE_COMMIT, FILES, 'Improve') is None
+    assert set(paths(github_api)) == {'/repos/octo/app/git/blobs'}
+
+def test_failed_tree_creates_no_commit_or_ref(github_api, service):
+    github_api.route = GitDataAPI(failing_tree=True)
+
+    assert service.commit_files_to_branch('octo/app', 'improve', BASE_COMMIT, FILES, 'Improve') is None
+    assert paths(github_api)[-1] == '/repos/octo/app/git/trees'
+    assert '/repos/octo/app/git/refs' not in paths(github_api)
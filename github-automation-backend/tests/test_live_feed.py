@@ -0,0 +1,126 @@
+import base64
+import queue
+from datetime import timedelta
+import pytest
+from sqlalchemy import update
+from src.models.repository import db, Repository
+from src.models.webhook import WebhookEvent, CommitAnalysis, ActionLog
+from src.services import live_feed
+
+@pytest.fixture
+def subscription(app, monkeypatch):
+    monkeypatch.setenv('LIVE_FEED_BACKEND', 'memory')
+    monkeypatch.setattr(live_feed, '_live_feed', None)
+    broker = live_feed.get_live_feed()
+    subscription = broker.subscribe()
+    yield subscription
+    broker.unsubscribe(subscription)
+
+def published(subscription):
+    events = []
+    while True:
+        try:
+            events.append(subscription.queue.get_nowait())
+        except queue.Empty:
+            return events
+
+def analyse_push(risk_score, quality_score):
+    """Insert a push and its analysis, scoring the analysis after the insert like analyze_commit does"""
+    repository = Repository(name='app', full_name='octo/app', url='https://github.com/octo/app')
+    db.session.add(repository)
+    db.session.flush()
+    event = WebhookEvent(event_type='push', repository_id=repository.id, github_delivery_id='d1', payload={})
+    db.session.add(event)
+    db.session.flush()
+    analysis = CommitAnalysis(
+        webhook_event_id=event.id, repository_id=repository.id, commit_sha='a' * 40,
+        commit_message='Fix', author_name='Octo', author_email='octo@example.com'
+    )
+    db.session.add(analysis)
+    db.session.flush()
+    analysis.risk_score = risk_score
+    analysis.quality_score = quality_score
+    analysis.pr_generated = True
+    db.session.add(ActionLog(
+        action_type='pr_generated', repository_id=repository.id, commit_analysis_id=analysis.id, message='PR opened'
+    ))
+    return analysis
+
+def test_events_carry_the_committed_values(subscription):
+    analysis = analyse_push(risk_score=70, quality_score=45)
+    db.session.flush()
+    assert published(subscription) == []
+
+    db.session.commit()
+    events = {feed_event['type']: feed_event for feed_event in published(subscription)}
+    assert set(events) == {'webhook', 'analysis', 'log', 'pr'}
+    for event_type in ('analysis', 'pr'):
+        data = events[event_type]['data']
+        assert (data['risk_score'], data['quality_score'], data['pr_generated']) == (70, 45, True)
+    assert events['analysis']['position'] == live_feed.feed_position(analysis.committed_at, analysis.id)
+
+def test_rolled_back_rows_are_not_published(subscription):
+    analyse_push(risk_score=10, quality_score=90)
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert published(subscription) == []
+
+def log_entry(row_id, message):
+    """Commit one action log with a preset id, as a transaction that took its id earlier would"""
+    db.session.add(ActionLog(id=row_id, action_type='commit_analyzed', message=message))
+    db.session.commit()
+    return db.session.get(ActionLog, row_id)
+
+def event_cursor(message):
+    event_id = next(line for line in message.splitlines() if line.startswith('id: '))[len('id: '):]
+    return live_feed.decode_feed_cursor(event_id)
+
+def test_reconnect_replays_rows_committed_out_of_id_order(subscription):
+    # Two overlapping transactions: A inserted first and holds id 1, B commits first
+    log_entry(2, 'B')
+    cursor = live_feed.current_feed_cursor()
+    a = log_entry(1, 'A')
+
+    events = [e for e in live_feed.backfill_events(cursor) if e['type'] == 'log']
+    # B is within the rescan window and sent again; A is not lost behind the higher id
+    assert [e['data']['id'] for e in events] == [2, 1]
+    assert events[1]['position'] == live_feed.feed_position(a.committed_at, 1)
+    assert events[1]['position'] > cursor['log']
+
+def test_reconnect_rescans_stamps_behind_the_cursor(subscription):
+    log_entry(1, 'old')
+    b = log_entry(3, 'B')
+    cursor = live_feed.current_feed_cursor()
+    # A was stamped just before B, but its COMMIT became visible after B's
+    log_entry(2, 'A')
+    db.session.execute(update(ActionLog).where(ActionLog.id == 2).values(committed_at=b.committed_at - timedelta(seconds=1)))
+    db.session.execute(update(ActionLog).where(ActionLog.id == 1).values(
+        committed_at=b.committed_at - live_feed.RESCAN_WINDOW - timedelta(seconds=1)
+    ))
+    db.session.commit()
+
+    replayed = [e['data']['id'] for e in live_feed.backfill_events(cursor) if e['type'] == 'log']
+    assert replayed == [2, 3]
+
+def test_stream_cursor_follows_commit_order(subscription):
+    stream = live_feed.open_live_stream()
+    assert next(stream) == 'retry: 3000\n\n'
+    assert event_cursor(next(stream))['log'] == live_feed.START_POSITION
+
+    log_entry(2, 'B')
+    a = log_entry(1, 'A')
+    first, second = next(stream), next(stream)
+    stream.close()
+
+    assert '"id":2' in first.replace(' ', '') and '"id":1' in second.replace(' ', '')
+    # The cursor holds the last commit, not the highest id
+    assert event_cursor(second)['log'] == live_feed.feed_position(a.committed_at, 1)
+
+def test_cursor_round_trip_and_legacy_cursors():
+    cursor = {'webhook': (1, 2), 'analysis': (3, 4), 'pr': (5, 6), 'log': (5, 6)}
+    assert live_feed.decode_feed_cursor(live_feed.encode_feed_cursor(cursor)) == cursor
+    # Id-only cursors from earlier releases are rejected, the client starts over
+    legacy = base64.urlsafe_b64encode(b'1.2.3.4').decode('ascii').rstrip('=')
+    with pytest.raises(live_feed.InvalidFeedCursor):
+        live_feed.decode_feed_cursor(legacy)
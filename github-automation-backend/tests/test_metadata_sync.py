@@ -0,0 +1,92 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from src.models.repository import db, Repository
+from src.services.github_service import GitHubService
+from src.services.metadata_sync import sync_repository_metadata
+from src.services.rate_limiter import RESOURCE_CORE, RESOURCE_GRAPHQL
+
+# What the stand-in endpoint reports per repository; missing ones resolve to null
+CANNED = {
+    'octo/changed': {'stars': 50, 'forks': 3, 'issues': 4, 'open_prs': 1, 'prs': 9, 'users': 6, 'branch': 'main'},
+    'octo/same': {'stars': 10, 'forks': 1, 'issues': 2, 'open_prs': 0, 'prs': 5, 'users': 2, 'branch': 'main'},
+}
+
+def repository_node(values):
+    return {
+        'stargazerCount': values['stars'],
+        'forkCount': values['forks'],
+        'openIssues': {'totalCount': values['issues']},
+        'openPullRequests': {'totalCount': values['open_prs']},
+        'pullRequests': {'totalCount': values['prs']},
+        'mentionableUsers': {'totalCount': values['users']},
+        'defaultBranchRef': {'name': values['branch']},
+    }
+
+class GraphQLStandIn(BaseHTTPRequestHandler):
+    queries = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.queries.append(body)
+        variables = body['variables']
+        data = {}
+        i = 0
+        while f'owner{i}' in variables:
+            full_name = f"{variables[f'owner{i}']}/{variables[f'name{i}']}"
+            data[f'r{i}'] = repository_node(CANNED[full_name]) if full_name in CANNED else None
+            i += 1
+        payload = json.dumps({'data': data}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-RateLimit-Resource', 'graphql')
+        self.send_header('X-RateLimit-Limit', '5000')
+        self.send_header('X-RateLimit-Remaining', '4990')
+        self.send_header('X-RateLimit-Reset', '9999999999')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def graphql_url(monkeypatch):
+    GraphQLStandIn.queries = []
+    server = HTTPServer(('127.0.0.1', 0), GraphQLStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/graphql"
+    monkeypatch.setenv('GITHUB_GRAPHQL_URL', url)
+    yield url
+    server.shutdown()
+
+def add_repository(full_name, **values):
+    repository = Repository(name=full_name.split('/')[1], full_name=full_name, url=f"https://github.com/{full_name}", **values)
+    db.session.add(repository)
+    return repository
+
+def test_sync_updates_only_changed_rows(app, graphql_url):
+    add_repository('octo/changed', stars=1, forks=0, open_issues=0, pr_count=0, contributor_count=0)
+    add_repository('octo/same', stars=10, forks=1, open_issues=2, pr_count=5, contributor_count=2, default_branch='main')
+    add_repository('octo/gone')
+    db.session.commit()
+    unchanged_at = Repository.query.filter_by(full_name='octo/same').one().updated_at
+    
+    service = GitHubService(token='metadata-sync-test')
+    summary = sync_repository_metadata(github_service=service, batch_size=2)
+    
+    assert summary == {'checked': 3, 'updated': 1, 'missing': 1, 'deferred': 0, 'failed_batches': 0}
+    # Two aliased queries for three repositories, sent concurrently
+    assert sorted(len(query['variables']) for query in GraphQLStandIn.queries) == [2, 4]
+    
+    db.session.expire_all()
+    changed = Repository.query.filter_by(full_name='octo/changed').one()
+    assert (changed.stars, changed.forks, changed.open_issues, changed.pr_count, changed.contributor_count) == (50, 3, 5, 9, 6)
+    assert changed.default_branch == 'main'
+    assert Repository.query.filter_by(full_name='octo/same').one().updated_at == unchanged_at
+    
+    # GraphQL responses only move the GraphQL quota
+    limiter = service.rate_limiter
+    assert limiter._quota(service.token, RESOURCE_GRAPHQL).remaining == 4990
+    assert limiter._quota(service.token, RESOURCE_CORE).remaining is None
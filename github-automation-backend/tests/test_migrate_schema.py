@@ -0,0 +1,170 @@
+from datetime import datetime
+import pytest
+import sqlalchemy as sa
+from src.models.repository import db, Repository, Analysis
+from src.models.repository_summary import reconcile_repository_summaries
+from src.models.webhook import WebhookEvent, CommitAnalysis, ActionLog
+from src.models.schema import ADDED_COLUMNS, migrate_schema
+
+# The tables as created before any column in ADDED_COLUMNS existed
+BASELINE_REPOSITORIES = """
+CREATE TABLE repositories (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    full_name VARCHAR(255) NOT NULL UNIQUE,
+    url VARCHAR(500) NOT NULL,
+    description TEXT,
+    language VARCHAR(100),
+    stars INTEGER,
+    forks INTEGER,
+    open_issues INTEGER,
+    created_at DATETIME,
+    updated_at DATETIME,
+    has_readme BOOLEAN,
+    has_license BOOLEAN,
+    has_issues BOOLEAN,
+    contributor_count INTEGER,
+    pr_count INTEGER,
+    total_files INTEGER,
+    has_tests BOOLEAN,
+    has_documentation BOOLEAN,
+    has_ci BOOLEAN,
+    config_files_count INTEGER
+)
+"""
+
+BASELINE_COMMIT_ANALYSES = """
+CREATE TABLE commit_analyses (
+    id INTEGER PRIMARY KEY,
+    webhook_event_id INTEGER NOT NULL,
+    repository_id INTEGER NOT NULL,
+    commit_sha VARCHAR(40) NOT NULL,
+    commit_message TEXT NOT NULL,
+    author_name VARCHAR(100) NOT NULL,
+    author_email VARCHAR(100) NOT NULL,
+    ai_analysis TEXT,
+    suggestions TEXT,
+    risk_score INTEGER,
+    quality_score INTEGER,
+    pr_generated BOOLEAN,
+    pr_url VARCHAR(255),
+    pr_title VARCHAR(255),
+    pr_description TEXT,
+    created_at DATETIME,
+    analyzed_at DATETIME
+)
+"""
+
+BASELINE_WEBHOOK_EVENTS = """
+CREATE TABLE webhook_events (
+    id INTEGER PRIMARY KEY,
+    event_type VARCHAR(50) NOT NULL,
+    repository_id INTEGER NOT NULL,
+    github_delivery_id VARCHAR(100) NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    processed BOOLEAN,
+    created_at DATETIME,
+    processed_at DATETIME
+)
+"""
+
+BASELINE_ACTION_LOGS = """
+CREATE TABLE action_logs (
+    id INTEGER PRIMARY KEY,
+    action_type VARCHAR(50) NOT NULL,
+    repository_id INTEGER,
+    commit_analysis_id INTEGER,
+    message TEXT NOT NULL,
+    level VARCHAR(20),
+    details TEXT,
+    created_at DATETIME,
+    duration_ms INTEGER
+)
+"""
+
+def baseline_engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.begin() as connection:
+        connection.execute(sa.text(BASELINE_REPOSITORIES))
+        connection.execute(sa.text(BASELINE_COMMIT_ANALYSES))
+        connection.execute(sa.text(BASELINE_WEBHOOK_EVENTS))
+        connection.execute(sa.text(BASELINE_ACTION_LOGS))
+        connection.execute(sa.text(
+            "INSERT INTO repositories (name, full_name, url) VALUES ('app', 'octo/app', 'https://github.com/octo/app')"
+        ))
+        connection.execute(sa.text(
+            "INSERT INTO commit_analyses (webhook_event_id, repository_id, commit_sha, commit_message, "
+            "author_name, author_email, created_at) VALUES (1, 1, 'abc', 'Fix', 'Octo', 'o@x', '2024-01-01 00:00:00')"
+        ))
+        connection.execute(sa.text(
+            "INSERT INTO webhook_events (event_type, repository_id, github_delivery_id, payload, created_at) "
+            "VALUES ('push', 1, 'd1', '{}', '2024-01-01 00:00:00')"
+        ))
+        connection.execute(sa.text(
+            "INSERT INTO action_logs (action_type, repository_id, message, created_at) "
+            "VALUES ('commit_analyzed', 1, 'Analyzed', '2024-01-01 00:00:00')"
+        ))
+    return engine
+
+def test_adds_missing_columns_once(tmp_path):
+    engine = baseline_engine(tmp_path)
+    
+    added = migrate_schema(engine)
+    expected = [column for columns in ADDED_COLUMNS.values() for column in columns]
+    assert [column for _, column, outcome in added if outcome == 'added'] == expected
+    
+    again = migrate_schema(engine)
+    assert {outcome for _, _, outcome in again} == {'already present'}
+    
+    for model, column_names in ADDED_COLUMNS.items():
+        columns = {column['name'] for column in sa.inspect(engine).get_columns(model.__tablename__)}
+        assert set(column_names) <= columns
+
+def test_migrated_table_serves_model_queries(tmp_path):
+    engine = baseline_engine(tmp_path)
+    migrate_schema(engine)
+    
+    with engine.connect() as connection:
+        row = connection.execute(
+            sa.select(*(Repository.__table__.c[column] for column in ADDED_COLUMNS[Repository]))
+        ).one()
+    # Existing rows pick up the model defaults
+    assert row.private == False
+    assert row.github_id is None
+    
+    # Backfilled, so incremental exports and feed reconnects include the existing rows
+    for model in (WebhookEvent, CommitAnalysis, ActionLog):
+        with engine.connect() as connection:
+            committed_at = connection.execute(sa.select(model.__table__.c.committed_at)).scalar_one()
+        assert committed_at == datetime(2024, 1, 1)
+    
+    insert = sa.text("INSERT INTO repositories (name, full_name, url, github_id) VALUES (:name, :name, 'u', 1)")
+    with engine.begin() as connection:
+        connection.execute(insert, {'name': 'octo/other'})
+    with pytest.raises(sa.exc.IntegrityError):
+        with engine.begin() as connection:
+            connection.execute(insert, {'name': 'octo/duplicate'})
+
+def test_summaries_work_after_upgrade(app):
+    # Replace the repositories table with its baseline shape, holding a row
+    # whose analysis predates the summary columns
+    with db.engine.begin() as connection:
+        connection.execute(sa.text('DROP TABLE repositories'))
+        connection.execute(sa.text(BASELINE_REPOSITORIES))
+        connection.execute(sa.text(
+            "INSERT INTO repositories (name, full_name, url) VALUES ('app', 'octo/app', 'https://github.com/octo/app')"
+        ))
+        connection.execute(sa.text("INSERT INTO analyses (repository_id, created_at) VALUES (1, '2024-01-01 00:00:00')"))
+    migrate_schema(db.engine)
+
+    repository = db.session.get(Repository, 1)
+    assert (repository.analysis_count, repository.webhook_count, repository.risk_score_sum) == (0, 0, 0)
+
+    assert reconcile_repository_summaries() == 1
+    db.session.add(Analysis(repository_id=1))
+    db.session.commit()
+    db.session.expire_all()
+    repository = db.session.get(Repository, 1)
+    assert repository.analysis_count == 2
+    assert repository.latest_analysis_id == 2
+    assert reconcile_repository_summaries() == 0
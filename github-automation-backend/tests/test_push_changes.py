@@ -0,0 +1,117 @@
+import pytest
+from src.models.repository import Repository
+from src.services import git_mirror
+from src.services.git_mirror import GitMirrorBackend
+from src.services.github_service import GitHubService, MAX_COMMIT_FILES
+from src.services.push_changes import (
+    LARGE_PUSH_COMMITS, is_large_push, fetch_push_changes, build_push_commit_data
+)
+from tests.test_git_mirror import git, commit
+
+BEFORE = 'a' * 40
+AFTER = 'b' * 40
+
+def push_payload(commit_count, size=None, before=BEFORE, after=AFTER):
+    commits = [{'id': f'{index:040x}', 'message': f'Change {index}', 'parents': [{}]} for index in range(commit_count)]
+    return {
+        'ref': 'refs/heads/main',
+        'before': before,
+        'after': after,
+        'size': commit_count if size is None else size,
+        'commits': commits,
+        'compare': f'https://github.com/octo/app/compare/{before[:12]}...{after[:12]}',
+        'head_commit': {'author': {'name': 'Octo Cat', 'email': 'octo@example.com'}, 'timestamp': '2024-01-01T00:00:00Z'},
+        'pusher': {'name': 'octo'},
+    }
+
+def compare_route(total_commits, file_count):
+    """Compare API answering pages of commits, with the files on the first page only"""
+    def route(method, path, query, body):
+        if method != 'GET' or not path.startswith('/repos/octo/app/compare/'):
+            return 404, {'message': 'Not Found'}
+        page, per_page = int(query['page']), int(query['per_page'])
+        first = (page - 1) * per_page
+        commits = [
+            {'sha': f'{index:040x}', 'commit': {'message': f'Change {index}\n\nDetails'}}
+            for index in range(first, min(first + per_page, total_commits))
+        ]
+        files = [
+            {'filename': f'src/file{index}.py', 'status': ('added', 'modified', 'removed', 'renamed')[index % 4]}
+            for index in range(min(file_count, MAX_COMMIT_FILES))
+        ]
+        return 200, {'total_commits': total_commits, 'commits': commits, 'files': files if page == 1 else []}
+    return route
+
+@pytest.fixture
+def repository():
+    return Repository(name='app', full_name='octo/app', url='https://github.com/octo/app', default_branch='main')
+
+def test_large_pushes(repository):
+    assert not is_large_push(push_payload(LARGE_PUSH_COMMITS - 1))
+    assert is_large_push(push_payload(LARGE_PUSH_COMMITS))
+    # GitHub lists at most 20 commits and reports the real count in `size`
+    assert is_large_push(push_payload(3, size=3 + 1))
+
+def test_large_push_is_analyzed_from_every_compare_page(github_api, repository):
+    github_api.route = compare_route(total_commits=250, file_count=8)
+    payload = push_payload(20, size=250)
+
+    push_changes = fetch_push_changes(repository, payload)
+
+    assert [query['page'] for _, _, query, _ in github_api.requests] == ['1', '2', '3']
+    assert {path for _, path, _, _ in github_api.requests} == {f'/repos/octo/app/compare/{BEFORE}...{AFTER}'}
+    assert len(push_changes['commits']) == push_changes['total_commits'] == 250
+    assert len(push_changes['files']) == 8
+    assert not push_changes['files_truncated']
+
+    commit_data = build_push_commit_data(payload, push_changes)
+    assert commit_data['push_level'] and commit_data['commit_count'] == 250
+    assert commit_data['id'] == AFTER
+    assert commit_data['author'] == {'name': 'Octo Cat', 'email': 'octo@example.com'}
+    assert commit_data['added'] == ['src/file0.py', 'src/file4.py']
+    assert commit_data['removed'] == ['src/file2.py', 'src/file6.py']
+    assert commit_data['modified'] == ['src/file1.py', 'src/file3.py', 'src/file5.py', 'src/file7.py']
+    # Headlines of the newest 20 commits only
+    headlines = commit_data['message'].split('\n\n', 1)[1].splitlines()
+    assert headlines == [f'- Change {index}' for index in range(230, 250)]
+
+def test_compare_reports_truncated_files(github_api):
+    github_api.route = compare_route(total_commits=1, file_count=MAX_COMMIT_FILES)
+
+    comparison = GitHubService(token='compare').compare_commits('octo/app', BEFORE, AFTER)
+
+    assert comparison['files_truncated']
+    assert len(github_api.requests) == 1
+
+def test_new_and_deleted_branches(github_api, repository):
+    github_api.route = compare_route(total_commits=12, file_count=1)
+
+    # A new branch is compared against the default branch it forked from
+    assert fetch_push_changes(repository, push_payload(12, before='0' * 40))['total_commits'] == 12
+    assert github_api.requests[0][1] == f'/repos/octo/app/compare/main...{AFTER}'
+
+    assert fetch_push_changes(repository, push_payload(12, after='0' * 40)) is None
+    assert len(github_api.requests) == 1
+
+def test_compare_reads_the_mirror_first_and_falls_back_while_it_lags(github_api, repository, tmp_path, monkeypatch):
+    source = tmp_path / 'source'
+    source.mkdir()
+    git(source, 'init', '-q', '-b', 'main')
+    base = commit(str(source), 'README.md', 'hello\n', 'Add readme')
+    head = commit(str(source), 'app.py', 'print(1)\n', 'Add app')
+    mirror = GitMirrorBackend(str(tmp_path / 'mirrors'))
+    assert mirror.sync('octo/app', f"file://{source}")
+    monkeypatch.setenv('GIT_MIRROR_ROOT', mirror.root)
+    monkeypatch.setattr(git_mirror, '_mirror_backend', mirror)
+    github_api.route = compare_route(total_commits=1, file_count=1)
+
+    push_changes = fetch_push_changes(repository, push_payload(LARGE_PUSH_COMMITS, before=base, after=head))
+    assert github_api.requests == []
+    assert [entry['commit']['message'] for entry in push_changes['commits']] == ['Add app']
+    assert [(file['filename'], file['status']) for file in push_changes['files']] == [('app.py', 'added')]
+
+    # A push the background sync has not fetched yet is compared over REST
+    pushed = commit(str(source), 'app.py', 'print(2)\n', 'Change app')
+    push_changes = fetch_push_changes(repository, push_payload(LARGE_PUSH_COMMITS, before=head, after=pushed))
+    assert [path for _, path, _, _ in github_api.requests] == [f'/repos/octo/app/compare/{head}...{pushed}']
+    assert push_changes['files'] == [{'filename': 'src/file0.py', 'status': 'added'}]
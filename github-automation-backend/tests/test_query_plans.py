@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import text
+from src.models.repository import db, Repository, Analysis, AutomationEntry
+from src.models.webhook import WebhookEvent, CommitAnalysis, ActionLog
+
+# Rows seeded per table, scaled down from production so the module runs in
+# seconds while the planner still has statistics to weigh the indexes with
+SEED_ROWS = {
+    'repositories': 500,
+    'analyses': 10000,
+    'automation_entries': 10000,
+    'webhook_events': 50000,
+    'commit_analyses': 50000,
+    'action_logs': 100000,
+}
+
+LEVELS = ('info', 'info', 'info', 'success', 'success', 'warning', 'error')
+
+# The filter and sort shapes of the listings, dashboard and export queries,
+# with the index each one must be planned on
+QUERIES = [
+    ('ix_webhook_events_created', lambda: WebhookEvent.query.order_by(WebhookEvent.created_at.desc()).limit(20)),
+    ('ix_webhook_events_repository_created', lambda: WebhookEvent.query.filter_by(repository_id=1)
+        .order_by(WebhookEvent.created_at.desc()).limit(20)),
+    ('ix_webhook_events_unprocessed', lambda: db.session.query(WebhookEvent.id).filter_by(processed=False)
+        .order_by(WebhookEvent.created_at)),
+    ('ix_commit_analyses_created', lambda: CommitAnalysis.query.order_by(CommitAnalysis.created_at.desc()).limit(20)),
+    ('ix_commit_analyses_repository_created', lambda: CommitAnalysis.query.filter_by(repository_id=1)
+        .order_by(CommitAnalysis.created_at.desc()).limit(20)),
+    ('ix_commit_analyses_committed', lambda: db.session.query(CommitAnalysis.id)
+        .filter(CommitAnalysis.committed_at > datetime(2024, 1, 1), CommitAnalysis.committed_at <= datetime(2024, 2, 1))
+        .order_by(CommitAnalysis.committed_at, CommitAnalysis.id).limit(5000)),
+    ('ix_webhook_events_committed', lambda: WebhookEvent.query.filter(WebhookEvent.committed_at > datetime(2024, 1, 1))
+        .order_by(WebhookEvent.committed_at, WebhookEvent.id).limit(201)),
+    ('ix_action_logs_committed', lambda: ActionLog.query.filter(ActionLog.committed_at > datetime(2024, 1, 1))
+        .order_by(ActionLog.committed_at, ActionLog.id).limit(201)),
+    ('ix_action_logs_created', lambda: ActionLog.query.order_by(ActionLog.created_at.desc()).limit(50)),
+    ('ix_action_logs_repository_created', lambda: ActionLog.query.filter_by(repository_id=1)
+        .order_by(ActionLog.created_at.desc()).limit(50)),
+    ('ix_action_logs_level_created', lambda: ActionLog.query.filter(ActionLog.level == 'error')
+        .order_by(ActionLog.created_at.desc()).limit(50)),
+    ('ix_action_logs_commit_analysis', lambda: db.session.query(ActionLog.commit_analysis_id, db.func.count(ActionLog.id))
+        .filter(ActionLog.commit_analysis_id.in_([1, 2, 3])).group_by(ActionLog.commit_analysis_id)),
+    ('ix_analyses_repository_created', lambda: Analysis.query.filter_by(repository_id=1)
+        .order_by(Analysis.created_at.desc()).limit(10)),
+    ('ix_automation_entries_repository_created', lambda: AutomationEntry.query.filter_by(repository_id=1)
+        .order_by(AutomationEntry.created_at.desc()).limit(10)),
+    # ETag version stamps
+    ('ix_repositories_updated', lambda: db.session.query(db.func.max(Repository.updated_at))),
+    ('ix_analyses_created', lambda: db.session.query(db.func.max(Analysis.created_at))),
+    ('ix_automation_entries_updated', lambda: db.session.query(db.func.max(AutomationEntry.updated_at))),
+]
+
+def seed_rows(count, build):
+    start = datetime(2024, 1, 1)
+    return [build(i, start + timedelta(minutes=i)) for i in range(count)]
+
+@pytest.fixture(scope='module')
+def seeded(tmp_path_factory):
+    """A database holding SEED_ROWS rows, with planner statistics gathered"""
+    engine = sa.create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    db.metadata.create_all(engine)
+    repositories = SEED_ROWS['repositories']
+    with engine.begin() as connection:
+        connection.execute(Repository.__table__.insert(), seed_rows(repositories, lambda i, at: {
+            'name': f'app{i}', 'full_name': f'octo/app{i}', 'url': f'https://github.com/octo/app{i}',
+            'created_at': at, 'updated_at': at,
+        }))
+        connection.execute(Analysis.__table__.insert(), seed_rows(SEED_ROWS['analyses'], lambda i, at: {
+            'repository_id': i % repositories + 1, 'created_at': at,
+        }))
+        connection.execute(AutomationEntry.__table__.insert(), seed_rows(SEED_ROWS['automation_entries'], lambda i, at: {
+            'repository_id': i % repositories + 1, 'action': 'improvement', 'created_at': at, 'updated_at': at,
+        }))
+        connection.execute(WebhookEvent.__table__.insert(), seed_rows(SEED_ROWS['webhook_events'], lambda i, at: {
+            'event_type': 'push', 'repository_id': i % repositories + 1, 'github_delivery_id': f'd{i}', 'payload': {},
+            # Only the newest events wait for processing
+            'processed': i < SEED_ROWS['webhook_events'] - 20, 'created_at': at, 'committed_at': at,
+        }))
+        connection.execute(CommitAnalysis.__table__.insert(), seed_rows(SEED_ROWS['commit_analyses'], lambda i, at: {
+            'webhook_event_id': i + 1, 'repository_id': i % repositories + 1, 'commit_sha': f'{i:040x}',
+            'commit_message': 'Fix', 'author_name': 'Octo', 'author_email': 'octo@example.com',
+            'pr_generated': i % 10 == 0, 'created_at': at, 'committed_at': at,
+        }))
+        connection.execute(ActionLog.__table__.insert(), seed_rows(SEED_ROWS['action_logs'], lambda i, at: {
+            'action_type': 'commit_analyzed', 'repository_id': i % repositories + 1,
+            'commit_analysis_id': i // 2 + 1, 'message': 'Analyzed', 'level': LEVELS[i % len(LEVELS)],
+            'created_at': at, 'committed_at': at,
+        }))
+        connection.execute(text('ANALYZE'))
+    yield engine
+    engine.dispose()
+
+def query_plan(query, engine):
+    sql = query.statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+    with engine.connect() as connection:
+        return ' | '.join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+@pytest.mark.parametrize('index_name, build_query', QUERIES, ids=[name for name, _ in QUERIES])
+def test_query_uses_index(app, seeded, index_name, build_query):
+    plan = query_plan(build_query(), seeded)
+    assert index_name in plan, plan
+    assert 'USE TEMP B-TREE FOR ORDER BY' not in plan, plan
+
+def test_statistics_are_gathered(seeded):
+    with seeded.connect() as connection:
+        analysed = {row[0] for row in connection.execute(text('SELECT tbl FROM sqlite_stat1'))}
+    assert set(SEED_ROWS) <= analysed
+
+def test_every_index_is_covered():
+    indexed = {
+        index.name
+        for model in (Repository, WebhookEvent, CommitAnalysis, ActionLog, Analysis, AutomationEntry)
+        for index in model.__table__.indexes
+    }
+    assert indexed == {name for name, _ in QUERIES}
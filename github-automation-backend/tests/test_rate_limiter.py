@@ -0,0 +1,135 @@
+import pytest
+from src.services import github_service
+from src.services.github_service import GitHubService
+from src.services.rate_limiter import (
+    GitHubRateLimiter, RateLimitExceeded, MAX_WAIT_SECONDS,
+    PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND, RESOURCE_CORE, RESOURCE_GRAPHQL
+)
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def quota_headers(remaining, limit=5000, reset=4600, resource=None):
+    headers = {'X-RateLimit-Limit': str(limit), 'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset': str(reset)}
+    if resource:
+        headers['X-RateLimit-Resource'] = resource
+    return headers
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def limiter(clock):
+    return GitHubRateLimiter(clock=clock)
+
+def test_unknown_quota_does_not_delay(limiter):
+    assert limiter.delay_for('token', PRIORITY_BACKGROUND) == 0.0
+
+def test_lower_priorities_leave_the_reserved_share(limiter):
+    # 1000 left of 5000: inside the 25% background reserve, above the 5% normal one
+    limiter.update('token', FakeResponse(headers=quota_headers(1000)))
+    assert limiter.delay_for('token', PRIORITY_BACKGROUND) == 3600.0
+    assert limiter.delay_for('token', PRIORITY_NORMAL) == 0.0
+
+    limiter.update('token', FakeResponse(headers=quota_headers(200)))
+    assert limiter.delay_for('token', PRIORITY_NORMAL) == 3600.0
+    assert limiter.delay_for('token', PRIORITY_INTERACTIVE) == 0.0
+
+def test_rolled_over_window_does_not_delay(limiter, clock):
+    limiter.update('token', FakeResponse(headers=quota_headers(0)))
+    clock.now = 4600.0
+    assert limiter.delay_for('token', PRIORITY_NORMAL) == 0.0
+
+def test_quotas_are_kept_per_token_and_resource(limiter):
+    limiter.update('token', FakeResponse(headers=quota_headers(0, resource=RESOURCE_GRAPHQL)))
+    assert limiter.delay_for('token', PRIORITY_NORMAL, RESOURCE_GRAPHQL) == 3600.0
+    assert limiter.delay_for('token', PRIORITY_NORMAL, RESOURCE_CORE) == 0.0
+    assert limiter.delay_for('other', PRIORITY_NORMAL, RESOURCE_GRAPHQL) == 0.0
+
+def test_acquire_spends_quota(limiter):
+    limiter.update('token', FakeResponse(headers=quota_headers(3000)))
+    limiter.acquire('token', PRIORITY_NORMAL)
+    assert limiter._quota('token', RESOURCE_CORE).remaining == 2999
+
+def test_acquire_raises_instead_of_waiting_past_the_deadline(limiter):
+    limiter.update('token', FakeResponse(headers=quota_headers(100)))
+    with pytest.raises(RateLimitExceeded) as raised:
+        limiter.acquire('token', PRIORITY_NORMAL)
+    assert raised.value.resource == RESOURCE_CORE
+    assert raised.value.retry_at == 4600.0
+    # Nothing was spent and nobody is left waiting
+    quota = limiter._quota('token', RESOURCE_CORE)
+    assert quota.remaining == 100
+    assert quota.waiting[PRIORITY_NORMAL] == 0
+
+def test_acquire_timeout_overrides_the_priority_deadline(limiter):
+    limiter.update('token', FakeResponse(status_code=429, headers={'Retry-After': '12'}))
+    assert 12 < MAX_WAIT_SECONDS[PRIORITY_NORMAL]
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire('token', PRIORITY_NORMAL, timeout=5)
+
+def test_retry_after_header_blocks_every_priority(limiter, clock):
+    limiter.update('token', FakeResponse(status_code=403, headers={'Retry-After': '30'}))
+    assert limiter.delay_for('token', PRIORITY_INTERACTIVE) == 30.0
+    clock.now += 30
+    assert limiter.delay_for('token', PRIORITY_INTERACTIVE) == 0.0
+
+@pytest.mark.parametrize('status, headers, expected', [
+    (200, {'Retry-After': '10'}, None),
+    (403, {'Retry-After': '10'}, 10.0),
+    (429, {'Retry-After': 'soon'}, 60.0),
+    (403, quota_headers(0, reset=1045), 45.0),
+    (429, {}, 60.0),
+    # A 403 without rate limit headers is a permission error
+    (403, {}, None),
+])
+def test_retry_after(limiter, status, headers, expected):
+    assert limiter.retry_after(FakeResponse(status, headers)) == expected
+
+@pytest.fixture
+def service(limiter, monkeypatch):
+    responses = []
+    sent = []
+
+    def fake_request(method, url, **kwargs):
+        sent.append((method, url))
+        return responses.pop(0)
+
+    monkeypatch.setattr(github_service.requests, 'request', fake_request)
+    service = GitHubService(token='token')
+    service.rate_limiter = limiter
+    service.responses = responses
+    service.sent = sent
+    return service
+
+def test_request_retries_once_after_a_short_back_off(service):
+    service.responses.extend([
+        FakeResponse(429, {'Retry-After': '0'}),
+        FakeResponse(429, {'Retry-After': '0'}),
+    ])
+    response = service._request('GET', 'https://api.github.com/x')
+    assert response.status_code == 429
+    assert len(service.sent) == 2
+
+def test_request_returns_the_retried_response(service):
+    service.responses.extend([FakeResponse(429, {'Retry-After': '0'}), FakeResponse(200, quota_headers(4999))])
+    assert service._request('GET', 'https://api.github.com/x').status_code == 200
+    assert len(service.sent) == 2
+
+def test_request_does_not_retry_past_the_priority_deadline(service):
+    service.responses.append(FakeResponse(429, {'Retry-After': '120'}))
+    assert service._request('GET', 'https://api.github.com/x', priority=PRIORITY_NORMAL).status_code == 429
+    assert len(service.sent) == 1
+    # The next call fails fast instead of sending
+    with pytest.raises(RateLimitExceeded):
+        service._request('GET', 'https://api.github.com/x')
@@ -0,0 +1,130 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from src.models.repository import db, Repository
+from src.services.repository_import import (
+    InvalidRecord, import_repositories, iter_ndjson, upsert_statement, validate_record
+)
+
+SETTLED = datetime(2024, 1, 1)
+
+@pytest.fixture
+def statements(app):
+    """SQL statements sent to the database, and the transactions committed"""
+    sent = {'sql': [], 'commits': 0}
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        sent['sql'].append(statement)
+
+    def record_commit(conn):
+        sent['commits'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', record_statement)
+    event.listen(db.engine, 'commit', record_commit)
+    yield sent
+    event.remove(db.engine, 'before_cursor_execute', record_statement)
+    event.remove(db.engine, 'commit', record_commit)
+
+def add_repository(name, **values):
+    repository = Repository(
+        name=name, full_name=f'octo/{name}', url=f'https://github.com/octo/{name}',
+        created_at=SETTLED, updated_at=SETTLED, **values
+    )
+    db.session.add(repository)
+    db.session.commit()
+    return repository
+
+def upserts(statements):
+    return [sql for sql in statements['sql'] if sql.startswith('INSERT INTO repositories')]
+
+def test_validate_record_rejections():
+    assert validate_record({'full_name': 'octo/app'}) == {
+        'full_name': 'octo/app', 'name': 'app', 'url': 'https://github.com/octo/app'
+    }
+    rejected = {
+        'Record must be a JSON object': ['octo/app'],
+        'Unknown fields: analysis_count': {'full_name': 'octo/app', 'analysis_count': 3},
+        'full_name must look like owner/name': {'full_name': 'octo/app/extra'},
+        'name cannot be null': {'full_name': 'octo/app', 'name': None},
+        'stars must be of type int': {'full_name': 'octo/app', 'stars': 'many'},
+    }
+    for message, record in rejected.items():
+        with pytest.raises(InvalidRecord, match=message):
+            validate_record(record)
+    # bool is an int subclass, but not a count
+    with pytest.raises(InvalidRecord, match='forks must be of type int'):
+        validate_record({'full_name': 'octo/app', 'forks': True})
+
+def test_upsert_is_one_multi_row_statement_guarded_by_is_distinct_from():
+    rows = [validate_record({'full_name': f'octo/app{index}', 'stars': index}) for index in range(3)]
+
+    sql = str(upsert_statement('postgresql', rows).compile(dialect=postgresql.dialect()))
+
+    assert sql.count('INSERT INTO repositories') == 1
+    assert 'VALUES (%(name_m0)s' in sql and '(%(name_m2)s' in sql
+    assert 'ON CONFLICT (full_name) DO UPDATE SET' in sql
+    assert 'WHERE repositories.stars IS DISTINCT FROM excluded.stars' in sql
+    assert 'RETURNING repositories.id, repositories.full_name' in sql
+
+def test_mixed_batch_inserts_updates_and_skips(statements):
+    same = add_repository('same', stars=5)
+    changed = add_repository('changed', stars=5)
+    statements['sql'].clear()
+    statements['commits'] = 0
+    lines = [
+        '{"full_name": "octo/new", "stars": 1}',
+        '{"full_name": "octo/same", "stars": 5}',
+        '{"full_name": "octo/changed", "stars": 6}',
+        '{"full_name": "octo/bad", "stars": "many"}',
+        '{"full_name": ',
+        '{"full_name": "octo/new", "stars": 2}',
+    ]
+
+    results, summary = import_repositories(iter_ndjson(lines))
+
+    assert [(result['full_name'], result['status']) for result in results] == [
+        ('octo/new', 'superseded'),
+        ('octo/same', 'unchanged'),
+        ('octo/changed', 'updated'),
+        ('octo/bad', 'invalid'),
+        (None, 'invalid'),
+        ('octo/new', 'created'),
+    ]
+    assert summary == {'created': 1, 'updated': 1, 'unchanged': 1, 'superseded': 1, 'invalid': 2, 'failed': 0}
+    assert results[3]['error'] == 'stars must be of type int'
+    assert results[4]['error'].startswith('Invalid JSON')
+    assert results[1]['id'] == same.id and results[2]['id'] == changed.id
+
+    # All valid rows share their columns, so one statement and one transaction
+    [upsert] = upserts(statements)
+    assert 'ON CONFLICT (full_name) DO UPDATE' in upsert and 'repositories.stars IS NOT excluded.stars' in upsert
+    assert statements['commits'] == 1
+
+    db.session.expire_all()
+    assert same.updated_at == SETTLED  # no write at all for identical values
+    assert changed.stars == 6 and changed.updated_at > SETTLED
+    assert Repository.query.filter_by(full_name='octo/new').one().stars == 2
+
+def test_each_batch_is_its_own_transaction(statements):
+    add_repository('taken', github_id=42)
+    statements['sql'].clear()
+    statements['commits'] = 0
+    records = [
+        {'full_name': 'octo/a'},
+        {'full_name': 'octo/b'},
+        {'full_name': 'octo/c', 'github_id': 42},  # clashes with octo/taken
+        {'full_name': 'octo/d'},
+        {'full_name': 'octo/e'},
+    ]
+
+    results, summary = import_repositories(records, batch_size=2)
+
+    assert [result['status'] for result in results] == ['created', 'created', 'failed', 'failed', 'created']
+    assert 'UNIQUE constraint failed' in results[2]['error']
+    assert summary['created'] == 3 and summary['failed'] == 2
+    # The failed batch is rolled back without undoing the ones around it
+    assert statements['commits'] == 2
+    assert len(upserts(statements)) == 3
+    names = [full_name for full_name, in db.session.query(Repository.full_name).order_by(Repository.full_name)]
+    assert names == ['octo/a', 'octo/b', 'octo/e', 'octo/taken']
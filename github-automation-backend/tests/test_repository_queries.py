@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from src.models.repository import db, Repository, Analysis, AutomationEntry
+from src.routes.repository import repository_bp
+
+@pytest.fixture
+def client(app, monkeypatch):
+    # Every request must reach the database
+    monkeypatch.setenv('RESPONSE_CACHE_BACKEND', 'none')
+    app.register_blueprint(repository_bp, url_prefix='/api')
+    return app.test_client()
+
+@contextmanager
+def count_statements():
+    statements = []
+    
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+def add_repositories(count, start=0):
+    for i in range(start, start + count):
+        repository = Repository(name=f'app{i}', full_name=f'octo/app{i}', url=f'https://github.com/octo/app{i}')
+        db.session.add(repository)
+        db.session.flush()
+        for kind in ('health', 'security'):
+            db.session.add(Analysis(repository_id=repository.id, analysis_type=kind, recommendations=['add tests']))
+            db.session.add(AutomationEntry(repository_id=repository.id, action=f'fix {kind}', entry_metadata={'n': i}))
+    db.session.commit()
+    db.session.expunge_all()
+
+def statements_for(client, url):
+    with count_statements() as statements:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_json()
+    return len(statements)
+
+@pytest.mark.parametrize('url', [
+    '/api/repositories',
+    '/api/repositories?view=summary',
+    '/api/repositories/search?q=app',
+])
+def test_listing_query_count_does_not_grow_with_repositories(app, client, url):
+    add_repositories(1)
+    single = statements_for(client, url)
+    add_repositories(9, start=1)
+    assert len(client.get(url).get_json()['repositories']) == 10
+    assert statements_for(client, url) == single
+
+def test_detail_query_count_does_not_grow_with_analyses(app, client):
+    add_repositories(1)
+    single = statements_for(client, '/api/repositories/1')
+    for i in range(9):
+        db.session.add(Analysis(repository_id=1, analysis_type=f'extra{i}', recommendations=[]))
+        db.session.add(AutomationEntry(repository_id=1, action=f'extra{i}'))
+    db.session.commit()
+    db.session.expunge_all()
+    assert statements_for(client, '/api/repositories/1') == single
@@ -0,0 +1,41 @@
+from datetime import datetime
+from sqlalchemy import select
+from src.models.repository import db, Repository, Analysis
+
+def stored_summary(repository_id):
+    table = Repository.__table__
+    return db.session.execute(
+        select(table.c.analysis_count, table.c.latest_analysis_id).where(table.c.id == repository_id)
+    ).one()
+
+def test_summary_is_written_at_commit(app):
+    repository = Repository(name='app', full_name='octo/app', url='https://github.com/octo/app')
+    db.session.add(repository)
+    db.session.commit()
+
+    newest = Analysis(repository_id=repository.id, created_at=datetime(2024, 1, 2))
+    db.session.add(newest)
+    db.session.flush()
+    assert tuple(stored_summary(repository.id)) == (0, None)
+
+    # A later flush with an earlier analysis does not replace the newest one
+    newest_id = newest.id
+    db.session.add(Analysis(repository_id=repository.id, created_at=datetime(2024, 1, 1)))
+    db.session.flush()
+    assert tuple(stored_summary(repository.id)) == (0, None)
+
+    db.session.commit()
+    assert tuple(stored_summary(repository.id)) == (2, newest_id)
+
+def test_rolled_back_summary_changes_are_discarded(app):
+    repository = Repository(name='app', full_name='octo/app', url='https://github.com/octo/app')
+    db.session.add(repository)
+    db.session.commit()
+    repository_id = repository.id
+
+    db.session.add(Analysis(repository_id=repository_id))
+    db.session.flush()
+    db.session.rollback()
+    db.session.add(Analysis(repository_id=repository_id))
+    db.session.commit()
+    assert stored_summary(repository_id).analysis_count == 1
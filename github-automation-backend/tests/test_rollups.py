@@ -0,0 +1,98 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from src.models.repository import db, Repository
+from src.models.webhook import WebhookEvent, CommitAnalysis, ActionLog
+from src.models.rollup import StatsRollup, COUNTER_COLUMNS, rebuild_rollups, rollup_series, sum_rollups
+from src.routes.admin import build_activity, truncate_datetime
+
+def rollup_rows():
+    return db.session.execute(select(func.count()).select_from(StatsRollup.__table__)).scalar()
+
+def add_push(repository, delivery_id, risk_score=None):
+    event = WebhookEvent(event_type='push', repository_id=repository.id, github_delivery_id=delivery_id, payload={})
+    db.session.add(event)
+    db.session.flush()
+    analysis = CommitAnalysis(
+        webhook_event_id=event.id, repository_id=repository.id, commit_sha=delivery_id.ljust(40, '0'),
+        commit_message='Fix', author_name='Octo', author_email='octo@example.com', risk_score=risk_score
+    )
+    db.session.add(analysis)
+    db.session.add(ActionLog(action_type='webhook_received', repository_id=repository.id, message='push', level='info'))
+    return event, analysis
+
+def make_repository():
+    repository = Repository(name='app', full_name='octo/app', url='https://github.com/octo/app')
+    db.session.add(repository)
+    db.session.commit()
+    return repository
+
+def test_rollups_are_written_at_commit(app):
+    repository = make_repository()
+    event, analysis = add_push(repository, 'a1')
+    db.session.flush()
+    assert rollup_rows() == 0
+
+    # Changes over several flushes add up to one write
+    analysis.risk_score = 40
+    event.processed = True
+    db.session.flush()
+    assert rollup_rows() == 0
+    db.session.commit()
+
+    totals = sum_rollups(['webhook_events', 'webhooks_processed', 'commit_analyses', 'risk_score_sum', 'risk_score_count', 'log_info'])
+    assert totals == {
+        'webhook_events': 1, 'webhooks_processed': 1, 'commit_analyses': 1,
+        'risk_score_sum': 40, 'risk_score_count': 1, 'log_info': 1,
+    }
+    assert sum_rollups(['commit_analyses'], repository_id=repository.id) == {'commit_analyses': 1}
+
+def test_rolled_back_changes_are_not_counted(app):
+    repository = make_repository()
+    add_push(repository, 'a1')
+    db.session.flush()
+    db.session.rollback()
+    add_push(repository, 'a2', risk_score=10)
+    db.session.commit()
+    assert sum_rollups(['webhook_events', 'risk_score_sum']) == {'webhook_events': 1, 'risk_score_sum': 10}
+
+def test_rebuild_matches_incremental_rollups(app):
+    repository = make_repository()
+    for index, score in enumerate((10, None, 30)):
+        add_push(repository, f'a{index}', risk_score=score)
+        db.session.commit()
+
+    def snapshot():
+        rows = db.session.query(StatsRollup).order_by(StatsRollup.repository_id, StatsRollup.bucket_start)
+        return [(row.repository_id, row.bucket_start, [getattr(row, column) for column in COUNTER_COLUMNS]) for row in rows]
+
+    incremental = snapshot()
+    db.session.expunge_all()
+    assert rebuild_rollups() == len(incremental)
+    assert snapshot() == incremental
+
+def test_week_activity_matches_the_hourly_rollups(app):
+    repository = make_repository()
+    now = datetime.utcnow()
+    # Pushes spread over three weeks, several per hour at times
+    for index in range(60):
+        event, analysis = add_push(repository, f'w{index}')
+        event.created_at = analysis.created_at = now - timedelta(hours=index * 7 + index % 3)
+    db.session.commit()
+
+    activity = build_activity('week', 4)
+    since = truncate_datetime(now, 'week') - timedelta(weeks=3)
+
+    hourly = rollup_series(['webhook_events', 'commit_analyses'], since=since)
+    webhooks, analyses = Counter(), Counter()
+    for bucket_start, counters in hourly:
+        webhooks[truncate_datetime(bucket_start, 'week')] += counters['webhook_events']
+        analyses[truncate_datetime(bucket_start, 'week')] += counters['commit_analyses']
+    weeks = [since + timedelta(weeks=i) for i in range(4)]
+
+    assert activity['webhooks'] == [webhooks[week] for week in weeks]
+    assert activity['analyses'] == [analyses[week] for week in weeks]
+    assert sum(activity['webhooks']) == WebhookEvent.query.filter(WebhookEvent.created_at >= since).count() == 60
+    # One row per week comes back, not one per hour
+    assert len(hourly) > 4
+    assert len(rollup_series(['webhook_events'], since=since, granularity='week')) <= 4